@@ -0,0 +1,199 @@
+import logging
+import mmap
+import os
+import struct
+import sys
+from typing import Dict, Iterator, List, Mapping, Tuple
+
+from .EmojiReader import read_emoji
+
+__all__ = ["EmojiIndex", "build_index", "load_emoji"]
+
+
+# Magic, format version, then size and modification time of the emoji.json it was built from, then the number of
+# entries in the name -> emoji and emoji -> name tables
+_HEADER = struct.Struct("<4sHxxqqII")
+_MAGIC = b"EMJI"
+_VERSION = 1
+# Offset and length of the key, then of the value, each pointing into the string data after the tables
+_RECORD = struct.Struct("<IHIH")
+
+
+def _source_key(file: str) -> Tuple[int, int]:
+    stat = os.stat(file)
+    return stat.st_size, stat.st_mtime_ns
+
+
+def build_index(file: str, index_file: str):
+    """
+    Compile emoji.json into a binary index of both mappings made by read_emoji
+
+    Written to a temporary file first so that processes loading it never see half an index.
+    """
+    _write_index(_compile(file), index_file)
+
+
+def _compile(file: str) -> bytes:
+    """
+    Index of both mappings made by read_emoji
+
+    Each mapping is a table of fixed size records sorted by key, so lookups are a binary search over the file
+    without loading it.
+    """
+    size, mtime = _source_key(file)
+    tables = read_emoji(file)
+
+    strings: Dict[bytes, int] = {}
+    data = bytearray()
+    offset = _HEADER.size + _RECORD.size * sum(len(t) for t in tables)
+
+    def intern(b: bytes) -> Tuple[int, int]:
+        if b not in strings:
+            strings[b] = offset + len(data)
+            data.extend(b)
+        return strings[b], len(b)
+
+    records = bytearray()
+    for table in tables:
+        # Sorted by encoded key, which is the order lookups compare in
+        for k, v in sorted((k.encode("utf-8"), v.encode("utf-8")) for k, v in table.items()):
+            records.extend(_RECORD.pack(*intern(k), *intern(v)))
+
+    return _HEADER.pack(_MAGIC, _VERSION, size, mtime, len(tables[0]), len(tables[1])) + records + data
+
+
+def _write_index(index: bytes, index_file: str):
+    tmp = f"{index_file}.{os.getpid()}.tmp"
+    try:
+        with open(tmp, "wb") as f:
+            f.write(index)
+        os.replace(tmp, index_file)
+    finally:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+
+
+class EmojiIndex(Mapping[str, str]):
+    """
+    Read-only mapping backed by one table of a memory-mapped index made by build_index
+
+    Keys found are kept in a dict, so repeated lookups of the same emoji cost what a dict lookup does. It holds at
+    most the table, and only what is used of it.
+    """
+
+    def __init__(self, buffer: mmap.mmap | bytes, start: int, count: int):
+        self._buffer = buffer
+        self._start = start
+        self._count = count
+        self._found: Dict[str, str] = {}
+
+    def _record(self, i: int) -> Tuple[int, int, int, int]:
+        return _RECORD.unpack_from(self._buffer, self._start + i * _RECORD.size)
+
+    def _key(self, i: int) -> bytes:
+        key_offset, key_length, _, _ = self._record(i)
+        return self._buffer[key_offset:key_offset + key_length]
+
+    def _bisect(self, target: bytes) -> int:
+        """Index of the first record whose key is not less than target"""
+        lo, hi = 0, self._count
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if self._key(mid) < target:
+                lo = mid + 1
+            else:
+                hi = mid
+        return lo
+
+    def _find(self, key: str) -> int:
+        """Index of the record for key, or -1"""
+        target = key.encode("utf-8", "surrogatepass")
+        i = self._bisect(target)
+        return i if i < self._count and self._key(i) == target else -1
+
+    def keys_with_prefix(self, prefix: str, limit: int | None = None) -> List[str]:
+        """Keys starting with prefix in code point order, at most limit of them"""
+        target = prefix.encode("utf-8", "surrogatepass")
+        keys = []
+        i = self._bisect(target)
+        # UTF-8 sorts like code points, so keys with the prefix are all together from the first one not less than it
+        while i < self._count and (limit is None or len(keys) < limit) and (key := self._key(i)).startswith(target):
+            keys.append(key.decode("utf-8"))
+            i += 1
+        return keys
+
+    def __getitem__(self, key: str) -> str:
+        if not isinstance(key, str):
+            raise KeyError(key)
+        value = self._found.get(key)
+        if value is None:
+            i = self._find(key)
+            if i < 0:
+                raise KeyError(key)
+            _, _, value_offset, value_length = self._record(i)
+            value = self._found[key] = self._buffer[value_offset:value_offset + value_length].decode("utf-8")
+        return value
+
+    def get(self, key: str, default: str | None = None) -> str | None:
+        value = self._found.get(key) if isinstance(key, str) else None
+        if value is not None:
+            return value
+        try:
+            return self[key]
+        except KeyError:
+            return default
+
+    def __contains__(self, key: object) -> bool:
+        return isinstance(key, str) and (key in self._found or self._find(key) >= 0)
+
+    def __len__(self) -> int:
+        return self._count
+
+    def __iter__(self) -> Iterator[str]:
+        for i in range(self._count):
+            yield self._key(i).decode("utf-8")
+
+
+def _open_index(file: str, index_file: str) -> mmap.mmap | None:
+    """Map index_file if it was built from file as it is now"""
+    try:
+        with open(index_file, "rb") as f:
+            buffer = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    except (OSError, ValueError):
+        return None
+    if len(buffer) >= _HEADER.size:
+        magic, version, size, mtime, _, _ = _HEADER.unpack_from(buffer)
+        if (magic, version, (size, mtime)) == (_MAGIC, _VERSION, _source_key(file)):
+            return buffer
+    buffer.close()
+    return None
+
+
+def load_emoji(file: str, index_file: str = None) -> Tuple[EmojiIndex, EmojiIndex]:
+    """
+    Same mappings as read_emoji, looked up in a memory-mapped index instead of built in memory
+
+    The index is rebuilt whenever the file has changed since it was built. Processes mapping the same index share
+    its pages. If it cannot be written, as in a read-only directory, the index built is used from memory instead.
+    """
+    index_file = index_file or os.path.splitext(file)[0] + ".idx"
+    buffer = _open_index(file, index_file)
+    if buffer is None:
+        index = _compile(file)
+        try:
+            _write_index(index, index_file)
+        except OSError as ex:
+            logging.getLogger("EmojiIndex").warning("Could not write emoji index, using it from memory: %s", ex)
+        # Built from the file as it was when read, even if it has changed since
+        buffer = _open_index(file, index_file) or index
+    _, _, _, _, forward, reverse = _HEADER.unpack_from(buffer)
+    return (
+        EmojiIndex(buffer, _HEADER.size, forward),
+        EmojiIndex(buffer, _HEADER.size + forward * _RECORD.size, reverse),
+    )
+
+
+if __name__ == "__main__":
+    # Build step: python -m app.EmojiIndex [emoji.json] [index file]
+    source = sys.argv[1] if len(sys.argv) > 1 else "config/emoji.json"
+    build_index(source, sys.argv[2] if len(sys.argv) > 2 else os.path.splitext(source)[0] + ".idx")
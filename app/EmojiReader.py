@@ -1,7 +1,8 @@
 import itertools
-import json
 from typing import Dict, Tuple
 
+from core.util import json_codec
+
 __all__ = ["read_emoji"]
 
 
@@ -12,7 +13,7 @@ def read_emoji(file: str) -> Tuple[Dict[str, str], Dict[str, str]]:
     :return: A mapping from names to emojis and one from emojis to names
     """
     with open(file, "r", encoding="utf-8") as f:
-        emoji_raw = json.load(f)
+        emoji_raw = json_codec.loads(f.read())
     emoji_list = [
         e
         for emoji_category in emoji_raw.values()
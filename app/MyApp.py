@@ -1,4 +1,4 @@
-from typing import TYPE_CHECKING, Dict
+from typing import TYPE_CHECKING, Mapping
 
 if TYPE_CHECKING:
     from core.types.Config import Config
@@ -8,7 +8,7 @@ if TYPE_CHECKING:
 
 class MyApp:
     config: "Config"
-    emoji: Dict[str, str]
-    emoji_rev: Dict[str, str]
+    emoji: Mapping[str, str]
+    emoji_rev: Mapping[str, str]
     db_client: "AsyncIOMotorClient"
     bot: "MyBot"
@@ -0,0 +1,5 @@
+"""
+Standalone benchmarks and differential checks
+
+Run a module from the repository root, e.g. ``python -m bench.formatter_parity``
+"""
@@ -0,0 +1,71 @@
+"""
+Structured rendering of JSON content against rendering the whole string and decoding it again
+
+Both must produce the same ContentResult, recursive variables with dedented branches included, which is checked
+before timing. Exits with a non-zero status on the first mismatch. The old path formats the raw JSON text, then
+json.loads and schema validates it on every render. ContentTemplate does both once and only fills in the format
+strings in its string values.
+"""
+import sys
+import time
+
+from core.util import MyFormatter
+from core.util.discord import ContentResult, ContentTemplate, ContentValidation
+from bot.commands.admin.Autochannel import AutochannelNotification
+
+KWARGS = {
+    "recurse": ("default", "steps"), "default": AutochannelNotification.default_content, "user": "<@1234>",
+    "channel": "new-user", "category": "Joins", "new_category": False, "message_perms": True,
+    "steps": "Next:%[%MESSAGE_PERMS%|%\n    1. Check %[USER]%\n    2. Approve\n    %]%%[%!CATEGORY%|%\n  none%]%",
+}
+
+CASES = {
+    "text": "%[DEFAULT]%",
+    "content": '{"content": "%[DEFAULT!j]%"}',
+    "dedent": '{"content": "%[STEPS!j]%", "embed": {"description": "%[%USER%|%\\n    %[STEPS!j]%%]%"}}',
+    "embed": (
+        '{"content": "%[USER!j]%", "embed": {"title": "%[USER!j]% joined", "color": 3447003, '
+        '"description": "%[DEFAULT!j]%", "footer": {"text": "Autochannel"}}}'
+    ),
+    "embeds_10": '{"embeds": [' + ", ".join(
+        f'{{"title": "Embed {i}", "description": "%[%CATEGORY%|%%[CATEGORY!j]%%|%none%]%", '
+        f'"fields": [{{"name": "User", "value": "%[USER!j]%"}}, {{"name": "Channel", "value": "%[CHANNEL!j]%"}}]}}'
+        for i in range(10)
+    ) + ']}',
+}
+
+
+def best(func, number: int, repeat: int = 7) -> float:
+    func()
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for _ in range(number):
+            func()
+        times.append(time.perf_counter() - start)
+    return min(times) / number * 1e6
+
+
+def result(content: ContentResult) -> tuple:
+    return content["content"], [embed.to_dict() for embed in content["embeds"]]
+
+
+def main(number: int = 500):
+    validation = ContentValidation()
+    for case, content in CASES.items():
+        expected = result(validation.parse(MyFormatter.format(content, **KWARGS)))
+        actual = result(ContentTemplate.get(content).render(**KWARGS))
+        if expected != actual:
+            print(f"{case} differs\n  reparse:    {expected!r}\n  structured: {actual!r}")
+            sys.exit(1)
+    print(f"{len(CASES)} contents give the same result\n")
+
+    print(f"{'case':<10} {'reparse µs':>11} {'structured µs':>14} {'speedup':>8}")
+    for case, content in CASES.items():
+        reparse = best(lambda: validation.parse(MyFormatter.format(content, **KWARGS)), number)
+        structured = best(lambda: ContentTemplate.get(content).render(**KWARGS), number)
+        print(f"{case:<10} {reparse:>11.1f} {structured:>14.1f} {reparse / structured:>7.1f}x")
+
+
+if __name__ == "__main__":
+    main(*map(int, sys.argv[1:]))
@@ -0,0 +1,104 @@
+"""
+Memory-mapped emoji index against the dicts read_emoji builds
+
+Both mappings must have the same items and the same lookups, missing keys and prefixes included, also from an index
+that cannot be written and is used from memory. Exits with a non-zero status on the first mismatch, then compares
+load time, memory allocated by loading, and lookup time.
+
+    python -m bench.emoji_index [number]
+"""
+import os
+import shutil
+import sys
+import tempfile
+import time
+import tracemalloc
+
+from app.EmojiIndex import load_emoji
+from app.EmojiReader import read_emoji
+
+SOURCE = "config/emoji.json"
+MISSING = ["", "nope", "thumbsup ", "THUMBSUP", "\ud83d", "\U0001F600\U0001F600"]
+PREFIXES = ["", "s", "smile", "thumbs", "flag_", "regional_indicator_", "zzz", "\U0001F44D", "~"]
+
+
+def check(file: str) -> int:
+    dicts = read_emoji(file)
+    # Written next to the file, then one that cannot be written and is used from memory
+    unwritable = os.path.join(os.path.dirname(file), "missing", "emoji.idx")
+    return sum(check_index(dicts, load_emoji(file, index_file)) for index_file in (None, unwritable))
+
+
+def check_index(dicts, indexes) -> int:
+    checked = 0
+    for name, expected, actual in zip(["emoji", "emoji_rev"], dicts, indexes):
+        if len(expected) != len(actual) or dict(actual) != expected:
+            print(f"{name}: items differ")
+            sys.exit(1)
+        # Twice, the second time found in the index's dict of keys found
+        for key in (list(expected) + MISSING) * 2:
+            if expected.get(key) != actual.get(key) or (key in expected) != (key in actual):
+                print(f"{name}: lookup of {key!r} differs\n  dict:  {expected.get(key)!r}\n  index: {actual.get(key)!r}")
+                sys.exit(1)
+            checked += 1
+    for prefix in PREFIXES:
+        for limit in (None, 25):
+            expected = sorted((k for k in dicts[0] if k.startswith(prefix)), key=lambda k: k.encode())[:limit]
+            if indexes[0].keys_with_prefix(prefix, limit) != expected:
+                print(f"emoji: keys with prefix {prefix!r} differ")
+                sys.exit(1)
+            checked += 1
+    return checked
+
+
+def best(func, number: int, repeat: int = 5) -> float:
+    func()
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for _ in range(number):
+            func()
+        times.append(time.perf_counter() - start)
+    return min(times) / number * 1e6
+
+
+def allocated(func) -> int:
+    tracemalloc.start()
+    result = func()
+    size = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    del result
+    return size
+
+
+def main(number: int = 20):
+    # Work on a copy so that the index built here is never the one the bot uses
+    directory = tempfile.mkdtemp()
+    try:
+        file = shutil.copy(SOURCE, os.path.join(directory, "emoji.json"))
+        print(f"{check(file)} lookups give the same result\n")
+
+        print(f"{'case':<22} {'dicts':>12} {'index':>12}")
+        read, load = best(lambda: read_emoji(file), number), best(lambda: load_emoji(file), number)
+        print(f"{'load µs':<22} {read:>12.1f} {load:>12.1f}")
+        read, load = allocated(lambda: read_emoji(file)), allocated(lambda: load_emoji(file))
+        print(f"{'allocated KiB':<22} {read / 1024:>12.1f} {load / 1024:>12.1f}")
+
+        (emoji, emoji_rev), (emoji_index, emoji_rev_index) = read_emoji(file), load_emoji(file)
+        cases = {
+            "emoji.get µs": (lambda: emoji.get("thumbsup"), lambda: emoji_index.get("thumbsup")),
+            "emoji_rev.get µs": (lambda: emoji_rev.get("\U0001F44D"), lambda: emoji_rev_index.get("\U0001F44D")),
+            # Keys not found are searched for every time
+            "emoji.get missing µs": (lambda: emoji.get("thumbsup "), lambda: emoji_index.get("thumbsup ")),
+            "25 with prefix µs": (
+                lambda: [k for k in emoji if k.startswith("s")][:25], lambda: emoji_index.keys_with_prefix("s", 25)
+            ),
+        }
+        for case, (dicts, index) in cases.items():
+            print(f"{case:<22} {best(dicts, number * 1000):>12.3f} {best(index, number * 1000):>12.3f}")
+    finally:
+        shutil.rmtree(directory)
+
+
+if __name__ == "__main__":
+    main(*map(int, sys.argv[1:]))
@@ -0,0 +1,105 @@
+"""
+Memory and allocation benchmark for parsing format strings
+
+Compares shared node classes (MyFormatterGrammar.node_type) against the original behaviour of building a new
+class for every parsed node, for both parser backends. The template cache is cleared before every call so each
+MyFormatter.format call includes a full parse.
+"""
+import gc
+import sys
+import time
+import tracemalloc
+from contextlib import contextmanager
+
+from core.util import MyFormatter
+from core.util.formatter import MyFormatterGrammar, MyFormatterParser
+
+DEFAULT_CONTENT = (
+    "%[USER]% has joined, channel \"%[CHANNEL]%\" will be created\n"
+    "It will be added %[%CATEGORY%|%to %[%NEW_CATEGORY%|%a new %]%category \"%[CATEGORY]%\"%|%outside of any category%]%"
+    "%[%MESSAGE_PERMS!r%|%\nUser will have manage message perms%]%"
+)
+
+CASES = {
+    "label": ("%[ROLENAME]%", {"rolename": "Member"}),
+    "default_content": (DEFAULT_CONTENT, {
+        "user": "<@1234>", "channel": "new-user", "category": "Joins", "new_category": False, "message_perms": True,
+    }),
+    "modal_4000": ((("Welcome %[USER]% to the server, 100%% of us are happy! %[%X%|%yes%|%no%]% " * 60)[:3960]
+                    + "%[USER]%"), {"user": "<@1234>", "x": True}),
+}
+
+
+@contextmanager
+def per_node_classes():
+    """Temporarily restore the original one-class-per-node behaviour"""
+    def node_type(cls, mixin, name):
+        return type(cls.__name__ + name, (cls, mixin), {})
+
+    original = MyFormatterGrammar.node_type
+    MyFormatterGrammar.node_type = MyFormatterParser.node_type = node_type
+    try:
+        yield
+    finally:
+        MyFormatterGrammar.node_type = MyFormatterParser.node_type = original
+
+
+def measure(template: str, kwargs: dict, number: int) -> dict[str, float]:
+    def call():
+        MyFormatter.template_cache.clear()
+        return MyFormatter.format(template, **kwargs)
+
+    def node_classes():
+        return sum(len(type.__subclasses__(c)) for c in (
+            MyFormatterGrammar.TreeNode, *type.__subclasses__(MyFormatterGrammar.TreeNode)
+        ))
+
+    call()
+    start = time.perf_counter()
+    for _ in range(number):
+        call()
+    elapsed = time.perf_counter() - start
+
+    gc.collect()
+    gc.disable()
+    try:
+        classes_before = node_classes()
+        tracemalloc.start()
+        peak = 0
+        start_blocks = sys.getallocatedblocks()
+        for _ in range(number):
+            tracemalloc.reset_peak()
+            call()
+            peak = max(peak, tracemalloc.get_traced_memory()[1])
+        blocks = sys.getallocatedblocks() - start_blocks
+        tracemalloc.stop()
+        classes_after = node_classes()
+    finally:
+        gc.enable()
+    gc.collect()
+    return {
+        "ms_per_call": elapsed / number * 1000,
+        "peak_kib": peak / 1024,
+        "blocks_per_call": blocks / number,
+        "classes_per_call": (classes_after - classes_before) / number,
+    }
+
+
+def main(number: int = 20):
+    print(f"{'case':<16} {'parser':<7} {'node classes':<13} {'ms/call':>9} {'peak KiB':>9} {'blocks/call':>12} {'classes/call':>13}")
+    for case, (template, kwargs) in CASES.items():
+        for parser in MyFormatter.parsers:
+            MyFormatter.parser = parser
+            for mode in ("per-node", "shared"):
+                if mode == "per-node":
+                    with per_node_classes():
+                        result = measure(template, kwargs, number)
+                else:
+                    result = measure(template, kwargs, number)
+                print(f"{case:<16} {parser:<7} {mode:<13} {result['ms_per_call']:>9.3f} {result['peak_kib']:>9.1f} "
+                      f"{result['blocks_per_call']:>12.1f} {result['classes_per_call']:>13.1f}")
+    MyFormatter.parser = "linear"
+
+
+if __name__ == "__main__":
+    main(*map(int, sys.argv[1:]))
@@ -0,0 +1,81 @@
+"""
+Overhead of the render budget on ordinary templates
+
+Times MyFormatter.format with and without a RenderBudget on the templates the bot renders every day, with the
+template cache warm so only rendering is measured. Also shows how quickly a template expansion bomb is stopped, and
+how quickly a template whose few elements render long output is stopped by the time limit.
+"""
+import sys
+import time
+
+from core.util import MyFormatter, MyFormatterBudgetError, RenderBudget
+from bot.commands.admin.Autochannel import AutochannelNotification
+
+DEFAULT_CONTENT = AutochannelNotification.default_content
+DEFAULT_VARS = {
+    "default": DEFAULT_CONTENT, "user": "<@1234>", "channel": "new-user", "category": "Joins", "new_category": False,
+    "message_perms": True,
+}
+
+CASES = {
+    "channel_name": ("%[USER]%-channel", (), {"user": "new-user"}),
+    "default_content": ("%[DEFAULT]%", ("default",), DEFAULT_VARS),
+    "json_content": (
+        '{"content": "%[DEFAULT!j]%", "embeds": [{"title": "%[USER!j]% joined", "description": '
+        '"%[%CATEGORY%|%%[CATEGORY!j]%%|%No category%]%"}]}',
+        ("default",), DEFAULT_VARS
+    ),
+    "modal_4000": (
+        ("Welcome %[USER]% to the server, 100%% of us are happy! %[%X%|%yes%|%no%]% " * 60)[:3960] + "%[USER]%",
+        (), {"user": "<@1234>", "x": True}
+    ),
+}
+
+# Each variable references the next 500 times, so the output grows 500-fold per level
+BOMB = ("%[A]%", tuple("abcd"), {"a": "%[B]%" * 500, "b": "%[C]%" * 500, "c": "%[D]%" * 500, "d": "boom" * 100})
+# Few elements, each converting a long value, so only the time limit stops it
+LONG_OUTPUT = ("%[A]%" * 20, ("a",), {"a": "%[S!u]%" * 20, "s": "x" * 50_000})
+LONG_OUTPUT_BUDGET = RenderBudget(max_chars=10 ** 9, max_nodes=10_000, max_time=0.002)
+
+
+def per_call(
+        template: str, recurse: tuple[str, ...], kwargs: dict, budgets: tuple[RenderBudget | None, ...], number: int,
+        repeat: int = 25
+) -> list[float]:
+    """Best time per call in µs for each budget, alternating between them so that noise affects both alike"""
+    best = [float("inf")] * len(budgets)
+    for _ in range(repeat):
+        for i, budget in enumerate(budgets):
+            start = time.perf_counter()
+            for _ in range(number):
+                MyFormatter.format(template, recurse=recurse, budget=budget, **kwargs)
+            best[i] = min(best[i], time.perf_counter() - start)
+    return [b / number * 1e6 for b in best]
+
+
+def main(number: int = 500):
+    budget = AutochannelNotification.content_budget
+    print(f"{'case':<16} {'no budget µs':>13} {'budget µs':>10} {'overhead µs':>12} {'overhead':>9}")
+    for case, (template, recurse, kwargs) in CASES.items():
+        plain, guarded = per_call(template, recurse, kwargs, (None, budget), number)
+        print(f"{case:<16} {plain:>13.2f} {guarded:>10.2f} {guarded - plain:>12.2f} {guarded / plain - 1:>9.1%}")
+
+    print()
+    stopped("expansion bomb", *BOMB, budget)
+    stopped("long output", *LONG_OUTPUT, LONG_OUTPUT_BUDGET)
+
+
+def stopped(case: str, template: str, recurse: tuple[str, ...], kwargs: dict, budget: RenderBudget):
+    for value in (template, *kwargs.values()):
+        MyFormatter.compile(value)
+    start = time.perf_counter()
+    try:
+        output = MyFormatter.format(template, recurse=recurse, budget=budget, **kwargs)
+    except MyFormatterBudgetError as ex:
+        print(f"{case} stopped after {(time.perf_counter() - start) * 1000:.2f}ms: {ex.message}")
+    else:
+        print(f"{case} NOT stopped, rendered {len(output)} characters in {(time.perf_counter() - start) * 1000:.2f}ms")
+
+
+if __name__ == "__main__":
+    main(*map(int, sys.argv[1:]))
@@ -0,0 +1,54 @@
+"""
+Render benchmark for nested conditions, nesting depth 1 to 20
+
+Compares the streaming renderer (fragments written through one buffer, each dedented branch rendered apart and
+dedented once) with a reference renderer that joins a string per node and dedents each branch, as MyFormatter used to.
+
+    python -m bench.formatter_nesting [number] [lines per level]
+"""
+import sys
+import timeit
+
+from core.util import MyFormatter
+from core.util.formatter import MyFormatterTemplate as Compiled
+
+
+def nested(depth: int, lines: int = 1) -> str:
+    s = "%[USER]% joined"
+    for i in range(depth):
+        body = "".join(f"\n    level {i} line {j}: some text to pad the line out a little" for j in range(lines))
+        s = f"%[%X%|%\n    level {i} starts: {s}{body}\n    %|%hidden%]%"
+    return s
+
+
+def render_joined(node, formatter: MyFormatter) -> str:
+    match node:
+        case str():
+            return node
+        case Compiled.Template():
+            return "".join(render_joined(n, formatter) for n in node.nodes)
+        case Compiled.Value():
+            return node.evaluate(formatter)
+        case Compiled.Condition():
+            if bool(formatter.conds[node.variable]) is not node.negation:
+                branch, dedent_ = node.true_value, node.true_dedent
+            else:
+                branch, dedent_ = node.false_value, node.false_dedent
+            value = render_joined(branch, formatter)
+            return Compiled.dedent(value) if dedent_ else value
+
+
+def main(number: int = 500, lines: int = 1):
+    formatter = MyFormatter({"user": "<@1234>"}, {"user": True, "x": True})
+    print(f"{'depth':>5} {'output':>7} {'joined us':>10} {'stream us':>10} {'speedup':>8}")
+    for depth in range(1, 21):
+        template = MyFormatter.compile(nested(depth, lines))
+        assert template.evaluate(formatter) == render_joined(template, formatter)
+        joined = min(timeit.repeat(lambda: render_joined(template, formatter), number=number, repeat=3)) / number
+        stream = min(timeit.repeat(lambda: template.evaluate(formatter), number=number, repeat=3)) / number
+        print(f"{depth:>5} {len(template.evaluate(formatter)):>7} {joined * 1e6:>10.2f} {stream * 1e6:>10.2f} "
+              f"{joined / stream:>7.2f}x")
+
+
+if __name__ == "__main__":
+    main(*map(int, sys.argv[1:]))
@@ -0,0 +1,104 @@
+"""
+Differential check between the Canopy parser and the hand-written parser for the format language
+
+Both parsers must build the same tree for every input and raise the same ParseError (position and expected
+terminals) for every invalid input. Exits with a non-zero status on the first mismatch.
+"""
+import random
+import sys
+
+from core.util import MyFormatter
+from core.util.formatter import MyFormatterGrammar, MyFormatterParser
+
+CORPUS = [
+    "",
+    "plain text",
+    "100%",
+    "100%%",
+    "%%%",
+    "%%[",
+    "a%b%c",
+    "%[USER]%",
+    "%[user!j]%",
+    "%[user!JLu]%",
+    "%[user!jj]%",
+    "%[user!lu]%",
+    "%[user!x]%",
+    "%[user",
+    "%[]%",
+    "%[us er]%",
+    "%]",
+    "%|",
+    "%[%x%]%",
+    "%[%!x%]%",
+    "%[% \t\n x !R \r\n%|%yes%|%no%]%",
+    "%[%x!rr%|%a%]%",
+    "%[%x%|%a%|%b%|%c%]%",
+    "%[%x%|%\n    indented\n    block\n%]%",
+    "%[%x%|%%[%y%|%%[z!u]%%]%%]%",
+    "%[%x%|%unterminated",
+    "%[%x%|%%[%y%|%nested unterminated%]%",
+    "%[% %]%",
+    "trailing %[",
+    "é ü   %[user!l]% \U0001F600",
+    "{\"content\": \"%[USER!j]%\", \"embed\": {\"title\": \"%[%CATEGORY%|%%[CATEGORY!j]%%]%\"}}",
+    "%[USER]% has joined, channel \"%[CHANNEL]%\" will be created\n"
+    "It will be added %[%CATEGORY%|%to %[%NEW_CATEGORY%|%a new %]%category \"%[CATEGORY]%\"%|%outside of any category%]%"
+    "%[%MESSAGE_PERMS!r%|%\nUser will have manage message perms%]%",
+]
+
+FRAGMENTS = [
+    "a", "Z", " ", "\n", "\t", "\r\n", "é", "%", "%%", "%[", "]%", "%[%", "%|%", "%]%", "!", "!!", "j", "J", "l", "u",
+    "r", "R", "x", "_1", "user", "%[user]%", "%[user!j]%", "%[%x%|%", "%[% !x!r %|%", "[", "]", "|",
+]
+
+
+def dump(node, depth=0):
+    """Serialise the parts of a tree that MyFormatter.Types relies on"""
+    if isinstance(node, str):
+        return repr(node)
+    kind = next(k for k in ("Everything", "Value", "Condition") if isinstance(node, getattr(MyFormatter.Types, k)))
+    parts = [kind, repr(node.text), str(node.offset)]
+    match kind:
+        case "Everything":
+            parts += [dump(e, depth + 1) for e in node.elements]
+        case "Value":
+            parts += [repr(node.variable.text), repr(node.conversion.text)]
+            parts += [repr(node.conversion.elements[0].text)] if node.conversion.elements else []
+        case "Condition":
+            parts += [repr(node.negation.text), repr(node.variable.text), repr(node.conversion.text)]
+            parts += [repr(node.conversion.elements[0].text)] if node.conversion.elements else []
+            for branch in (node.true_value, node.false_value):
+                parts += [dump(branch.everything, depth + 1) if branch.elements else repr(branch.text)]
+    return "(" + " ".join(parts) + ")"
+
+
+def run(parse, string):
+    try:
+        return dump(parse(string, actions=MyFormatter.Actions, types=MyFormatter.Types))
+    except MyFormatterGrammar.ParseError as ex:
+        return "ParseError: " + str(ex)
+
+
+def fuzz(seed: int, count: int):
+    rng = random.Random(seed)
+    for _ in range(count):
+        yield "".join(rng.choice(FRAGMENTS) for _ in range(rng.randint(0, 16)))
+
+
+def main(seed: int = 0, count: int = 5000) -> int:
+    checked = errors = 0
+    for string in [*CORPUS, *fuzz(seed, count)]:
+        expected = run(MyFormatterGrammar.parse, string)
+        actual = run(MyFormatterParser.parse, string)
+        if expected != actual:
+            print(f"Mismatch for {string!r}\n  canopy: {expected}\n  linear: {actual}")
+            return 1
+        checked += 1
+        errors += expected.startswith("ParseError")
+    print(f"{checked} inputs identical ({errors} parse errors)")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(*map(int, sys.argv[1:])))
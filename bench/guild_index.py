@@ -0,0 +1,102 @@
+"""
+GuildIndex lookups against the linear scans the forms did before
+
+Builds a guild from gateway payloads with thousands of channels. Every lookup must find the same object as the scan,
+and exits with a non-zero status on the first that does not, then times both.
+
+    python -m bench.guild_index [channels] [number]
+"""
+import itertools
+import sys
+import time
+
+import discord
+from discord.state import ConnectionState
+
+from bot.GuildIndex import GuildIndex
+from core.util import tryint
+
+
+def make_guild(channels: int) -> discord.Guild:
+    state = ConnectionState(
+        dispatch=lambda *_: None, handlers={}, hooks={}, http=None, intents=discord.Intents.default()  # noqa
+    )
+    return discord.Guild(state=state, data={  # noqa
+        "id": "1", "name": "Guild", "member_count": 1, "threads": [],
+        "channels": [
+            {"id": str(1000 + i), "type": 4 if i % 30 == 0 else 0, "name": f"channel-{i}", "position": i,
+             "permission_overwrites": []}
+            for i in range(channels)
+        ],
+        "roles": [{"id": "1", "name": "@everyone", "permissions": "0", "position": 0, "color": 0, "hoist": False,
+                   "managed": False, "mentionable": False}],
+        "emojis": [{"id": str(100000 + i), "name": f"emoji{i}", "animated": False} for i in range(200)],
+    })
+
+
+def scans(guild: discord.Guild):
+    return {
+        "notify": lambda key: discord.utils.find(
+            lambda ch: (ch.id == tryint(key) or ch.name == key) and isinstance(ch, discord.abc.Messageable),
+            itertools.chain(guild.channels, guild.threads)
+        ),
+        "category": lambda key: discord.utils.find(
+            lambda ch: (ch.id == tryint(key) or ch.name.casefold() == key.casefold())
+            and isinstance(ch, discord.CategoryChannel),
+            guild.channels
+        ),
+        "emoji": lambda key: discord.utils.get(guild.emojis, name=key),
+    }
+
+
+def lookups(index: GuildIndex):
+    return {
+        "notify": lambda key: index.channel(key, discord.abc.Messageable, ignore_case=False),
+        "category": lambda key: index.category(key),
+        "emoji": lambda key: index.emoji(key),
+    }
+
+
+def keys(channels: int):
+    last = channels - 1
+    return {
+        "notify": [f"channel-{last}", f"CHANNEL-{last}", str(1000 + last), "channel-0", "missing", ""],
+        "category": [f"CHANNEL-{last // 30 * 30}", f"channel-{last}", str(1000 + last // 30 * 30), "missing", ""],
+        "emoji": ["emoji199", "EMOJI199", "emoji0", "missing", ""],
+    }
+
+
+def best(func, number: int, repeat: int = 5) -> float:
+    func()
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for _ in range(number):
+            func()
+        times.append(time.perf_counter() - start)
+    return min(times) / number * 1e6
+
+
+def main(channels: int = 3000, number: int = 100):
+    guild = make_guild(channels)
+    index = GuildIndex(guild)
+    scan, lookup = scans(guild), lookups(index)
+    for case, cases in keys(channels).items():
+        for key in cases:
+            if scan[case](key) is not lookup[case](key):
+                print(f"{case} lookup of {key!r} differs\n  scan:  {scan[case](key)!r}\n  index: {lookup[case](key)!r}")
+                sys.exit(1)
+    print(f"{channels} channels, lookups find the same objects\n")
+
+    print(f"{'case':<12} {'scan µs':>10} {'index µs':>10}")
+    print(f"{'build':<12} {'':>10} {best(lambda: GuildIndex(guild), 1):>10.1f}")
+    for case, cases in keys(channels).items():
+        key = cases[0]
+        print(f"{case:<12} {best(lambda: scan[case](key), number):>10.1f} {best(lambda: lookup[case](key), number):>10.1f}")
+    # Autocomplete, which runs on every keystroke
+    prefix = f"channel-{channels // 10}"
+    print(f"{'complete':<12} {'':>10} {best(lambda: index.channels.with_prefix(prefix), number):>10.1f}")
+
+
+if __name__ == "__main__":
+    main(*map(int, sys.argv[1:]))
@@ -0,0 +1,106 @@
+"""
+JSONCodec with orjson against the json module
+
+Decoding must return the same value or raise the same error message, and encoding the prefill text must give the
+same string, for every input in the corpus and a set of random ones. Exits with a non-zero status on the first
+mismatch, then times both.
+
+    python -m bench.json_codec [number] [seed]
+"""
+import json
+import math
+import random
+import sys
+import time
+from typing import Any
+
+from core.util import JSONCodec
+from bench.suite import EMBEDS_10, ROLES_25
+
+FAST, STDLIB = JSONCodec(fast=True), JSONCodec(fast=False)
+
+STRINGS = ["", "a", "é", "\U0001F600", "\n", "\t\r\b\f", "\x00\x1f\x7f", "  ", '"\\/', "  spaced  ", "\ud800"]
+NUMBERS = [0, -1, 2 ** 63 - 1, -2 ** 63, 2 ** 64 - 1, 2 ** 64, -2 ** 63 - 1, 10 ** 30, 0.1, -0.0, 1e16, 1e400, True,
+           False, None]
+DOCUMENTS = [
+    '{"content": "Hello"}', EMBEDS_10.replace("%", ""), ROLES_25, "[]", "{}", "", " ", "[1,]", '{"a" 1}', "NaN",
+    "Infinity", "-Infinity", "1e400", "12345678901234567890", "-12345678901234567890", "1234567890123456789",
+    '"\\ud800"', '"\\ud83d\\ude00"', '{"a": 1, "a": 2}', "﻿[]", '"\x01"', "[" * 100 + "]" * 100, "01", "1.",
+    ".5", '{"role": 123456789012345678901234567890}', '"unterminated', "[1] x", "tru", "-", "1e5", "0e0",
+]
+
+
+def random_value(rng: random.Random, depth: int = 0) -> Any:
+    match rng.randrange(6 if depth < 5 else 2):
+        case 0:
+            return rng.choice(STRINGS) + rng.choice(STRINGS)
+        case 1:
+            return rng.choice(NUMBERS)
+        case 2 | 3:
+            return {rng.choice(STRINGS) + str(i): random_value(rng, depth + 1) for i in range(rng.randrange(4))}
+        case _:
+            items = [random_value(rng, depth + 1) for _ in range(rng.randrange(4))]
+            return tuple(items) if rng.random() < 0.2 else items
+
+
+def outcome(func, *args, **kwargs) -> Any:
+    try:
+        result = func(*args, **kwargs)
+    except Exception as ex:
+        return type(ex), str(ex)
+    # NaN never equals itself
+    return repr(result) if isinstance(result, float) and math.isnan(result) else result
+
+
+def check(seed: int, count: int = 5000) -> int:
+    rng = random.Random(seed)
+    checked = 0
+    for _ in range(count):
+        value = random_value(rng)
+        indent = rng.choice([None, 1, 2, 4, 8])
+        expected = outcome(json.dumps, value, ensure_ascii=False, indent=indent)
+        actual = outcome(FAST.dumps, value, indent)
+        if expected != actual:
+            print(f"dumps mismatch for {value!r} with indent {indent}\n  json:  {expected!r}\n  codec: {actual!r}")
+            sys.exit(1)
+        if isinstance(expected, str):
+            DOCUMENTS.append(expected)
+        checked += 1
+    for document in DOCUMENTS:
+        if repr(outcome(json.loads, document)) != repr(outcome(FAST.loads, document)):
+            print(f"loads mismatch for {document!r}\n  json:  {outcome(json.loads, document)!r}\n"
+                  f"  codec: {outcome(FAST.loads, document)!r}")
+            sys.exit(1)
+        checked += 1
+    return checked
+
+
+def best(func, number: int, repeat: int = 5) -> float:
+    func()
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for _ in range(number):
+            func()
+        times.append(time.perf_counter() - start)
+    return min(times) / number * 1e6
+
+
+def main(number: int = 2000, seed: int = 0):
+    print(f"{check(seed)} inputs give the same result\n")
+    roles, embeds = json.loads(ROLES_25), json.loads(EMBEDS_10.replace("%", ""))
+    cases = {
+        "loads roles_25": lambda codec: codec.loads(ROLES_25),
+        "loads embeds_10": lambda codec: codec.loads(EMBEDS_10),
+        "loads invalid": lambda codec: outcome(codec.loads, ROLES_25[:-1]),
+        "dumps roles_25 indent=4": lambda codec: codec.dumps(roles, indent=4),
+        "dumps embeds_10 indent=4": lambda codec: codec.dumps(embeds, indent=4),
+    }
+    print(f"{'case':<26} {'json µs':>9} {'codec µs':>9} {'speedup':>8}")
+    for case, func in cases.items():
+        stdlib, fast = best(lambda: func(STDLIB), number), best(lambda: func(FAST), number)
+        print(f"{case:<26} {stdlib:>9.2f} {fast:>9.2f} {stdlib / fast:>7.1f}x")
+
+
+if __name__ == "__main__":
+    main(*map(int, sys.argv[1:]))
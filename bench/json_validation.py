@@ -0,0 +1,145 @@
+"""
+Compiled schema validators against the jsonschema validators they are compiled from
+
+Every instance in the corpus and a set of random mutations of it must raise the same first error (message, path,
+keyword, value and schema path) from both, or pass both. Exits with a non-zero status on the first mismatch,
+then times both on valid and invalid instances.
+
+    python -m bench.json_validation [number] [seed]
+"""
+import copy
+import json
+import random
+import sys
+import time
+from typing import Any
+
+from core.util import CompiledValidator
+from core.util.discord import ContentValidation
+from bot.commands.admin.Autorole import AutoroleButtonsForm, AutoroleDropdownForm
+
+EMBED = {"title": "Title", "description": "Description", "color": 3447003, "footer": {"text": "Footer"}}
+CONTENT = [
+    {"content": "Hello"},
+    {"content": "Hello", "embed": EMBED},
+    {"embeds": [EMBED] * 10},
+    {"content": "Hello", "embeds": [EMBED] * 3},
+    {}, [], "text", None,
+    {"content": ""},
+    {"content": 1},
+    {"content": "Hello", "embed": EMBED, "embeds": [EMBED]},
+    {"embed": {}},
+    {"embeds": []},
+    {"embeds": [EMBED] * 11},
+    {"embeds": [EMBED, {}, "x"]},
+    {"content": "Hello", "extra": 1, "another": 2},
+    {"extra": 1, "embed": EMBED, "embeds": [EMBED]},
+]
+BUTTONS = [
+    [{"role": 1, "style": "green", "emoji": "thumbsup", "label": "Role"}] * 25,
+    [{"role": 1}],
+    [], {}, None,
+    [{"role": 1}] * 26,
+    [{"role": -1}],
+    [{"role": 1.0}],
+    [{"role": True}],
+    [{"role": "1"}],
+    [{"style": "green"}],
+    [{"role": 1, "style": "pink"}],
+    [{"role": 1, "emoji": ""}],
+    [{"role": 1, "label": 5}],
+    [{"role": 1, "colour": "red"}],
+    [{"role": 1}, {"role": 2, "x": 1, "y": 2}, {"role": -5}],
+]
+DROPDOWN = [
+    [{"role": 1, "emoji": "thumbsup", "label": "Role", "description": "Description"}] * 25,
+    [{"role": 1, "description": ""}],
+    [{"role": 1, "style": "green"}],
+]
+
+VALIDATORS = {
+    "content": (ContentValidation().validator, CONTENT),
+    "roles_buttons": (AutoroleButtonsForm.roles_validation.validator, BUTTONS),
+    "roles_dropdown": (AutoroleDropdownForm.roles_validation.validator, DROPDOWN + BUTTONS),
+}
+
+LEAVES = ["", "x", "green", "pink", 0, 1, -1, 1.0, 1.5, True, False, None, [], {}, [1], {"a": 1}]
+KEYS = ["content", "embed", "embeds", "role", "style", "emoji", "label", "description", "title", "extra"]
+
+
+def mutate(rng: random.Random, value: Any, depth: int = 0) -> Any:
+    """Replace, add or remove one element somewhere in value"""
+    if isinstance(value, dict) and value and rng.random() < 0.7 and depth < 4:
+        key = rng.choice(list(value))
+        match rng.randrange(3):
+            case 0:
+                value[key] = mutate(rng, value[key], depth + 1)
+            case 1:
+                del value[key]
+            case _:
+                value[rng.choice(KEYS)] = rng.choice(LEAVES + [copy.deepcopy(EMBED)])
+        return value
+    if isinstance(value, list) and value and rng.random() < 0.7 and depth < 4:
+        i = rng.randrange(len(value))
+        match rng.randrange(3):
+            case 0:
+                value[i] = mutate(rng, value[i], depth + 1)
+            case 1:
+                del value[i]
+            case _:
+                value.insert(i, copy.deepcopy(rng.choice(value)))
+        return value
+    return copy.deepcopy(rng.choice(LEAVES))
+
+
+def first_error(validator: Any, instance: Any) -> tuple | None:
+    try:
+        validator.validate(instance)
+    except Exception as ex:
+        return (type(ex), ex.message, ex.json_path, ex.validator, ex.validator_value, list(ex.schema_path),
+                ex.instance)
+    return None
+
+
+def check(seed: int, mutations: int = 2000) -> int:
+    rng = random.Random(seed)
+    checked = 0
+    for name, (compiled, corpus) in VALIDATORS.items():
+        assert isinstance(compiled, CompiledValidator), f"{name} was not compiled"
+        interpreted = compiled.interpreted
+        cases = [copy.deepcopy(c) for c in corpus]
+        for _ in range(mutations):
+            cases.append(mutate(rng, copy.deepcopy(rng.choice(corpus))))
+        for instance in cases:
+            expected, actual = first_error(interpreted, instance), first_error(compiled, instance)
+            if expected != actual or interpreted.is_valid(instance) != compiled.is_valid(instance):
+                print(f"mismatch in {name} for {json.dumps(instance)}\n  jsonschema: {expected}\n  compiled:   {actual}")
+                sys.exit(1)
+            checked += 1
+    return checked
+
+
+def best(func, number: int, repeat: int = 5) -> float:
+    func()
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for _ in range(number):
+            func()
+        times.append(time.perf_counter() - start)
+    return min(times) / number * 1e6
+
+
+def main(number: int = 2000, seed: int = 0):
+    print(f"{check(seed)} instances raise the same first error\n")
+    print(f"{'case':<34} {'jsonschema µs':>14} {'compiled µs':>12} {'speedup':>8}")
+    for name, (compiled, corpus) in VALIDATORS.items():
+        cases = {"valid": corpus[0], "invalid (last element)": corpus[-1]}
+        for case, instance in cases.items():
+            interpreted = best(lambda: first_error(compiled.interpreted, instance), number)
+            generated = best(lambda: first_error(compiled, instance), number)
+            print(f"{name + ' ' + case:<34} {interpreted:>14.2f} {generated:>12.2f} {interpreted / generated:>7.1f}x")
+
+
+if __name__ == "__main__":
+    main(*map(int, sys.argv[1:]))
@@ -0,0 +1,124 @@
+"""
+Generated model codecs against dacite.from_dict and dataclasses.asdict
+
+Decoding must give equal instances, with the same field types, or raise the same error with the same field path, for
+stored guild documents and mutations of them. Encoding must give the same dict with the same value types. Exits with a
+non-zero status on the first mismatch, then times both.
+
+    python -m bench.model_codec [number] [seed]
+"""
+import copy
+import dataclasses
+import random
+import sys
+import time
+from typing import Any
+
+import dacite
+from bson import Int64
+
+from db.models.Guild import Guild
+from db.models.types import from_dict, asdict
+
+AUTOCHANNEL = {
+    "enabled": True, "notify": 10_000_000_000_000_000_000, "content": "Welcome %user_mention%",
+    "format": "%user_name%'s channel", "category": 1_000_000_000_000_000_000, "messagePerms": False,
+}
+DOCUMENTS = [
+    {"_id": 1_000_000_000_000_000_001},
+    {"_id": 11_000_000_000_000_000_000, "autochannel": AUTOCHANNEL},
+    {"_id": 1, "autochannel": AUTOCHANNEL | {"category": None}},
+    {"_id": 2, "autochannel": {"enabled": False}},
+    {"_id": 3, "autochannel": None, "unknown": [1, 2]},
+]
+VALUES = [None, True, 0, 1, -1, 2 ** 63 - 1, 2 ** 64 - 1, Int64(5), 1.5, "", "text", [], {}, {"enabled": True}]
+
+
+def dacite_from_dict(type_, data):
+    """from_dict before codecs"""
+    return dacite.from_dict(type_, data)
+
+
+def dataclasses_asdict(obj) -> dict:
+    """asdict before codecs"""
+    return dataclasses.asdict(obj)
+
+
+def typed(value) -> Any:
+    """value with the type of every part, since Int64(1) == 1"""
+    if dataclasses.is_dataclass(value):
+        return type(value), {f.name: typed(getattr(value, f.name)) for f in dataclasses.fields(value)}
+    if isinstance(value, dict):
+        return {k: typed(v) for k, v in value.items()}
+    return type(value), value
+
+
+def outcome(func, *args) -> Any:
+    try:
+        return typed(func(*args))
+    except dacite.DaciteFieldError as ex:
+        return type(ex), str(ex), ex.field_path
+    except Exception as ex:
+        return type(ex), str(ex)
+
+
+def mutate(rng: random.Random, document: dict) -> dict:
+    document = copy.deepcopy(document)
+    target = document["autochannel"] if isinstance(document.get("autochannel"), dict) and rng.random() < 0.7 \
+        else document
+    key = rng.choice(list(target) + ["_id", "enabled", "autochannel", "extra"])
+    if rng.random() < 0.3:
+        target.pop(key, None)
+    else:
+        target[key] = rng.choice(VALUES + [copy.deepcopy(AUTOCHANNEL)])
+    return document
+
+
+def check(seed: int, count: int = 20000) -> int:
+    rng = random.Random(seed)
+    documents = DOCUMENTS + [None, {}] + [mutate(rng, rng.choice(DOCUMENTS)) for _ in range(count)]
+    for document in documents:
+        expected, actual = outcome(dacite_from_dict, Guild, document), outcome(from_dict, Guild, document)
+        if expected != actual:
+            print(f"decoding {document!r} differs\n  dacite: {expected!r}\n  codec:  {actual!r}")
+            sys.exit(1)
+        if expected[0] is Guild:
+            guild = dacite_from_dict(Guild, document)
+            objects = [guild] + ([guild.autochannel] if guild.autochannel else [])
+            for obj in objects:
+                expected, actual = outcome(dataclasses_asdict, obj), outcome(asdict, obj)
+                if expected != actual:
+                    print(f"encoding {obj!r} differs\n  dataclasses: {expected!r}\n  codec:       {actual!r}")
+                    sys.exit(1)
+    return len(documents)
+
+
+def best(func, number: int, repeat: int = 5) -> float:
+    func()
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for _ in range(number):
+            func()
+        times.append(time.perf_counter() - start)
+    return min(times) / number * 1e6
+
+
+def main(number: int = 10000, seed: int = 0):
+    print(f"{check(seed)} documents give the same result\n")
+
+    full = dacite_from_dict(Guild, DOCUMENTS[1])
+    print(f"{'case':<24} {'dacite µs':>10} {'codec µs':>10} {'speedup':>8}")
+    cases = {
+        "decode guild": (lambda: dacite_from_dict(Guild, DOCUMENTS[0]), lambda: from_dict(Guild, DOCUMENTS[0])),
+        "decode autochannel": (lambda: dacite_from_dict(Guild, DOCUMENTS[1]), lambda: from_dict(Guild, DOCUMENTS[1])),
+        "encode autochannel": (lambda: dataclasses_asdict(full.autochannel), lambda: asdict(full.autochannel)),
+        "encode guild": (lambda: dataclasses_asdict(full), lambda: asdict(full)),
+    }
+    for case, (before, after) in cases.items():
+        before, after = best(before, number), best(after, number)
+        print(f"{case:<24} {before:>10.2f} {after:>10.2f} {before / after:>7.1f}x")
+
+
+if __name__ == "__main__":
+    main(*map(int, sys.argv[1:]))
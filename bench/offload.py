@@ -0,0 +1,95 @@
+"""
+Event loop stalls while parsing and formatting large modal inputs, inline against offloaded
+
+Every task must give the same result, or raise the same error, from each executor. Exits with a non-zero status on
+the first that does not. Then runs each task repeatedly next to a ticker that should wake every millisecond, and
+reports the longest the loop went without it (what a gateway heartbeat would wait) and the offloader's stats.
+
+    python -m bench.offload [number]
+"""
+import asyncio
+import itertools
+import sys
+import time
+
+from bot.commands.admin.Autorole import AutoroleButtonsForm
+from core.util import MyFormatter, MyJSONValidationError, Offloader
+from bench.suite import EMBEDS_10, ROLES_25, MODAL_4000
+
+CONTENT = EMBEDS_10.replace("%", "")
+FRESH = itertools.count()
+# Task type, then a function of the iteration giving the function to run and its arguments. Cold format strings
+# differ every call, so they are parsed every time as a new one from a modal would be.
+TASKS = {
+    "content embeds_10": ("content", lambda i: (AutoroleButtonsForm.parse_content, CONTENT)),
+    "content invalid": ("content", lambda i: (AutoroleButtonsForm.parse_content, CONTENT[:-1])),
+    "roles roles_25": ("roles", lambda i: (AutoroleButtonsForm.parse_roles, ROLES_25)),
+    "format modal_4000": ("format", lambda i: (MyFormatter.format_many, MODAL_4000, [{"user": "User"}] * 25)),
+    "format cold": ("format", lambda i: (MyFormatter.format_many, f"{next(FRESH)}{MODAL_4000}", [{"user": "User"}] * 25)),
+    "format invalid": ("format", lambda i: (MyFormatter.format_many, f"%[{next(FRESH)}{MODAL_4000}", [{"user": "User"}])),
+    "format missing": ("format", lambda i: (MyFormatter.format_many, MODAL_4000, [{"rolename": "Role"}])),
+}
+KINDS = ("inline", "thread", "process")
+
+
+def outcome(value_or_error) -> object:
+    if isinstance(value_or_error, MyJSONValidationError):
+        return type(value_or_error), value_or_error.message, value_or_error.path
+    if isinstance(value_or_error, Exception):
+        return type(value_or_error), str(value_or_error)
+    if isinstance(value_or_error, dict) and "embeds" in value_or_error:
+        return value_or_error["content"], [e.to_dict() for e in value_or_error["embeds"]]
+    return value_or_error
+
+
+async def run(offloader: Offloader, task: str, func, *args) -> object:
+    # Every input is large enough to offload, so the size given does not matter
+    try:
+        return outcome(await offloader.run(task, 0, func, *args))
+    except Exception as ex:
+        return outcome(ex)
+
+
+async def ticker(stop: asyncio.Event) -> float:
+    """Longest gap between wake-ups of a task that sleeps for 1 ms at a time"""
+    longest, last = 0.0, time.perf_counter()
+    while not stop.is_set():
+        await asyncio.sleep(0.001)
+        now = time.perf_counter()
+        longest, last = max(longest, now - last), now
+    return longest
+
+
+async def main(number: int = 20):
+    offloaders = {kind: Offloader(threshold=0, executors=dict.fromkeys(["content", "roles", "format"], kind))
+                  for kind in KINDS}
+    for name, (task, make) in TASKS.items():
+        made = make(-1)
+        results = [await run(offloaders[kind], task, *made) for kind in KINDS]
+        if any(r != results[0] for r in results):
+            print(f"{name} differs between executors\n" + "\n".join(f"  {k}: {r!r}" for k, r in zip(KINDS, results)))
+            sys.exit(1)
+    print(f"{len(TASKS)} tasks give the same result from every executor\n")
+
+    print(f"{'case':<20} {'executor':<9} {'longest stall ms':>17} {'awaited ms':>11}")
+    for name, (task, make) in TASKS.items():
+        for kind, offloader in offloaders.items():
+            stop = asyncio.Event()
+            ticking = asyncio.create_task(ticker(stop))
+            await asyncio.sleep(0.005)
+            start = time.perf_counter()
+            for i in range(number):
+                await run(offloader, task, *make(i))
+            awaited = (time.perf_counter() - start) / number * 1e3
+            stop.set()
+            print(f"{name:<20} {kind:<9} {await ticking * 1e3:>17.2f} {awaited:>11.3f}")
+
+    print()
+    for kind, offloader in offloaders.items():
+        for task, stats in offloader.stats().items():
+            print(f"{kind:<8} {task:<8} {stats}")
+        offloader.shutdown()
+
+
+if __name__ == "__main__":
+    asyncio.run(main(*map(int, sys.argv[1:])))
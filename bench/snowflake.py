@@ -0,0 +1,121 @@
+"""
+Snowflakes converted by the client's type registry against the to_bytes conversions done by hand before
+
+Documents encoded with the registry must store the same values as ones converted by hand, so stored data is read
+the same either way, and must decode to the snowflakes they were made from, nested in arrays and documents included.
+Out of range values must be rejected as without the registry. Exits with a non-zero status on the first mismatch,
+then times encoding and decoding a guild document both ways.
+
+    python -m bench.snowflake [number] [seed]
+"""
+import random
+import sys
+import time
+from typing import Any
+
+import bson
+from bson import Int64
+from bson.codec_options import CodecOptions
+
+from db.snowflake import type_registry
+
+OPTIONS = CodecOptions(type_registry=type_registry)
+EDGES = [0, 1, 2 ** 31, 2 ** 63 - 1, 2 ** 63, 2 ** 64 - 2, 2 ** 64 - 1]
+OUT_OF_RANGE = [2 ** 64, 2 ** 70, -2 ** 63 - 1, {1, 2}]
+
+
+def to_stored(n: int) -> Int64:
+    """uint64_to_int before the registry"""
+    return Int64(int.from_bytes(n.to_bytes(8, byteorder='little', signed=False), byteorder='little', signed=True))
+
+
+def from_stored(n: int) -> Int64:
+    """int_to_uint64 before the registry"""
+    return Int64(int.from_bytes(n.to_bytes(8, byteorder='little', signed=True), byteorder='little', signed=False))
+
+
+def guild(ids: list[int]) -> dict:
+    return {"_id": ids[0], "autochannel": {
+        "enabled": True, "notify": ids[1], "content": "Welcome", "format": "channel", "category": ids[2],
+        "messagePerms": False,
+    }, "roles": ids[3:], "pairs": [{"role": i, "emoji": "x"} for i in ids[3:]]}
+
+
+def by_hand(document: Any, convert) -> Any:
+    if isinstance(document, dict):
+        return {k: by_hand(v, convert) for k, v in document.items()}
+    if isinstance(document, list):
+        return [by_hand(v, convert) for v in document]
+    return convert(document) if isinstance(document, int) and not isinstance(document, bool) else document
+
+
+def model_fields(document: dict, convert) -> dict:
+    """Convert the fields the models had, as db.Guilds and the codecs did by hand"""
+    autochannel = document["autochannel"]
+    return document | {"_id": convert(document["_id"]), "autochannel": autochannel | {
+        "notify": convert(autochannel["notify"]), "category": convert(autochannel["category"])
+    }}
+
+
+def outcome(func, *args) -> Any:
+    try:
+        return func(*args)
+    except Exception as ex:
+        return type(ex), str(ex)
+
+
+def check(seed: int, count: int = 5000) -> int:
+    rng = random.Random(seed)
+    documents = [guild(EDGES)] + [
+        guild([rng.choice([rng.randrange(2 ** 64), rng.randrange(2 ** 40, 2 ** 63), rng.choice(EDGES)])
+               for _ in range(rng.randrange(3, 10))])
+        for _ in range(count)
+    ]
+    for document in documents:
+        encoded = bson.encode(document, codec_options=OPTIONS)
+        # Ints below 2 ** 31 are int32 unless converted to Int64 by hand, which reads back the same
+        if bson.decode(encoded) != bson.decode(bson.encode(by_hand(document, to_stored))):
+            print(f"stored {document!r} differs")
+            sys.exit(1)
+        decoded = bson.decode(encoded, codec_options=OPTIONS)
+        if decoded != document or decoded != by_hand(bson.decode(encoded), from_stored):
+            print(f"decoded {document!r} differs\n  registry: {decoded!r}")
+            sys.exit(1)
+    for value in OUT_OF_RANGE:
+        expected, actual = outcome(bson.encode, {"_id": value}), outcome(bson.encode, {"_id": value}, False, OPTIONS)
+        if expected != actual:
+            print(f"encoding {value!r} differs\n  default:  {expected!r}\n  registry: {actual!r}")
+            sys.exit(1)
+    return len(documents) + len(OUT_OF_RANGE)
+
+
+def best(func, number: int, repeat: int = 5) -> float:
+    func()
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for _ in range(number):
+            func()
+        times.append(time.perf_counter() - start)
+    return min(times) / number * 1e6
+
+
+def main(number: int = 10000, seed: int = 0):
+    print(f"{check(seed)} documents give the same result\n")
+
+    document = guild([2 ** 64 - 5, 1_100_000_000_000_000_000, 2 ** 63 + 5] + [2 ** 60 + i for i in range(5)])
+    stored = bson.encode(by_hand(document, to_stored))
+    cases = {
+        "encode guild": (lambda: bson.encode(model_fields(document, to_stored)),
+                         lambda: bson.encode(document, codec_options=OPTIONS)),
+        "decode guild": (lambda: model_fields(bson.decode(stored), from_stored),
+                         lambda: bson.decode(stored, codec_options=OPTIONS)),
+        "convert one id": (lambda: to_stored(2 ** 63 + 5), lambda: type_registry.fallback_encoder(2 ** 63 + 5)),
+    }
+    print(f"{'case':<16} {'by hand µs':>11} {'registry µs':>12}")
+    for case, (before, after) in cases.items():
+        print(f"{case:<16} {best(before, number):>11.3f} {best(after, number):>12.3f}")
+
+
+if __name__ == "__main__":
+    main(*map(int, sys.argv[1:]))
@@ -0,0 +1,217 @@
+"""
+Benchmark suite for the code that runs on every member join and every autorole form
+
+Every benchmark runs over a fixed corpus and reports throughput, per call latency percentiles and memory allocated
+per call. Results can be saved as JSON and two saved runs compared side by side.
+
+    python -m bench.suite [--number N] [--filter TEXT] [--json results.json]
+    python -m bench.suite --compare before.json after.json
+"""
+import argparse
+import datetime
+import gc
+import json
+import platform
+import statistics
+import sys
+import time
+import tracemalloc
+from typing import Any, Callable, NamedTuple
+
+from core.util import MyFormatter, make_escape, make_translation
+from core.util.discord import ContentValidation, ContentTemplate, CHANNEL_NAME
+from bot.commands.admin.Autochannel import AutochannelNotification
+from bot.commands.admin.Autorole import AutoroleButtonsForm
+from bench.formatter_nesting import nested
+
+# Corpus
+
+LABEL = "%[ROLENAME]%"
+DEFAULT_CONTENT = AutochannelNotification.default_content
+MODAL_4000 = ("Welcome %[USER]% to the server, 100%% of us are happy! %[%X%|%yes%|%no%]% " * 60)[:3960] + "%[USER]%"
+NESTED_20 = nested(20, 3)
+EMBEDS_10 = '{"content": "%[DEFAULT!j]%", "embeds": [' + ", ".join(
+    f'{{"title": "Embed {i} for %[USER!j]%", "description": "%[%CATEGORY%|%In %[CATEGORY!j]%%|%No category%]%", '
+    f'"color": {i * 1000}, "fields": [{{"name": "User", "value": "%[USER!j]%", "inline": true}}, '
+    f'{{"name": "Channel", "value": "%[CHANNEL!j]%", "inline": true}}], "footer": {{"text": "Autochannel"}}}}'
+    for i in range(10)
+) + ']}'
+ROLES_25 = json.dumps([
+    {"role": 100000000000000000 + i, "style": "green", "emoji": "thumbsup", "label": f"Role {i} %[ROLENAME]%"}
+    for i in range(25)
+])
+
+JOIN_VARS = {
+    "default": DEFAULT_CONTENT, "user": "<@123456789012345678>", "channel": "new-user", "category": "Joins",
+    "new_category": False, "message_perms": True,
+}
+MODAL_VARS = {"user": "<@123456789012345678>", "x": True}
+NESTED_VARS = {"user": "<@123456789012345678>", "x": True}
+
+CONTENT_VALIDATION = ContentValidation()
+ESCAPE, UNESCAPE, _ = make_escape("\\", "%[]|")
+TRANSLATE, _ = make_translation({"&": "&amp;", "<": "&lt;", ">": "&gt;"})
+ESCAPED_4000 = ESCAPE(MODAL_4000)
+# Message sent on join, which editing the channel name re-renders
+EMBEDS_10_RENDERED = ContentTemplate.get(EMBEDS_10).render_incremental(None, recurse=("default",), **JOIN_VARS)
+
+
+def _cold(format_string: str, **kwargs) -> Callable[[], str]:
+    def call():
+        MyFormatter.template_cache.clear()
+        return MyFormatter.format(format_string, **kwargs)
+    return call
+
+
+class Benchmark(NamedTuple):
+    name: str
+    func: Callable[[], Any]
+
+
+BENCHMARKS = [
+    Benchmark("format/label", lambda: MyFormatter.format(LABEL, rolename="Member")),
+    Benchmark("format/default_content", lambda: MyFormatter.format("%[DEFAULT]%", recurse=("default",), **JOIN_VARS)),
+    Benchmark("format/modal_4000", lambda: MyFormatter.format(MODAL_4000, **MODAL_VARS)),
+    Benchmark("format/nested_20", lambda: MyFormatter.format(NESTED_20, **NESTED_VARS)),
+    Benchmark("format/embeds_10", lambda: MyFormatter.format(EMBEDS_10, recurse=("default",), **JOIN_VARS)),
+    Benchmark("format_many/labels_25", lambda: MyFormatter.format_many(
+        LABEL, [{"rolename": f"Role {i}"} for i in range(25)]
+    )),
+    Benchmark("convert/channel_name", lambda: MyFormatter.convert("Some Member Name With Spaces", CHANNEL_NAME)),
+    Benchmark("convert/json_upper", lambda: MyFormatter.convert("Some \"Member\" Name\nWith Spaces", "ju")),
+    Benchmark("format_cold/default_content", _cold(DEFAULT_CONTENT, **JOIN_VARS)),
+    Benchmark("format_cold/modal_4000", _cold(MODAL_4000, **MODAL_VARS)),
+    Benchmark("content/text", lambda: CONTENT_VALIDATION.parse(
+        MyFormatter.format("%[DEFAULT]%", recurse=("default",), **JOIN_VARS)
+    )),
+    Benchmark("content/embeds_10", lambda: CONTENT_VALIDATION.parse(
+        MyFormatter.format(EMBEDS_10, recurse=("default",), **JOIN_VARS)
+    )),
+    Benchmark("content_template/text", lambda: ContentTemplate.get("%[DEFAULT]%").render(
+        recurse=("default",), **JOIN_VARS
+    )),
+    Benchmark("content_template/embeds_10", lambda: ContentTemplate.get(EMBEDS_10).render(
+        recurse=("default",), **JOIN_VARS
+    )),
+    Benchmark("content_template/embeds_10_edit", lambda: ContentTemplate.get(EMBEDS_10).render_incremental(
+        EMBEDS_10_RENDERED, recurse=("default",), **{**JOIN_VARS, "channel": "renamed-user"}
+    )),
+    Benchmark("json_validation/roles_25", lambda: AutoroleButtonsForm.roles_validation.parse(ROLES_25)),
+    Benchmark("escape/make_escape", lambda: make_escape("\\", "%[]|")),
+    Benchmark("escape/escape_4000", lambda: ESCAPE(MODAL_4000)),
+    Benchmark("escape/unescape_4000", lambda: UNESCAPE(ESCAPED_4000)),
+    Benchmark("escape/translate_4000", lambda: TRANSLATE(MODAL_4000)),
+    Benchmark("escape/formatter_escape_4000", lambda: MyFormatter.escape(MODAL_4000)),
+]
+
+
+# Measurement
+
+def measure(func: Callable[[], Any], number: int, samples: int = 200) -> dict[str, float]:
+    """
+    Time func in samples of roughly equal batches, long enough for the clock to resolve
+
+    Latency percentiles are taken over the average call time of each batch
+    """
+    func()
+    start = time.perf_counter()
+    func()
+    once = max(time.perf_counter() - start, 1e-7)
+    batch = max(1, min(number, int(20e-6 / once)))
+    rounds = max(samples, number // batch)
+
+    gc.collect()
+    times = []
+    for _ in range(rounds):
+        start = time.perf_counter()
+        for _ in range(batch):
+            func()
+        times.append((time.perf_counter() - start) / batch)
+    times.sort()
+
+    gc.collect()
+    gc.disable()
+    try:
+        tracemalloc.start()
+        peak = 0
+        for _ in range(min(number, 50)):
+            tracemalloc.reset_peak()
+            func()
+            peak = max(peak, tracemalloc.get_traced_memory()[1])
+        tracemalloc.stop()
+        # Block counts are taken outside of tracemalloc, which allocates blocks of its own
+        blocks = sys.getallocatedblocks()
+        for _ in range(min(number, 50)):
+            func()
+        blocks = (sys.getallocatedblocks() - blocks) / min(number, 50)
+    finally:
+        gc.enable()
+
+    return {
+        "ops_per_sec": 1 / statistics.fmean(times),
+        "p50_us": statistics.median(times) * 1e6,
+        "p99_us": times[min(len(times) - 1, int(len(times) * 0.99))] * 1e6,
+        "peak_kib": peak / 1024,
+        "retained_blocks": blocks,
+    }
+
+
+def run(number: int, name_filter: str | None) -> dict[str, Any]:
+    results = {}
+    print(f"{'benchmark':<36} {'ops/s':>12} {'p50 µs':>10} {'p99 µs':>10} {'peak KiB':>9} {'blocks':>7}")
+    for benchmark in BENCHMARKS:
+        if name_filter and name_filter not in benchmark.name:
+            continue
+        result = results[benchmark.name] = measure(benchmark.func, number)
+        print(f"{benchmark.name:<36} {result['ops_per_sec']:>12,.0f} {result['p50_us']:>10.2f} "
+              f"{result['p99_us']:>10.2f} {result['peak_kib']:>9.1f} {result['retained_blocks']:>7.1f}")
+    return {
+        "meta": {
+            "date": datetime.datetime.now(datetime.timezone.utc).isoformat(timespec="seconds"),
+            "python": platform.python_version(),
+            "implementation": platform.python_implementation(),
+            "machine": platform.machine(),
+            "number": number,
+        },
+        "results": results,
+    }
+
+
+def compare(before_path: str, after_path: str):
+    with open(before_path) as f:
+        before = json.load(f)
+    with open(after_path) as f:
+        after = json.load(f)
+    print(f"before: {before_path} ({before['meta']['date']}, Python {before['meta']['python']})")
+    print(f"after:  {after_path} ({after['meta']['date']}, Python {after['meta']['python']})\n")
+    print(f"{'benchmark':<36} {'ops/s before':>13} {'ops/s after':>13} {'change':>8} "
+          f"{'p99 before':>11} {'p99 after':>10} {'KiB before':>11} {'KiB after':>10}")
+    for name in dict.fromkeys([*before["results"], *after["results"]]):
+        a, b = before["results"].get(name), after["results"].get(name)
+        if a is None or b is None:
+            print(f"{name:<36} {'only in ' + ('after' if a is None else 'before'):>13}")
+            continue
+        print(f"{name:<36} {a['ops_per_sec']:>13,.0f} {b['ops_per_sec']:>13,.0f} "
+              f"{b['ops_per_sec'] / a['ops_per_sec'] - 1:>+8.1%} {a['p99_us']:>11.2f} {b['p99_us']:>10.2f} "
+              f"{a['peak_kib']:>11.1f} {b['peak_kib']:>10.1f}")
+
+
+def main(argv: list[str] = None):
+    parser = argparse.ArgumentParser(prog="python -m bench.suite", description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--number", type=int, default=2000, help="calls to time per benchmark")
+    parser.add_argument("--filter", help="only run benchmarks whose name contains this")
+    parser.add_argument("--json", metavar="PATH", help="save results to this file")
+    parser.add_argument("--compare", nargs=2, metavar=("BEFORE", "AFTER"), help="compare two saved results")
+    args = parser.parse_args(argv)
+
+    if args.compare:
+        compare(*args.compare)
+        return
+    results = run(args.number, args.filter)
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
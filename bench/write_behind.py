@@ -0,0 +1,247 @@
+"""
+Differential check of WriteBehind against writing straight to the collection
+
+Random creates, deletes and sets go through a WriteBehind over a fake collection, and straight to reference
+documents. Flushes fail before writing anything, partway through a batch, or with an error that is not from pymongo.
+Writes are made while a flush is in progress, and the journal is reopened as after going down: between flushes,
+partway through one, and with a torn last line. Every document read through the pending writes, and the collection
+once everything is flushed, must match the reference. Also checks that run keeps flushing after any error and stops
+when cancelled. Exits with a non-zero status on the first mismatch, then shows how many writes were coalesced.
+
+    python -m bench.write_behind [count] [seed]
+"""
+import asyncio
+import copy
+import logging
+import os
+import random
+import sys
+import tempfile
+from typing import Any
+
+from pymongo import DeleteOne, InsertOne, ReplaceOne, UpdateOne
+from pymongo.errors import AutoReconnect, BulkWriteError, PyMongoError
+
+from core.util import json_codec
+from db.writebehind import WriteBehind
+
+IDS = range(1, 6)
+PATHS = ["a", "a.b", "a.b.d", "c"]
+# Line separators and lone surrogates in strings have to come back from the journal as they went in
+VALUES = [1, "x", None, [], {"b": 1}, {"b": {"d": 2}, "e": 3}, "é\u2028\x85\x1c\r\n", "\ud800", 2 ** 64 - 1]
+
+
+def set_path(document: dict, path: str, value: Any):
+    """$set of a dotted path, replacing anything that is not a document on the way to it"""
+    *parents, last = path.split(".")
+    for key in parents:
+        if not isinstance(document.get(key), dict):
+            document[key] = {}
+        document = document[key]
+    document[last] = copy.deepcopy(value)
+
+
+class FakeCollection:
+    """Applies bulk_write operations to a dict of documents, letting other tasks run before each one"""
+
+    def __init__(self):
+        self.documents: dict[int, dict] = {}
+        # Failure of the next bulk_write: "before" anything is written, "partial" halfway through, or "other"
+        self.fail: str | None = None
+        self.bulk_writes = 0
+        self.operations = 0
+
+    async def bulk_write(self, operations: list, ordered: bool = True):
+        failure, self.fail = self.fail, None
+        self.bulk_writes += 1
+        if failure == "before":
+            raise AutoReconnect("connection closed")
+        if failure == "other":
+            raise RuntimeError("not from pymongo")
+        errors = []
+        for index, operation in enumerate(operations):
+            await asyncio.sleep(0)
+            if failure == "partial" and index == len(operations) // 2:
+                raise AutoReconnect("connection closed partway")
+            self.operations += 1
+            # Operations only give what they do to pymongo, through these
+            match operation:
+                case DeleteOne():
+                    self.documents.pop(operation._filter["_id"], None)
+                case InsertOne():
+                    if operation._doc["_id"] in self.documents:
+                        errors.append({"index": index, "code": 11000, "errmsg": "duplicate key"})
+                    else:
+                        self.documents[operation._doc["_id"]] = copy.deepcopy(operation._doc)
+                case ReplaceOne():
+                    self.documents[operation._filter["_id"]] = copy.deepcopy(operation._doc)
+                case UpdateOne():
+                    id_ = operation._filter["_id"]
+                    if id_ in self.documents or operation._upsert:
+                        document = self.documents.setdefault(id_, {"_id": id_})
+                        for path, value in operation._doc["$set"].items():
+                            set_path(document, path, value)
+        if errors:
+            raise BulkWriteError({"writeErrors": errors, "writeConcernErrors": []})
+
+
+class Counter(logging.Handler):
+    def __init__(self):
+        super().__init__()
+        self.messages: dict[str, int] = {}
+
+    def emit(self, record: logging.LogRecord):
+        self.messages[record.msg] = self.messages.get(record.msg, 0) + 1
+
+
+def read(writes: WriteBehind, collection: FakeCollection, id_: int) -> dict | None:
+    """Document as db.Guilds reads it, the stored one with the pending writes applied"""
+    stored = copy.deepcopy(collection.documents.get(id_))
+    pending = writes.pending(id_)
+    return stored if pending is None else pending.apply(id_, stored)
+
+
+async def write(rng: random.Random, writes: WriteBehind, reference: dict[int, dict]) -> int:
+    """Make a random write both ways, returning how many were made"""
+    id_ = rng.choice(IDS)
+    r = rng.random()
+    if r < 0.2:
+        await writes.create(id_)
+        reference.setdefault(id_, {"_id": id_})
+    elif r < 0.35:
+        await writes.delete(id_)
+        reference.pop(id_, None)
+    elif id_ in reference:
+        # Only made to documents that exist, as db.Guilds does, see PendingWrite.create
+        path, value = rng.choice(PATHS), rng.choice(VALUES)
+        await writes.set(id_, path, value)
+        set_path(reference[id_], path, value)
+    else:
+        return 0
+    return 1
+
+
+async def flush(writes: WriteBehind):
+    try:
+        await writes.flush()
+    except (PyMongoError, RuntimeError):
+        pass
+
+
+def compare(writes: WriteBehind, collection: FakeCollection, reference: dict[int, dict], seed: int, what: str):
+    for id_ in IDS:
+        if (actual := read(writes, collection, id_)) != (expected := reference.get(id_)):
+            print(f"seed {seed}: reading {id_} {what} differs\n  reference:    {expected!r}\n  write-behind: {actual!r}")
+            sys.exit(1)
+
+
+async def check(seed: int, file: str, steps: int = 200) -> tuple[int, FakeCollection]:
+    """Writes made, and the collection they were flushed to"""
+    rng = random.Random(seed)
+    collection = FakeCollection()
+    reference: dict[int, dict] = {}
+    for id_ in IDS:
+        if rng.random() < 0.5:
+            collection.documents[id_] = {"_id": id_}
+            reference[id_] = {"_id": id_}
+
+    def reopen() -> WriteBehind:
+        return WriteBehind(lambda: collection, file, batch_size=rng.choice([1, 2, 3, 10]), fsync=False)
+
+    writes = reopen()
+    made = 0
+    for _ in range(steps):
+        collection.fail = rng.choice([None, None, "before", "partial", "other"])
+        r = rng.random()
+        if r < 0.6:
+            made += await write(rng, writes, reference)
+            what = "after a write"
+        elif r < 0.7:
+            await flush(writes)
+            what = "after a flush"
+        elif r < 0.85:
+            task = asyncio.create_task(flush(writes))
+            for _ in range(rng.randrange(1, 6)):
+                await asyncio.sleep(0)
+                made += await write(rng, writes, reference)
+                compare(writes, collection, reference, seed, "during a flush")
+            await task
+            what = "after writes during a flush"
+        elif r < 0.9:
+            # Going down partway through a flush, which has written some of its batch
+            task = asyncio.create_task(writes.flush())
+            for _ in range(rng.randrange(1, 4)):
+                await asyncio.sleep(0)
+            task.cancel()
+            await asyncio.gather(task, return_exceptions=True)
+            writes.close()
+            writes = reopen()
+            what = "after replaying a flush that went down"
+        else:
+            writes.close()
+            what = "after replaying the journal"
+            if rng.random() < 0.5:
+                # Going down while a write was appended, which never returned to its writer
+                line = json_codec.dumps(["set", rng.choice(IDS), rng.choice(PATHS), rng.choice(VALUES)])
+                line = line.encode("utf-8", "surrogatepass")
+                with open(file, "ab") as f:
+                    f.write(line[:rng.randrange(1, len(line))])
+                what = "after replaying a torn line"
+            writes = reopen()
+        compare(writes, collection, reference, seed, what)
+
+    collection.fail = None
+    await writes.flush()
+    writes.close()
+    if collection.documents != reference or len(writes) or os.path.getsize(file):
+        print(f"seed {seed}: flushed collection differs\n  reference:  {reference!r}\n"
+              f"  collection: {collection.documents!r}\n  {len(writes)} pending, {os.path.getsize(file)} bytes journaled")
+        sys.exit(1)
+    return made, collection
+
+
+async def check_run(file: str) -> bool:
+    """run keeps flushing after a flush fails with an error from outside pymongo, and stops when cancelled"""
+    collection = FakeCollection()
+    writes = WriteBehind(lambda: collection, file, fsync=False)
+    await writes.create(1)
+    collection.fail = "other"
+    task = asyncio.create_task(writes.run(interval=0.001, retry_delay=0.001))
+    for _ in range(1000):
+        if collection.documents:
+            break
+        await asyncio.sleep(0.001)
+    task.cancel()
+    await asyncio.gather(task, return_exceptions=True)
+    writes.close()
+    return collection.documents == {1: {"_id": 1}} and task.cancelled()
+
+
+async def amain(count: int, seed: int):
+    logger = logging.getLogger("db.writebehind")
+    logger.propagate = False
+    logger.addHandler(counter := Counter())
+    with tempfile.TemporaryDirectory() as directory:
+        file = os.path.join(directory, "journal")
+        made = bulk_writes = operations = 0
+        for i in range(count):
+            writes, collection = await check(seed + i, file)
+            made += writes
+            bulk_writes += collection.bulk_writes
+            operations += collection.operations
+        print(f"{count} runs read and flush the same documents as writing them directly")
+        if not await check_run(file):
+            print("run did not flush after a failed flush, or did not stop when cancelled")
+            sys.exit(1)
+        print("run flushes after a failed flush and stops when cancelled\n")
+    for message, n in sorted(counter.messages.items()):
+        print(f"{n:>6} logged: {message}")
+    print(f"{made:>6} writes made, written in {bulk_writes} bulk writes of {operations} operations")
+
+
+def main(count: int = 200, seed: int = 0):
+    asyncio.run(amain(count, seed))
+
+
+if __name__ == "__main__":
+    main(*map(int, sys.argv[1:]))
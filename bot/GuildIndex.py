@@ -0,0 +1,167 @@
+import itertools
+from typing import Callable, Dict, Generic, Iterable, List, Optional, Tuple, Type, TypeVar, Union
+
+import discord
+
+from core.util import tryint, prefix_range
+
+__all__ = ["NameIndex", "GuildIndex", "GuildIndexStore"]
+
+
+T = TypeVar("T", bound=discord.abc.Snowflake)
+ChannelT = TypeVar("ChannelT")
+GuildChannelOrThread = Union["discord.guild.GuildChannel", discord.Thread]
+
+
+class NameIndex(Generic[T]):
+    """Objects by casefolded name, in the order they were added"""
+
+    __slots__ = ("_get", "_names", "_by_name", "_sorted")
+
+    def __init__(self, get: Optional[Callable[[int], Optional[T]]], objects: Iterable[T]):
+        """
+        :param get: Returns the current object for an ID, or None if it is gone. Found objects are checked against
+            it, so an object replaced or renamed without an event is re-indexed instead of returned. None to trust
+            the index, for objects that cannot change without the index being replaced.
+        """
+        self._get = get
+        self._names: Dict[int, str] = {}
+        self._by_name: Dict[str, Dict[int, T]] = {}
+        # Names in code point order for prefix lookups, sorted again on the first one after any change
+        self._sorted: List[str] | None = None
+        for obj in objects:
+            self._add(obj)
+
+    def __len__(self) -> int:
+        return len(self._names)
+
+    def _add(self, obj: T):
+        name = obj.name.casefold()
+        self._names[obj.id] = name
+        self._by_name.setdefault(name, {})[obj.id] = obj
+
+    def sync(self, id_: int):
+        """Re-index the object with this ID as it is now, after it was added, updated or removed"""
+        self._sorted = None
+        name = self._names.pop(id_, None)
+        if name is not None:
+            objects = self._by_name[name]
+            del objects[id_]
+            if not objects:
+                del self._by_name[name]
+        if self._get is not None and (obj := self._get(id_)) is not None:
+            self._add(obj)
+
+    def find(self, name: str, predicate: Callable[[T], bool] = None) -> Optional[T]:
+        """First object whose casefolded name equals that of name and which satisfies predicate"""
+        key = name.casefold()
+        while True:
+            for obj in self._by_name.get(key, {}).values():
+                if self._get is not None and (self._get(obj.id) is not obj or obj.name.casefold() != key):
+                    # Changed without an event; fix the entry and look again
+                    self.sync(obj.id)
+                    break
+                if predicate is None or predicate(obj):
+                    return obj
+            else:
+                return None
+
+    def with_prefix(self, prefix: str, predicate: Callable[[T], bool] = None, limit: int = 25) -> List[T]:
+        """Objects whose casefolded name starts with that of prefix and which satisfy predicate, ordered by name"""
+        if self._sorted is None:
+            self._sorted = sorted(self._by_name)
+        found, stale = [], []
+        names = (self._sorted[i] for i in prefix_range(self._sorted, prefix.casefold()))
+        for obj in itertools.chain.from_iterable(self._by_name[name].values() for name in names):
+            if self._get is not None and self._get(obj.id) is not obj:
+                stale.append(obj.id)
+            elif predicate is None or predicate(obj):
+                found.append(obj)
+                if len(found) >= limit:
+                    break
+        # Not synced in the loop, which would change the dicts it goes through
+        for id_ in stale:
+            self.sync(id_)
+        return found
+
+
+class GuildIndex:
+    """Channels, threads, roles and custom emojis of a guild by name"""
+
+    __slots__ = ("guild", "channels", "categories", "roles", "_emojis", "_emojis_source")
+
+    def __init__(self, guild: discord.Guild):
+        self.guild = guild
+        self.channels: NameIndex[GuildChannelOrThread] = NameIndex(
+            guild.get_channel_or_thread, itertools.chain(guild.channels, guild.threads)
+        )
+        # Categories again on their own, so that looking for one does not go through every channel with the name
+        self.categories: NameIndex[discord.CategoryChannel] = NameIndex(self._get_category, guild.categories)
+        self.roles: NameIndex[discord.Role] = NameIndex(guild.get_role, guild.roles)
+        self._emojis_source: Tuple[discord.Emoji, ...] = ()
+        self._emojis: NameIndex[discord.Emoji] = NameIndex(None, ())
+
+    def channel(
+            self,
+            key: str,
+            kind: Type[ChannelT] | Tuple[type, ...] = (discord.abc.GuildChannel, discord.Thread),
+            *,
+            ignore_case: bool = True
+    ) -> Optional[ChannelT]:
+        """Channel or thread of kind whose ID or name is key"""
+        if (id_ := tryint(key)) is not None and isinstance(ch := self.guild.get_channel_or_thread(id_), kind):
+            return ch
+        return self.channels.find(key, lambda ch: isinstance(ch, kind) and (ignore_case or ch.name == key))
+
+    def _get_category(self, id_: int) -> Optional[discord.CategoryChannel]:
+        return ch if isinstance(ch := self.guild.get_channel(id_), discord.CategoryChannel) else None
+
+    def category(self, key: str) -> Optional[discord.CategoryChannel]:
+        """Category whose ID or name is key, ignoring case"""
+        if (id_ := tryint(key)) is not None and (category := self._get_category(id_)) is not None:
+            return category
+        return self.categories.find(key)
+
+    def role(self, key: str, *, ignore_case: bool = True) -> Optional[discord.Role]:
+        """Role whose ID or name is key"""
+        if (id_ := tryint(key)) is not None and (role := self.guild.get_role(id_)) is not None:
+            return role
+        return self.roles.find(key, None if ignore_case else lambda r: r.name == key)
+
+    @property
+    def emojis(self) -> NameIndex[discord.Emoji]:
+        # Every emoji update replaces the whole tuple, so the index only needs rebuilding when it is a different one
+        if self.guild.emojis is not self._emojis_source:
+            self._emojis_source = self.guild.emojis
+            self._emojis = NameIndex(None, self._emojis_source)
+        return self._emojis
+
+    def emoji(self, name: str) -> Optional[discord.Emoji]:
+        """Custom emoji with exactly this name"""
+        return self.emojis.find(name, lambda e: e.name == name)
+
+
+class GuildIndexStore:
+    """A GuildIndex for each guild looked up in, kept current by MyBot's gateway event handlers"""
+
+    def __init__(self):
+        self.indexes: Dict[int, GuildIndex] = {}
+
+    def get(self, guild: discord.Guild) -> GuildIndex:
+        index = self.indexes.get(guild.id)
+        # A reconnect can replace the guild object along with everything in it
+        if index is None or index.guild is not guild:
+            index = self.indexes[guild.id] = GuildIndex(guild)
+        return index
+
+    def sync_channel(self, guild: discord.Guild, channel_id: int):
+        if (index := self.indexes.get(guild.id)) is not None:
+            index.channels.sync(channel_id)
+            index.categories.sync(channel_id)
+
+    def sync_role(self, guild: discord.Guild, role_id: int):
+        if (index := self.indexes.get(guild.id)) is not None:
+            index.roles.sync(role_id)
+
+    def discard(self, guild_id: int):
+        self.indexes.pop(guild_id, None)
@@ -1,3 +1,4 @@
+import asyncio
 import logging
 from typing import TYPE_CHECKING, Type
 
@@ -8,6 +9,7 @@ from app import app
 import db.Guilds
 
 from .command import MyTree
+from .GuildIndex import GuildIndexStore
 from .RawView import RawViewStore, RawViewT
 from .error import UserInputWarning
 from .RawView import RawView
@@ -19,6 +21,9 @@ if TYPE_CHECKING:
 class MyBot(commands.Bot):
     def __init__(self):
         self._raw_view_store = RawViewStore()
+        self._watch_guilds: asyncio.Task | None = None
+        self._flush_guilds: asyncio.Task | None = None
+        self.guild_indexes = GuildIndexStore()
 
         self.my_logger = logging.getLogger("MyBot")
 
@@ -40,6 +45,32 @@ class MyBot(commands.Bot):
 
     async def setup_hook(self):
         await self.load_extension("bot.commands")
+        if app.config.Database.change_stream:
+            self._watch_guilds = asyncio.create_task(db.Guilds.watch(), name="my-watch-guilds")
+        if db.Guilds.write_behind is not None:
+            self._flush_guilds = asyncio.create_task(
+                db.Guilds.write_behind.run(app.config.Database.flush_interval), name="my-flush-guilds"
+            )
+
+    async def close(self):
+        if self.is_closed():
+            return
+        for task in (self._watch_guilds, self._flush_guilds):
+            if task is not None:
+                task.cancel()
+        try:
+            if db.Guilds.write_behind is not None:
+                try:
+                    await db.Guilds.write_behind.flush()
+                except Exception as ex:
+                    self.my_logger.warning(
+                        "%s guild writes left in the journal for the next start", len(db.Guilds.write_behind),
+                        exc_info=ex
+                    )
+                finally:
+                    db.Guilds.write_behind.close()
+        finally:
+            await super().close()
 
     async def on_ready(self):
         if app.config.Discord.SYNC_COMMANDS:
@@ -49,6 +80,8 @@ class MyBot(commands.Bot):
                 await self.tree.sync()
         await self.change_presence(activity=discord.Game("with bubbles"))
         self.my_logger.info(f"Logged in as {self.user} (ID: {self.user.id})")
+        # So that the first join in each guild after a restart does not wait on the database
+        await db.Guilds.prefetch(guild.id for guild in self.guilds)
 
     async def _sync_debug_guilds(self):
         for guild in map(discord.Object, app.config.Debug.guild):
@@ -59,8 +92,44 @@ class MyBot(commands.Bot):
         await db.Guilds.create(guild.id)
 
     async def on_guild_remove(self, guild: discord.Guild):  # noqa
+        self.guild_indexes.discard(guild.id)
         await db.Guilds.delete(guild.id)
 
+    # Keep guild indexes current. Each handler re-indexes by ID from the guild's own state, which discord.py has
+    # already updated when the event is dispatched.
+    async def on_guild_channel_create(self, channel: "discord.guild.GuildChannel"):
+        self.guild_indexes.sync_channel(channel.guild, channel.id)
+
+    async def on_guild_channel_delete(self, channel: "discord.guild.GuildChannel"):
+        self.guild_indexes.sync_channel(channel.guild, channel.id)
+
+    async def on_guild_channel_update(self, _before: "discord.guild.GuildChannel", after: "discord.guild.GuildChannel"):
+        self.guild_indexes.sync_channel(after.guild, after.id)
+
+    async def on_thread_create(self, thread: discord.Thread):
+        self.guild_indexes.sync_channel(thread.guild, thread.id)
+
+    async def on_thread_join(self, thread: discord.Thread):
+        self.guild_indexes.sync_channel(thread.guild, thread.id)
+
+    async def on_thread_update(self, _before: discord.Thread, after: discord.Thread):
+        self.guild_indexes.sync_channel(after.guild, after.id)
+
+    async def on_thread_remove(self, thread: discord.Thread):
+        self.guild_indexes.sync_channel(thread.guild, thread.id)
+
+    async def on_thread_delete(self, thread: discord.Thread):
+        self.guild_indexes.sync_channel(thread.guild, thread.id)
+
+    async def on_guild_role_create(self, role: discord.Role):
+        self.guild_indexes.sync_role(role.guild, role.id)
+
+    async def on_guild_role_delete(self, role: discord.Role):
+        self.guild_indexes.sync_role(role.guild, role.id)
+
+    async def on_guild_role_update(self, _before: discord.Role, after: discord.Role):
+        self.guild_indexes.sync_role(after.guild, after.id)
+
     async def on_command_error(self, ctx: commands.Context, ex: Exception, /) -> None:
         match ex:
             case UserInputWarning(message):
@@ -0,0 +1,36 @@
+from typing import List, Tuple, Type
+
+import discord
+from discord.app_commands import Choice
+
+from app import app
+
+__all__ = ["MAX_CHOICES", "channel_choices", "category_choices", "emoji_choices"]
+
+
+# Discord shows at most 25 choices
+MAX_CHOICES = 25
+
+
+def channel_choices(interaction: discord.Interaction, current: str, kind: Type | Tuple[type, ...]) -> List[Choice[str]]:
+    """Channels and threads of kind whose name starts with current, ignoring case"""
+    index = interaction.client.guild_indexes.get(interaction.guild)  # noqa
+    return [
+        Choice(name=ch.name, value=ch.name)
+        for ch in index.channels.with_prefix(current, lambda ch: isinstance(ch, kind), MAX_CHOICES)
+    ]
+
+
+def category_choices(interaction: discord.Interaction, current: str) -> List[Choice[str]]:
+    """Categories whose name starts with current, ignoring case"""
+    index = interaction.client.guild_indexes.get(interaction.guild)  # noqa
+    return [Choice(name=ch.name, value=ch.name) for ch in index.categories.with_prefix(current, limit=MAX_CHOICES)]
+
+
+def emoji_choices(interaction: discord.Interaction, current: str) -> List[Choice[str]]:
+    """The guild's custom emojis then unicode emojis whose name starts with current, ignoring case"""
+    index = interaction.client.guild_indexes.get(interaction.guild)  # noqa
+    names = [e.name for e in index.emojis.with_prefix(current, limit=MAX_CHOICES)]
+    # Unicode emoji names are all lowercase
+    names += app.emoji.keys_with_prefix(current.casefold(), MAX_CHOICES - len(names))
+    return [Choice(name=n, value=n) for n in names]
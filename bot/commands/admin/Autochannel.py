@@ -1,16 +1,17 @@
-import itertools
-from typing import Literal, Sequence
+import asyncio
+from typing import List, Literal, Optional
 
 import discord
-from bson import Int64
 from discord.ext import commands
 
 import db.Guilds
 from bot.MyViews import FinishableView, ResolvableView, MutexView
 from bot.MyModal import MyModal
+from bot.autocomplete import channel_choices, category_choices
 from bot.error import UserInputWarning
-from core.util import tryint, convert_to_bool, MyFormatter, MyJSONValidationError
-from core.util.discord import ContentValidation, ContentResult
+from core.util import convert_to_bool, MyFormatter, MyFormatterError, MyJSONValidationError, RenderBudget, offloader
+from core.util.discord import ContentTemplate, ContentResult, RenderedContent, PayloadLimits, PayloadLimitError, \
+    CHANNEL_NAME
 from db.models.Guild import Autochannel
 
 
@@ -56,29 +57,32 @@ class AutochannelForm(MyModal, title="Autochannel Options"):
         self.add_item(self.notify).add_item(self.content).add_item(self.format).add_item(self.category).add_item(self.messagePerms)
 
     @staticmethod
-    def get_category(category: str, channels: "Sequence[discord.guild.GuildChannel]") -> discord.CategoryChannel:
-        return discord.utils.find(
-            lambda ch: (ch.id == tryint(category) or ch.name.casefold() == category.casefold()) and isinstance(ch, discord.CategoryChannel),
-            channels
-        )
-
-    content_validation = ContentValidation()
+    def get_category(category: str, interaction: discord.Interaction) -> discord.CategoryChannel | None:
+        return interaction.client.guild_indexes.get(interaction.guild).category(category)  # noqa
 
     async def on_submit(self, interaction: discord.Interaction):
         await interaction.response.defer(ephemeral=True)
-        _notify: "discord.guild.GuildChannel | discord.Thread" = discord.utils.find(
-            lambda ch: (ch.id == tryint(self.notify.value) or ch.name == self.notify.value) and isinstance(ch, discord.abc.Messageable),
-            itertools.chain(interaction.guild.channels, interaction.guild.threads)
-        )
+        _notify: "discord.guild.GuildChannel | discord.Thread" = interaction.client.guild_indexes.get(  # noqa
+            interaction.guild
+        ).channel(self.notify.value, discord.abc.Messageable, ignore_case=False)
         if not _notify:
             raise UserInputWarning(":x: Notification channel must be a valid formatter channel/thread name and ID")
 
+        # Also compiles both into their caches ahead of the next join, so they are compiled in this process
         try:
-            self.content_validation.parse(self.content.value)
-        except MyJSONValidationError as ex:
+            (await offloader.run(
+                "format", len(self.content.value), ContentTemplate.get, self.content.value, local=True
+            )).analysis.check(AutochannelNotification.content_values, AutochannelNotification.content_conditions)
+        except (MyJSONValidationError, MyFormatterError) as ex:
             raise ex.user_warning("Content")
+        try:
+            (await offloader.run(
+                "format", len(self.format.value), MyFormatter.analyze, self.format.value, local=True
+            )).check(AutochannelCog.channel_name_values)
+        except MyFormatterError as ex:
+            raise ex.user_warning("New Channel Name Format")
 
-        _category = self.get_category(self.category.value, interaction.guild.channels)
+        _category = self.get_category(self.category.value, interaction)
         if self.category.value and not _category:
             raise UserInputWarning(":x: Category not valid")
 
@@ -86,10 +90,10 @@ class AutochannelForm(MyModal, title="Autochannel Options"):
 
         await db.Guilds.update_autochannel(interaction.guild.id, Autochannel(
             enabled=True,
-            notify=Int64(_notify.id),
+            notify=_notify.id,
             content=self.content.value,
             format=self.format.value,
-            category=Int64(_category.id) if _category else None,
+            category=_category.id if _category else None,
             messagePerms=_messagePerms
         ))
         await interaction.followup.send("Autochannel enabled", ephemeral=True)
@@ -117,15 +121,18 @@ class EditAutochannelNotificationForm(MyModal, title="Edit New Channel"):
 
     async def on_submit(self, interaction: discord.Interaction):
         await interaction.response.defer()
-        self.view.channel_name = self.name.value.lower().replace(" ", "-")
-        category = AutochannelForm.get_category(self.category.value, interaction.guild.channels) \
+        self.view.channel_name = MyFormatter.convert(self.name.value, CHANNEL_NAME)
+        category = AutochannelForm.get_category(self.category.value, interaction) \
             or self.category.value \
             or None  # if value is ""
         if isinstance(category, discord.CategoryChannel) and len(category.channels) >= 50:
             raise UserInputWarning(":x: Category full")
         self.view.category = category
         self.view.messagePerms = convert_to_bool(self.messagePerms.value) or False
-        await self.view.update_message()
+        try:
+            await self.view.update_message()
+        except (MyJSONValidationError, MyFormatterError, PayloadLimitError) as ex:
+            raise ex.user_warning("Content")
 
 
 class AutochannelNotification(FinishableView, ResolvableView[bool], MutexView):
@@ -137,6 +144,10 @@ class AutochannelNotification(FinishableView, ResolvableView[bool], MutexView):
         self.channel_name: str | None = channel_name
         self.category = category
         self.messagePerms = messagePerms
+        # Last content sent, so edits only re-render what they change. Only set on the event loop, under render_lock,
+        # so that renders finishing out of order cannot replace a newer one.
+        self.rendered: RenderedContent | None = None
+        self.render_lock = asyncio.Lock()
 
     message: discord.Message
 
@@ -153,25 +164,56 @@ class AutochannelNotification(FinishableView, ResolvableView[bool], MutexView):
         "%[%MESSAGE_PERMS!r%|%\nUser will have manage message perms%]%"
     )
 
-    content_validation = ContentValidation()
-
-    def generate_content(self) -> ContentResult:
-        return self.content_validation.parse(MyFormatter.format(
-            self.autochannel.content,
-            recurse=("default",),
+    # Variables given to generate_content
+    content_values = ("default", "user", "channel", "category")
+    content_conditions = content_values + ("new_category", "message_perms")
+
+    # Content is rendered every time someone joins, on the event loop unless it is large enough to be offloaded
+    content_budget = RenderBudget(max_chars=20_000, max_nodes=5_000, max_time=0.05)
+
+    async def generate_content(self) -> ContentResult:
+        """
+        :raises MyJSONValidationError: Rendered content that Discord would reject, such as empty content
+        :raises PayloadLimitError: Rendered content is over Discord's limits
+        """
+        async with self.render_lock:
+            rendered = await self.render_content(self.rendered)
+            PayloadLimits.validate_payload(rendered.payload)
+            self.rendered = rendered
+            return rendered.result
+
+    async def render_content(self, previous: RenderedContent | None = None) -> RenderedContent:
+        # Read here on the event loop, so the render works on values no edit changes under it
+        values = dict(
             default=self.default_content,
             user=self.user.mention,
             channel=self.channel_name,
             category=self.category.name if isinstance(self.category, discord.CategoryChannel) else self.category or "",
             new_category=isinstance(self.category, str),
             message_perms=self.messagePerms
-        ))
+        )
+        return await offloader.run(
+            "format", len(self.autochannel.content), self._render_content, self.autochannel.content, previous, values,
+            local=True
+        )
+
+    def _render_content(self, content: str, previous: RenderedContent | None, values: dict) -> RenderedContent:
+        return ContentTemplate.get(content).render_incremental(
+            previous, recurse=("default",), budget=self.content_budget, **values
+        )
 
     async def update_view(self):
         await self.message.edit(view=self)
 
     async def update_message(self):
-        await self.message.edit(**self.generate_content(), allowed_mentions=discord.AllowedMentions(everyone=False, users=False, roles=True))
+        async with self.render_lock:
+            rendered = await self.render_content(self.rendered)
+            if self.rendered is not None and rendered.payload == self.rendered.payload:
+                # Nothing shown in the message has changed
+                return
+            PayloadLimits.validate_payload(rendered.payload)
+            await self.message.edit(**rendered.result, allowed_mentions=discord.AllowedMentions(everyone=False, users=False, roles=True))
+            self.rendered = rendered
 
     @discord.ui.button(emoji="\u2705", style=discord.ButtonStyle.secondary)  # :white_check_mark:
     async def approve(self, interaction: discord.Interaction, button: discord.ui.Button):
@@ -199,14 +241,30 @@ class AutochannelNotification(FinishableView, ResolvableView[bool], MutexView):
 
 
 class AutochannelCog(commands.Cog):
+    # Variables given to the channel name format
+    channel_name_values = ("user",)
+
+    # Channel names are at most 100 characters
+    channel_name_budget = RenderBudget(max_chars=1_000, max_nodes=1_000, max_time=0.01)
+
     @discord.app_commands.command(description="Configure autochannel options")
+    @discord.app_commands.describe(
+        notify="Notification channel to fill in the options with",
+        category="Destination category to fill in the options with",
+    )
     @discord.app_commands.guild_only()
     @discord.app_commands.default_permissions(administrator=True)
-    async def autochannel(self, ctx: discord.Interaction, enabled: Literal["Enable", "Disable"] = "Enable"):
+    async def autochannel(
+            self,
+            ctx: discord.Interaction,
+            enabled: Literal["Enable", "Disable"] = "Enable",
+            notify: Optional[str] = None,
+            category: Optional[str] = None
+    ):
         if enabled == "Enable":
             autochannel_ = (await db.Guilds.find(ctx.guild.id, ["autochannel"])).autochannel
             await ctx.response.send_modal(AutochannelForm(
-                notify=(
+                notify=notify or (
                     _notify.name if
                     (_notify := (autochannel_ and ctx.guild.get_channel_or_thread(autochannel_.notify))) and isinstance(
                         _notify, discord.abc.Messageable)
@@ -214,7 +272,7 @@ class AutochannelCog(commands.Cog):
                 ),
                 content=(autochannel_ and autochannel_.content) or "",
                 format_=(autochannel_ and autochannel_.format) or "",
-                category=(
+                category=category if category is not None else (
                     _category.name if
                     (_category := autochannel_ and ctx.guild.get_channel(autochannel_.category))
                     and isinstance(_category, discord.CategoryChannel)
@@ -226,38 +284,50 @@ class AutochannelCog(commands.Cog):
             await db.Guilds.enable_autochannel(ctx.guild.id, False)
             await ctx.response.send_message("Autochannel disabled", ephemeral=True)
 
+    @autochannel.autocomplete("notify")
+    async def notify_autocomplete(self, ctx: discord.Interaction, current: str) -> List[discord.app_commands.Choice[str]]:
+        return channel_choices(ctx, current, discord.abc.Messageable)
+
+    @autochannel.autocomplete("category")
+    async def category_autocomplete(self, ctx: discord.Interaction, current: str) -> List[discord.app_commands.Choice[str]]:
+        return category_choices(ctx, current)
+
     @commands.Cog.listener(name="on_member_join")
     async def on_member_join(self, member: discord.Member):
         guild = member.guild
         autochannel_ = (await db.Guilds.find(guild.id, ["autochannel"])).autochannel
 
         if autochannel_ and autochannel_.enabled:
-            view = AutochannelNotification(
-                autochannel=autochannel_,
-                user=member,
-                channel_name=MyFormatter.format(autochannel_.format, user=member.name.lower().replace(" ", "-")),
-                category=(
-                    category_
-                    if (
-                            autochannel_.category
-                            and (category_ := guild.get_channel(autochannel_.category))
-                            and isinstance(category_, discord.CategoryChannel)  # noqa
-                            and len(category_.channels) < 50
-                    )
-                    else None
-                ),
-                messagePerms=autochannel_.messagePerms
-            )
             if not (notify := guild.get_channel(autochannel_.notify)):
                 return
             try:
+                view = AutochannelNotification(
+                    autochannel=autochannel_,
+                    user=member,
+                    channel_name=MyFormatter.format(
+                        autochannel_.format,
+                        budget=self.channel_name_budget,
+                        user=MyFormatter.convert(member.name, CHANNEL_NAME)
+                    ),
+                    category=(
+                        category_
+                        if (
+                                autochannel_.category
+                                and (category_ := guild.get_channel(autochannel_.category))
+                                and isinstance(category_, discord.CategoryChannel)  # noqa
+                                and len(category_.channels) < 50
+                        )
+                        else None
+                    ),
+                    messagePerms=autochannel_.messagePerms
+                )
                 message = await notify.send(
-                    **view.generate_content(),
+                    **(await view.generate_content()),
                     allowed_mentions=discord.AllowedMentions(everyone=False, users=False, roles=True),
                     view=view
                 )
                 view.message = message
-            except (discord.HTTPException, MyJSONValidationError) as ex:
+            except (discord.HTTPException, MyJSONValidationError, MyFormatterError, PayloadLimitError) as ex:
                 await notify.send(":x: A user has joined but an error occurred while creating this notification")
             else:
                 if await view.when() is True:
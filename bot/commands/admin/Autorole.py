@@ -1,5 +1,4 @@
 import asyncio
-import json
 import re
 import enum
 from abc import ABC, abstractmethod
@@ -10,9 +9,11 @@ from discord.ext import commands
 import jsonschema
 
 from app import app
-from core.util import tryint, predicate_or, pop_dict, MyFormatter, MyJSONValidation, MyJSONValidationError
-from core.util.discord import walk_components, ContentValidation
+from core.util import tryint, predicate_or, pop_dict, MyFormatter, MyJSONValidation, MyJSONValidationError, json_codec, \
+    offloader
+from core.util.discord import walk_components, ContentResult, ContentValidation, PayloadLimits, PayloadLimitError
 from bot.MyModal import MyModal
+from bot.autocomplete import emoji_choices
 from bot.error import UserInputWarning
 from bot.RawView import RawView
 
@@ -142,13 +143,26 @@ class AutoroleFormBase(MyModal, ABC):
 
     content_validation = ContentValidation()
 
+    # Both are run by the offloader, possibly in another process, so they are looked up through the class
+    @classmethod
+    def parse_content(cls, string: str) -> ContentResult:
+        return cls.content_validation.parse(string)
+
+    @classmethod
+    def parse_roles(cls, string: str) -> List[Dict[str, Any]]:
+        return cls.roles_validation.parse(string)  # noqa
+
     async def on_submit(self, interaction: discord.Interaction):
         await interaction.response.defer()
 
         try:
-            content = self.content_validation.parse(self.content.value)
+            content = await offloader.run("content", len(self.content.value), self.parse_content, self.content.value)
         except MyJSONValidationError as ex:
             raise ex.user_warning("Content")
+        try:
+            PayloadLimits.validate_content(content)
+        except PayloadLimitError as ex:
+            raise ex.user_warning("Content")
 
         try:
             roles = await self.parse_roles_input(interaction)
@@ -160,17 +174,23 @@ class AutoroleFormBase(MyModal, ABC):
         if len(roles) > 25:
             raise UserInputWarning(":x: Maximum is 25 roles")
 
+        view = self.view_type(roles, **(await self.parse_fields(interaction)))
+        try:
+            PayloadLimits.validate_view(view)
+        except PayloadLimitError as ex:
+            raise ex.user_warning("Roles")
+
         try:
             if not self.prefill:
                 await interaction.followup.send(
                     **content,
-                    view=self.view_type(roles, **(await self.parse_fields(interaction))),
+                    view=view,
                     allowed_mentions=discord.AllowedMentions.none(),
                 )
             else:
                 await self.prefill.edit(
                     **content,
-                    view=self.view_type(roles, **(await self.parse_fields(interaction))),
+                    view=view,
                     allowed_mentions=discord.AllowedMentions.none(),
                 )
         except discord.HTTPException as ex:
@@ -178,6 +198,21 @@ class AutoroleFormBase(MyModal, ABC):
 
     ROLENAME = "%[ROLENAME]%"
 
+    @staticmethod
+    async def format_role_field(params: List[AutoroleParamsT], field: str, templates: List[Optional[str]]):
+        """Format a field of each role's params, rendering every distinct template once for all roles that use it"""
+        groups: Dict[str, List[AutoroleParamsT]] = {}
+        for p, template in zip(params, templates, strict=True):
+            if template is not None:
+                groups.setdefault(template, []).append(p)
+        for template, params_ in groups.items():
+            values = await offloader.run(
+                "format", len(template) * len(params_),
+                MyFormatter.format_many, template, [{"rolename": p["role"].name} for p in params_]
+            )
+            for p, value in zip(params_, values):
+                p[field] = value
+
     @classmethod
     def prefill_content_from_message(cls, message: discord.Message) -> str:
         content = message.content
@@ -185,11 +220,11 @@ class AutoroleFormBase(MyModal, ABC):
 
         if len(embeds) == 0 and not content.startswith("{"):
             return content or ""
-        return json.dumps({
+        return json_codec.dumps({
             **({"content": content} if content else {}),
             **({"embed": pop_dict(message.embeds[0].to_dict(), "type")} if len(embeds) == 1 else {}),
             **({"embeds": [pop_dict(e.to_dict(), "type") for e in embeds]} if len(embeds) > 1 else {}),
-        }, ensure_ascii=False, indent=4)
+        }, indent=4)
 
     @classmethod
     @abstractmethod
@@ -247,17 +282,23 @@ class AutoroleButtonsForm(AutoroleFormBase, title="Create Autorole (Buttons)"):
 
     async def parse_roles_input(self, interaction: discord.Interaction) -> List[AutoroleButtonParams]:
         try:
-            lst: List[Dict[str, Any]] = self.roles_validation.parse(self.roles.value)
+            lst: List[Dict[str, Any]] = await offloader.run(
+                "roles", len(self.roles.value), self.parse_roles, self.roles.value
+            )
         except MyJSONValidationError as ex:
             raise ex.user_warning("Roles")
-        return list(await asyncio.gather(*[self._parse_role_input(interaction, **dct) for dct in lst]))
+        params = list(await asyncio.gather(*[self._parse_role_input(interaction, **dct) for dct in lst]))
+        await self.format_role_field(params, "label", [
+            dct.get("label") or (self.ROLENAME if dct.get("emoji") is None else None) for dct in lst
+        ])
+        return params
 
     async def _parse_role_input(
             self,
             interaction: discord.Interaction,
             *,
             role: int,
-            style: Optional[str] = None, emoji: Optional[str] = None, label: Optional[str] = None,
+            style: Optional[str] = None, emoji: Optional[str] = None,
             **_kwargs
     ) -> AutoroleButtonParams:
         abp = AutoroleButtonParams()
@@ -270,15 +311,12 @@ class AutoroleButtonsForm(AutoroleFormBase, title="Create Autorole (Buttons)"):
             abp["style"] = self.button_styles[style.lower()]
 
         if emoji:
-            emoji_ = discord.utils.get(interaction.guild.emojis, name=emoji) \
+            emoji_ = interaction.client.guild_indexes.get(interaction.guild).emoji(emoji) \
                      or app.emoji.get(emoji)
             if emoji_ is None:
                 raise UserInputWarning(":x: Invalid emoji")
             abp["emoji"] = emoji_
 
-        if (label_ := label or (self.ROLENAME if emoji is None else None)) is not None:
-            abp["label"] = MyFormatter.format(label_, rolename=role_.name)
-
         return abp
 
     @classmethod
@@ -296,7 +334,7 @@ class AutoroleButtonsForm(AutoroleFormBase, title="Create Autorole (Buttons)"):
             }
             for c in components
         ]
-        roles_ = json.dumps(roles, ensure_ascii=False, indent=4)
+        roles_ = json_codec.dumps(roles, indent=4)
 
         return cls(message, content_, roles_)
 
@@ -365,17 +403,22 @@ class AutoroleDropdownForm(AutoroleFormBase, title="Create Autorole (Dropdown)")
 
     async def parse_roles_input(self, interaction: discord.Interaction) -> List[AutoroleDropdownValueParams]:
         try:
-            lst: List[Dict[str, Any]] = self.roles_validation.parse(self.roles.value)
+            lst: List[Dict[str, Any]] = await offloader.run(
+                "roles", len(self.roles.value), self.parse_roles, self.roles.value
+            )
         except MyJSONValidationError as ex:
             raise ex.user_warning("Roles")
-        return list(await asyncio.gather(*[self._parse_role_input(interaction, **dct) for dct in lst]))
+        params = list(await asyncio.gather(*[self._parse_role_input(interaction, **dct) for dct in lst]))
+        await self.format_role_field(params, "label", [dct.get("label") or self.ROLENAME for dct in lst])
+        await self.format_role_field(params, "description", [dct.get("description") or None for dct in lst])
+        return params
 
     async def _parse_role_input(
             self,
             interaction: discord.Interaction,
             *,
             role: int,
-            emoji: Optional[str] = None, label: Optional[str] = None, description: Optional[str] = None,
+            emoji: Optional[str] = None,
             **_kwargs
     ) -> AutoroleDropdownValueParams:
         abp = AutoroleDropdownValueParams()
@@ -385,18 +428,12 @@ class AutoroleDropdownForm(AutoroleFormBase, title="Create Autorole (Dropdown)")
         abp["role"] = role_
 
         if emoji:
-            emoji_ = discord.utils.get(interaction.guild.emojis, name=emoji) \
+            emoji_ = interaction.client.guild_indexes.get(interaction.guild).emoji(emoji) \
                      or app.emoji.get(emoji)
             if emoji_ is None:
                 raise UserInputWarning(":x: Invalid emoji")
             abp["emoji"] = emoji_
 
-        label_ = label or self.ROLENAME
-        abp["label"] = MyFormatter.format(label_, rolename=role_.name)
-
-        if description:
-            abp["description"] = MyFormatter.format(description, rolename=role_.name)
-
         return abp
 
     async def parse_fields(self, interaction: discord.Interaction) -> Dict[str, Any]:
@@ -433,7 +470,7 @@ class AutoroleDropdownForm(AutoroleFormBase, title="Create Autorole (Dropdown)")
             }
             for o in dropdown.options
         ]
-        roles_ = json.dumps(roles, ensure_ascii=False, indent=4)
+        roles_ = json_codec.dumps(roles, indent=4)
 
         min_ = str(dropdown.min_values)
         max_ = str(dropdown.max_values)
@@ -449,13 +486,29 @@ class AutoroleType(enum.Enum):
 class AutoroleCog(commands.Cog):
     @discord.app_commands.command(description="Create an autorole message")
     @discord.app_commands.rename(type_="type")
-    @discord.app_commands.describe(type_="Component type")
+    @discord.app_commands.describe(
+        type_="Component type",
+        role="First role to fill in the roles with",
+        emoji="Emoji for the first role",
+    )
     @discord.app_commands.guild_only()
     @discord.app_commands.default_permissions(administrator=True)
-    async def autorole(self, ctx: discord.Interaction, type_: AutoroleType):
-        await ctx.response.send_modal(type_.value())
+    async def autorole(
+            self,
+            ctx: discord.Interaction,
+            type_: AutoroleType,
+            role: Optional[discord.Role] = None,
+            emoji: Optional[str] = None
+    ):
+        roles = json_codec.dumps([{"role": role.id, **({"emoji": emoji} if emoji else {})}], indent=4) \
+            if role is not None else None
+        await ctx.response.send_modal(type_.value(roles=roles))
     autorole: discord.app_commands.Command
 
+    @autorole.autocomplete("emoji")
+    async def emoji_autocomplete(self, ctx: discord.Interaction, current: str) -> List[discord.app_commands.Choice[str]]:
+        return emoji_choices(ctx, current)
+
 
 @discord.app_commands.context_menu(name="Edit Autorole")
 @discord.app_commands.guild_only()
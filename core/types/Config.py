@@ -1,7 +1,7 @@
 from __future__ import annotations
 
 from dataclasses import dataclass, field
-from typing import List
+from typing import List, Literal
 
 
 @dataclass
@@ -10,6 +10,7 @@ class Config:
     Debug: Debug
     Discord: Discord
     Database: Database
+    Offload: Offload = field(default_factory=lambda: Offload())
 
 @dataclass
 class Debug:
@@ -29,3 +30,24 @@ class Discord:
 class Database:
     """MongoDB credentials and related settings"""
     connection: str
+    # Guild settings cache
+    cache_size: int = 10_000
+    cache_ttl: float = 300.0
+    # Invalidate the cache when other processes write, which needs a replica set
+    change_stream: bool = False
+    # Write guild settings to a local journal first and flush them in batches
+    write_behind: bool = False
+    journal: str = "config/guilds.journal"
+    flush_interval: float = 1.0  # Seconds
+    flush_batch: int = 500
+    fsync: bool = True
+
+@dataclass
+class Offload:
+    """Running large inputs off the event loop"""
+    threshold: int = 2000  # Characters
+    workers: int = None
+    # Executor for each task type: "inline", "thread" or "process"
+    content: Literal["inline", "thread", "process"] = "thread"
+    roles: Literal["inline", "thread", "process"] = "thread"
+    format: Literal["inline", "thread", "process"] = "thread"
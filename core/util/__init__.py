@@ -2,5 +2,10 @@ from .util import *
 from .number import *
 from .func import *
 from .iter import *
+from .cache import *
+from .offload import *
+from .flight import *
+from .codec import *
+from .schema import *
 from .text import *
 from .formatter import *
@@ -0,0 +1,148 @@
+import threading
+import time
+from collections import OrderedDict
+from typing import Callable, Generic, NamedTuple, TypeVar
+
+__all__ = [
+    "CacheStats",
+    "LRUCache",
+    "TTLCache",
+]
+
+
+_KT = TypeVar("_KT")
+_VT = TypeVar("_VT")
+
+
+class CacheStats(NamedTuple):
+    hits: int
+    misses: int
+    evictions: int
+    size: int
+    maxsize: int
+
+
+class LRUCache(Generic[_KT, _VT]):
+    """
+    Bounded mapping that evicts the least recently used entry when full
+
+    Safe to share with worker threads. Factories run outside the lock, so two threads missing the same key at once
+    may both create it.
+    """
+
+    def __init__(self, maxsize: int = 128):
+        if maxsize < 1:
+            raise ValueError("maxsize must be at least 1")
+        self.maxsize = maxsize
+        self._data: OrderedDict[_KT, _VT] = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def __contains__(self, key: _KT) -> bool:
+        return key in self._data
+
+    def get(self, key: _KT, default: _VT | None = None) -> _VT | None:
+        with self._lock:
+            try:
+                value = self._data[key]
+            except KeyError:
+                self.misses += 1
+                return default
+            self._data.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def __setitem__(self, key: _KT, value: _VT):
+        with self._lock:
+            self._data[key] = value
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+                self.evictions += 1
+
+    def get_or_create(self, key: _KT, factory: Callable[[_KT], _VT]) -> _VT:
+        """Return the cached value for key, creating and storing it with factory(key) on a miss"""
+        with self._lock:
+            try:
+                value = self._data[key]
+            except KeyError:
+                self.misses += 1
+            else:
+                self._data.move_to_end(key)
+                self.hits += 1
+                return value
+        value = factory(key)
+        self[key] = value
+        return value
+
+    def pop(self, key: _KT, default: _VT | None = None) -> _VT | None:
+        with self._lock:
+            return self._data.pop(key, default)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+            self.hits = self.misses = self.evictions = 0
+
+    def stats(self) -> CacheStats:
+        return CacheStats(self.hits, self.misses, self.evictions, len(self._data), self.maxsize)
+
+
+class TTLCache(LRUCache[_KT, _VT]):
+    """LRUCache whose entries also expire ttl seconds after they are stored. Expired entries count as misses."""
+
+    def __init__(self, maxsize: int = 128, ttl: float = 60.0, timer: Callable[[], float] = time.monotonic):
+        if ttl <= 0:
+            raise ValueError("ttl must be positive")
+        super().__init__(maxsize)
+        self.ttl = ttl
+        self.timer = timer
+        # Values are stored with the time they expire at
+        self._data: OrderedDict[_KT, tuple[_VT, float]]
+
+    def _live(self, key: _KT) -> tuple[_VT, float] | None:
+        """Entry for key if it has not expired, dropping it if it has. Call with the lock held."""
+        entry = self._data.get(key)
+        if entry is not None and entry[1] <= self.timer():
+            del self._data[key]
+            return None
+        return entry
+
+    def __contains__(self, key: _KT) -> bool:
+        with self._lock:
+            return self._live(key) is not None
+
+    def get(self, key: _KT, default: _VT | None = None) -> _VT | None:
+        with self._lock:
+            entry = self._live(key)
+            if entry is None:
+                self.misses += 1
+                return default
+            self._data.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+    def __setitem__(self, key: _KT, value: _VT):
+        super().__setitem__(key, (value, self.timer() + self.ttl))
+
+    def get_or_create(self, key: _KT, factory: Callable[[_KT], _VT]) -> _VT:
+        with self._lock:
+            entry = self._live(key)
+            if entry is not None:
+                self._data.move_to_end(key)
+                self.hits += 1
+                return entry[0]
+            self.misses += 1
+        value = factory(key)
+        self[key] = value
+        return value
+
+    def pop(self, key: _KT, default: _VT | None = None) -> _VT | None:
+        with self._lock:
+            entry = self._data.pop(key, None)
+        return default if entry is None else entry[0]
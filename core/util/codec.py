@@ -0,0 +1,93 @@
+import json
+from typing import Any
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+__all__ = [
+    "JSONCodec",
+    "json_codec",
+]
+
+
+# orjson decodes integers that do not fit in 64 bits as floats. Any run of 20 digits, or a minus sign and 19, could
+# be one; finding those in bytes with every digit and minus sign mapped to "0" is far faster than a regex.
+_DIGITS = bytes(0x30 if 0x30 <= i <= 0x39 or i == 0x2d else 0x20 for i in range(256))
+_WIDE_INT = b"0" * 20
+
+
+class JSONCodec:
+    """
+    JSON decoding and encoding with exactly the results and errors of the json module
+
+    orjson does the work when it is installed. Anything it would handle differently (errors, integers wider than
+    64 bits, NaN, lone surrogates, floats when encoding) goes through the json module instead.
+    """
+
+    def __init__(self, fast: bool = orjson is not None):
+        if fast and orjson is None:
+            raise ValueError("orjson is not installed")
+        self.fast = fast
+
+    def loads(self, s: str) -> Any:
+        """:raises json.JSONDecodeError: Same as json.loads"""
+        if self.fast and _WIDE_INT not in s.encode("utf-8", "surrogatepass").translate(_DIGITS):
+            try:
+                return orjson.loads(s)
+            except orjson.JSONDecodeError:
+                pass
+        # The json module decodes some things orjson does not, and its error messages are the ones users see
+        return json.loads(s)
+
+    def dumps(self, obj: Any, indent: int | None = None) -> str:
+        """Same as json.dumps(obj, ensure_ascii=False, indent=indent)"""
+        if indent is None or not self.fast or indent < 1:
+            # The json module's C encoder only runs without indent, and orjson has no ", " separators
+            return json.dumps(obj, ensure_ascii=False, indent=indent)
+        depth = _plain_depth(obj)
+        if depth is None:
+            return json.dumps(obj, ensure_ascii=False, indent=indent)
+        try:
+            s = orjson.dumps(obj, option=orjson.OPT_INDENT_2).decode()
+        except orjson.JSONEncodeError:
+            return json.dumps(obj, ensure_ascii=False, indent=indent)
+        if indent == 2:
+            return s
+        # Control characters are always escaped inside strings, so newlines and \x00 only occur between lines.
+        # Indents are swapped from the deepest up so that a shallower one never matches a deeper line.
+        for level in range(depth, 0, -1):
+            s = s.replace("\n" + "  " * level, "\n" + "\x00" * level)
+        return s.replace("\x00", " " * indent)
+
+
+def _plain_depth(obj: Any, depth: int = 0) -> int | None:
+    """Nesting depth of obj if orjson encodes all of it exactly as the json module does, otherwise None"""
+    cls = type(obj)
+    if cls is str or cls is bool or obj is None:
+        return depth
+    if cls is int:
+        return depth if -2 ** 63 <= obj < 2 ** 64 else None
+    if cls is dict:
+        deepest = depth
+        for k, v in obj.items():
+            if type(k) is not str:
+                return None
+            d = _plain_depth(v, depth + 1)
+            if d is None:
+                return None
+            deepest = max(deepest, d)
+        return deepest
+    if cls is list or cls is tuple:
+        deepest = depth
+        for v in obj:
+            d = _plain_depth(v, depth + 1)
+            if d is None:
+                return None
+            deepest = max(deepest, d)
+        return deepest
+    return None
+
+
+json_codec = JSONCodec()
@@ -1,10 +1,17 @@
 import json
-from typing import TypeGuard, TypedDict, Any
+from typing import TypeGuard, TypedDict, Any, Iterable, Callable
 
 import discord
 import jsonschema
 
-from core.util import MyJSONValidation, MyJSONValidationError
+from core.util import MyJSONValidation, MyJSONValidationError, LRUCache, MyFormatter, MyJSONFormatter, MyFormatterError, \
+    RenderBudget, TemplateAnalysis
+from core.util.formatter.MyFormatterTemplate import Template
+from bot.error import UserInputWarning
+
+
+# Conversion for text channel names as Discord would make them, built into MyFormatter
+CHANNEL_NAME = "c"
 
 
 def is_str_list(val: list[object]) -> TypeGuard[list[str]]:
@@ -39,35 +46,403 @@ class ContentValidation(MyJSONValidation):
         "minProperties": 1,
         "additionalProperties": False,
         "properties": {
-            "content": {"type": "string", "minLength": 1},
-            "embed": {"$anchor": "embed", "type": "object", "minProperties": 1},
+            "content": {"$ref": "#text"},
+            "embed": {
+                "$anchor": "embed",
+                "type": "object",
+                "minProperties": 1,
+                # Only what Discord rejects the message for, other properties are passed on as they are
+                "properties": {
+                    "title": {"type": "string"},
+                    "description": {"type": "string"},
+                    "url": {"type": "string"},
+                    "timestamp": {"type": "string"},
+                    "color": {"type": "integer", "minimum": 0, "maximum": 0xFFFFFF},
+                    "footer": {
+                        "type": "object",
+                        "required": ["text"],
+                        "properties": {"text": {"$ref": "#text"}, "icon_url": {"type": "string"}},
+                    },
+                    "image": {"$anchor": "media", "type": "object", "required": ["url"],
+                              "properties": {"url": {"$ref": "#text"}}},
+                    "thumbnail": {"$ref": "#media"},
+                    "author": {
+                        "type": "object",
+                        "required": ["name"],
+                        "properties": {
+                            "name": {"$ref": "#text"}, "url": {"type": "string"}, "icon_url": {"type": "string"}
+                        },
+                    },
+                    "fields": {"type": "array", "items": {
+                        "type": "object",
+                        "required": ["name", "value"],
+                        "properties": {
+                            "name": {"$ref": "#text"}, "value": {"$ref": "#text"}, "inline": {"type": "boolean"}
+                        },
+                    }},
+                },
+            },
             "embeds": {"type": "array", "minItems": 1, "maxItems": 10, "items": {"$ref": "#embed"}},
         },
         "not": {"$anchor": "notEmbeds", "required": ["embed", "embeds"]},  # Not have both "embed" and "embeds"
+        "$defs": {"text": {"$anchor": "text", "type": "string", "minLength": 1}},
     })
 
     def __init__(self):
         super().__init__(self.content_validator)  # noqa
 
+    def validate(self, string: str) -> dict[str, Any]:
+        """Decode JSON content and check it against the schema"""
+        try:
+            return super().parse(string)
+        except Exception as ex:
+            match ex:
+                case Exception(__cause__=jsonschema.ValidationError(
+                    json_path=json_path, validator="not", validator_value={"$anchor": "notEmbeds"}
+                )):
+                    raise MyJSONValidationError(path=json_path,
+                                                message="Cannot have both \"embed\" and \"embeds\" properties"
+                                                ) from ex.__cause__
+                case _:
+                    raise ex
+
+    def check_rendered(self, payload: str | dict[str, Any]):
+        """
+        Check rendered text, or a rendered dict of content and embeds, against the schema
+
+        Format strings can render to values the schema does not allow, such as empty content or an empty field name.
+        """
+        self.check({"content": payload} if isinstance(payload, str) else payload)
+
     def parse(self, string: str) -> ContentResult:
         if not string.startswith("{"):
             return ContentResult(content=string, embeds=[])
         else:
-            try:
-                dct: dict[str, Any] = super().parse(string)
-            except Exception as ex:
-                match ex:
-                    case Exception(__cause__=jsonschema.ValidationError(
-                        json_path=json_path, validator="not", validator_value={"$anchor": "notEmbeds"}
-                    )):
-                        raise MyJSONValidationError(path=json_path,
-                                                    message="Cannot have both \"embed\" and \"embeds\" properties"
-                                                    ) from ex.__cause__
-                    case _:
-                        raise ex
+            dct = self.validate(string)
             if "embed" in dct:
                 dct["embeds"] = [dct["embed"]]
             return ContentResult(
                 content=dct["content"] if "content" in dct else "",
                 embeds=[discord.Embed.from_dict(e) for e in dct["embeds"]] if "embeds" in dct else []
             )
+
+
+class PayloadLimitError(Exception):
+    """Message that Discord would reject for going over its limits"""
+    ERR_MSG = \
+        ":x: \"{field}\" is over Discord's limits\n" \
+        "```\n{message}```"
+
+    # Warnings are messages themselves, so only this many violations are listed
+    MAX_LISTED = 10
+
+    def __init__(self, violations: list[str]):
+        self.violations = violations
+        self.message = "\n".join(violations[:self.MAX_LISTED])
+        if len(violations) > self.MAX_LISTED:
+            self.message += f"\n...and {len(violations) - self.MAX_LISTED} more"
+        super().__init__(self.message)
+
+    def user_warning(self, field: str):
+        ex = UserInputWarning(self.ERR_MSG.format(field=field, message=self.message))
+        ex.__cause__ = self
+        return ex
+
+
+class PayloadLimits:
+    """
+    Limits Discord puts on messages and their components, checked before sending
+
+    A message over them fails with an HTTPException only after spending a rate limited request.
+    """
+    content = 2000
+    embeds = 10
+    embeds_total = 6000
+    title = 256
+    description = 4096
+    fields = 25
+    field_name = 256
+    field_value = 1024
+    footer_text = 2048
+    author_name = 256
+    components = 25
+    custom_id = 100
+    button_label = 80
+    select_placeholder = 150
+    select_options = 25
+    option_label = 100
+    option_value = 100
+    option_description = 100
+
+    @staticmethod
+    def _length(violations: list[str], value: Any, maximum: int, what: str, *args: object) -> int:
+        # Descriptions are only formatted for violations, checking a message within limits costs a few lengths
+        length = 0 if value is None else len(value) if isinstance(value, str) else len(str(value))
+        if length > maximum:
+            violations.append(f"{what.format(*args)} is {length} characters long, the maximum is {maximum}")
+        return length
+
+    @classmethod
+    def check_content(cls, result: ContentResult) -> list[str]:
+        """Everything in result that is over a limit, as messages for the user"""
+        return cls.check_payload({"content": result["content"], "embeds": [e.to_dict() for e in result["embeds"]]})
+
+    @classmethod
+    def check_payload(cls, payload: str | dict[str, Any]) -> list[str]:
+        """Same as check_content, for text or a dict of content and embed dicts as sent to Discord"""
+        violations: list[str] = []
+        if isinstance(payload, str):
+            cls._length(violations, payload, cls.content, "Content")
+            return violations
+        cls._length(violations, payload.get("content"), cls.content, "Content")
+        embeds = payload.get("embeds") or ()
+        if len(embeds) > cls.embeds:
+            violations.append(f"There are {len(embeds)} embeds, the maximum is {cls.embeds}")
+        total = 0
+        for i, embed in enumerate(embeds, 1):
+            total += cls._length(violations, embed.get("title"), cls.title, "Embed {} title", i)
+            total += cls._length(violations, embed.get("description"), cls.description, "Embed {} description", i)
+            fields = embed.get("fields") or ()
+            if len(fields) > cls.fields:
+                violations.append(f"Embed {i} has {len(fields)} fields, the maximum is {cls.fields}")
+            for j, field in enumerate(fields, 1):
+                total += cls._length(violations, field.get("name"), cls.field_name, "Embed {} field {} name", i, j)
+                total += cls._length(violations, field.get("value"), cls.field_value, "Embed {} field {} value", i, j)
+            if footer := embed.get("footer"):
+                total += cls._length(violations, footer.get("text"), cls.footer_text, "Embed {} footer text", i)
+            if author := embed.get("author"):
+                total += cls._length(violations, author.get("name"), cls.author_name, "Embed {} author name", i)
+        if total > cls.embeds_total:
+            violations.append(f"Embeds are {total} characters long in total, the maximum is {cls.embeds_total}")
+        return violations
+
+    @classmethod
+    def check_view(cls, view: discord.ui.View) -> list[str]:
+        """Everything in the components of view that is over a limit, as messages for the user"""
+        violations: list[str] = []
+        if len(view.children) > cls.components:
+            violations.append(f"There are {len(view.children)} components, the maximum is {cls.components}")
+        for i, item in enumerate(view.children, 1):
+            match item:
+                case discord.ui.Button():
+                    cls._length(violations, item.label, cls.button_label, "Button {} label", i)
+                    cls._length(violations, item.custom_id, cls.custom_id, "Button {} ID", i)
+                case discord.ui.Select():
+                    cls._length(violations, item.placeholder, cls.select_placeholder, "Dropdown placeholder")
+                    cls._length(violations, item.custom_id, cls.custom_id, "Dropdown ID")
+                    if len(item.options) > cls.select_options:
+                        violations.append(
+                            f"There are {len(item.options)} options, the maximum is {cls.select_options}"
+                        )
+                    for j, option in enumerate(item.options, 1):
+                        cls._length(violations, option.label, cls.option_label, "Option {} label", j)
+                        cls._length(violations, option.value, cls.option_value, "Option {} ID", j)
+                        cls._length(
+                            violations, option.description, cls.option_description, "Option {} description", j
+                        )
+        return violations
+
+    @classmethod
+    def validate_content(cls, result: ContentResult):
+        """:raises PayloadLimitError: result is over a limit"""
+        if violations := cls.check_content(result):
+            raise PayloadLimitError(violations)
+
+    @classmethod
+    def validate_payload(cls, payload: str | dict[str, Any]):
+        """:raises PayloadLimitError: payload is over a limit"""
+        if violations := cls.check_payload(payload):
+            raise PayloadLimitError(violations)
+
+    @classmethod
+    def validate_view(cls, view: discord.ui.View):
+        """:raises PayloadLimitError: A component of view is over a limit"""
+        if violations := cls.check_view(view):
+            raise PayloadLimitError(violations)
+
+
+class _Leaf:
+    """Format string in content, with the variables each top level element of its template depends on"""
+    __slots__ = ("index", "template", "dependencies", "all_dependencies")
+
+    def __init__(self, index: int, template: Template):
+        self.index = index
+        self.template = template
+        self.dependencies: list[frozenset[str]] = []
+        for node in template.nodes:
+            variables, conditions = set(), set()
+            if not isinstance(node, str):
+                node.collect(variables, conditions, set())
+            self.dependencies.append(frozenset(variables | conditions))
+        self.all_dependencies = frozenset().union(*self.dependencies)
+
+    def spans(self, formatter: MyFormatter, previous: tuple[str, ...] | None, changed: set[str]) -> tuple[str, ...]:
+        """Output of each top level element, reusing those in previous that do not depend on anything changed"""
+        if previous is not None and not self.all_dependencies & changed:
+            return previous
+        meter = formatter.meter
+        if meter is not None:
+            meter.spend_nodes(self.template.size)
+        spans: list[str] = []
+        # Top level elements write straight to the output, so rendering them one at a time gives the same result
+        for i, (node, dependencies) in enumerate(zip(self.template.nodes, self.dependencies)):
+            if isinstance(node, str):
+                spans.append(node)
+            elif previous is not None and not dependencies & changed:
+                spans.append(previous[i])
+            else:
+                buffer: list[str] = []
+                node.write(formatter, buffer.append)
+                spans.append("".join(buffer))
+        if meter is not None:
+            meter.spend_chars(sum(map(len, spans)))
+        return tuple(spans)
+
+
+class RenderedContent:
+    """Rendered ContentTemplate, which can be passed back in to re-render only what has changed"""
+    __slots__ = ("template", "variables", "recurse", "spans", "payload", "_result")
+
+    def __init__(
+            self, template: "ContentTemplate", variables: dict[str, str | bool], recurse: frozenset[str],
+            spans: list[tuple[str, ...]], payload: Any
+    ):
+        self.template = template
+        self.variables = variables
+        self.recurse = recurse
+        self.spans = spans
+        # Rendered text, or decoded JSON with its string values rendered; the message is the same if this is
+        self.payload = payload
+        self._result: ContentResult | None = None
+
+    @property
+    def result(self) -> ContentResult:
+        if self._result is None:
+            self._result = self.template.result(self.payload)
+        return self._result
+
+
+_MISSING = object()
+
+
+class ContentTemplate:
+    """
+    Content containing format strings, decoded, validated and compiled once to be rendered any number of times
+
+    Text content is a single format string. JSON content is checked against ContentValidation up front, and only
+    the format strings in its string values are rendered, so values never need JSON escaping and the result is not
+    decoded again. Rendered values are checked against the schema once more, as they may render empty.
+    """
+    cache: "LRUCache[str, ContentTemplate]" = LRUCache(maxsize=512)
+    content_validation = ContentValidation()
+
+    @classmethod
+    def get(cls, content: str) -> "ContentTemplate":
+        """Compile content, or fetch it from the cache"""
+        return cls.cache.get_or_create(content, cls)
+
+    def __init__(self, content: str):
+        """
+        :raises MyJSONValidationError: JSON content that does not conform to ContentValidation
+        :raises MyFormatterError: Format string that does not parse
+        """
+        self.leaves: list[_Leaf] = []
+        self.json = content.startswith("{")
+        if self.json:
+            self.formatter: type[MyFormatter] = MyJSONFormatter
+            dct = self.content_validation.validate(content)
+            if "embed" in dct:
+                dct["embeds"] = [dct.pop("embed")]
+            self.structure: Any = self._compile(dct, "$")
+        else:
+            self.formatter = MyFormatter
+            self.structure = self._compile(content, None)
+        self.analysis = TemplateAnalysis.of(*(leaf.template for leaf in self.leaves))
+
+    def _compile(self, value: Any, path: str | None) -> Any:
+        match value:
+            case str():
+                analysis = self.formatter.analyze(value)
+                if analysis.error is not None:
+                    raise MyFormatterError(
+                        f"Error at element {path}\n{analysis.error}" if path is not None else analysis.error
+                    )
+                template = self.formatter.compile(value)
+                if template.static is not None:
+                    return template.static
+                self.leaves.append(leaf := _Leaf(len(self.leaves), template))
+                return leaf
+            case dict():
+                return {k: self._compile(v, f"{path}.{k}") for k, v in value.items()}
+            case list():
+                return [self._compile(v, f"{path}[{i}]") for i, v in enumerate(value)]
+            case _:
+                return value
+
+    @classmethod
+    def _fill(cls, value: Any, leaf_output: Callable[[_Leaf], str]) -> Any:
+        # Containers are always rebuilt, as embeds keep references to the dicts and lists they are made from
+        if isinstance(value, _Leaf):
+            return leaf_output(value)
+        if isinstance(value, dict):
+            return {k: cls._fill(v, leaf_output) for k, v in value.items()}
+        if isinstance(value, list):
+            return [cls._fill(v, leaf_output) for v in value]
+        return value
+
+    def render(self, recurse: Iterable[str] = (), budget: RenderBudget = None, **kwargs: str | bool) -> ContentResult:
+        """:raises MyJSONValidationError: Rendered content that does not conform to ContentValidation"""
+        formatter = self.formatter.bind(recurse, budget, **kwargs)
+        with formatter.metered():
+            payload = self._fill(self.structure, lambda leaf: leaf.template.evaluate(formatter))
+        self.content_validation.check_rendered(payload)
+        return self.result(payload)
+
+    def result(self, payload: Any) -> ContentResult:
+        """Message content of a rendered payload"""
+        if not self.json:
+            return ContentResult(content=payload, embeds=[])
+        return ContentResult(
+            content=payload.get("content", ""),
+            embeds=[discord.Embed.from_dict(e) for e in payload.get("embeds", ())]
+        )
+
+    def render_incremental(
+            self, previous: RenderedContent | None, recurse: Iterable[str] = (), budget: RenderBudget = None,
+            **kwargs: str | bool
+    ) -> RenderedContent:
+        """
+        Render, reusing the output of previous for every top level element that does not depend on a variable that
+        has changed since
+
+        :raises MyJSONValidationError: Rendered content that does not conform to ContentValidation
+        """
+        formatter = self.formatter.bind(recurse, budget, **kwargs)
+        variables = {k.casefold(): v for k, v in kwargs.items()}
+        changed: set[str] = set()
+        if previous is not None and previous.template is self and previous.recurse == formatter.recurse:
+            changed = {
+                k for k in variables.keys() | previous.variables.keys()
+                if variables.get(k, _MISSING) != previous.variables.get(k, _MISSING)
+            }
+            self._add_changed_recursive(formatter, changed)
+        else:
+            previous = None
+        with formatter.metered():
+            spans = [leaf.spans(formatter, previous and previous.spans[leaf.index], changed) for leaf in self.leaves]
+        payload = self._fill(self.structure, lambda leaf: "".join(spans[leaf.index]))
+        self.content_validation.check_rendered(payload)
+        return RenderedContent(self, variables, frozenset(formatter.recurse), spans, payload)
+
+    def _add_changed_recursive(self, formatter: MyFormatter, changed: set[str]):
+        # A recursive variable renders differently if any of the variables in its value have changed
+        grew = True
+        while grew:
+            grew = False
+            for variable in formatter.recurse - changed:
+                if variable not in formatter.vals:
+                    continue
+                analysis = self.formatter.analyze(formatter.vals[variable])
+                if analysis.error is not None or (analysis.variables | analysis.conditions) & changed:
+                    changed.add(variable)
+                    grew = True
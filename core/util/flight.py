@@ -0,0 +1,62 @@
+import asyncio
+from typing import Awaitable, Callable, Generic, NamedTuple, TypeVar
+
+__all__ = [
+    "FlightStats",
+    "SingleFlight",
+]
+
+
+_KT = TypeVar("_KT")
+_VT = TypeVar("_VT")
+
+
+class FlightStats(NamedTuple):
+    calls: int
+    executed: int
+    coalesced: int
+    in_flight: int
+
+
+class SingleFlight(Generic[_KT, _VT]):
+    """
+    Coalesces concurrent calls for the same key into one, whose result or error every caller receives
+
+    The call runs as its own task, so a caller being cancelled does not cancel it for the others.
+    """
+
+    def __init__(self):
+        self._tasks: dict[_KT, asyncio.Task[_VT]] = {}
+        self.calls = 0
+        self.coalesced = 0
+
+    def __contains__(self, key: _KT) -> bool:
+        return key in self._tasks
+
+    async def do(self, key: _KT, func: Callable[[], Awaitable[_VT]]) -> _VT:
+        """Await func(), or the call already in flight for key"""
+        self.calls += 1
+        task = self._tasks.get(key)
+        if task is None:
+            task = self._tasks[key] = asyncio.ensure_future(func())
+            task.add_done_callback(lambda t: self._done(key, t))
+        else:
+            self.coalesced += 1
+        return await asyncio.shield(task)
+
+    def forget(self, key: _KT | None = None):
+        """Make later calls for key, or every key if None, start anew instead of joining the call in flight"""
+        if key is None:
+            self._tasks.clear()
+        else:
+            self._tasks.pop(key, None)
+
+    def _done(self, key: _KT, task: asyncio.Task[_VT]):
+        if self._tasks.get(key) is task:
+            del self._tasks[key]
+        if not task.cancelled():
+            # Retrieved by the callers, unless all of them were cancelled
+            task.exception()
+
+    def stats(self) -> FlightStats:
+        return FlightStats(self.calls, self.calls - self.coalesced, self.coalesced, len(self._tasks))
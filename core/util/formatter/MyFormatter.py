@@ -1,50 +1,225 @@
-import re
 from abc import ABC, abstractmethod
-from typing import Iterable, Callable
+from contextlib import contextmanager
+from typing import Iterable, Iterator, Callable, Mapping, Generator
 
-from core.util import compose, json_escape
+from core.util import json_escape, LRUCache
 
 from . import MyFormatterGrammar as Grammar
+from . import MyFormatterParser as Parser
+from . import MyFormatterTemplate as Compiled
+from .MyFormatterAnalysis import TemplateAnalysis
+from .MyFormatterBudget import RenderBudget, BudgetMeter
+from .MyFormatterConversion import Conversion, Translate, Truncate, pipeline
+from .MyFormatterError import MyFormatterRecursionError
 
 
 class MyFormatter:
     # Public API
 
     @classmethod
-    def format(cls, format_string: str, recurse: Iterable[str] = (), **kwargs: str | bool) -> str:
-        vals = {k.casefold(): v for k, v in kwargs.items() if isinstance(v, str)}
-        conds = {
-            **{k.casefold(): v for k, v in kwargs.items() if isinstance(v, bool)},
-            **{k: bool(v) for k, v in vals.items()},
-        }
-        recurse = {s.casefold() for s in recurse}
+    def format(
+            cls, format_string: str, recurse: Iterable[str] = (), budget: RenderBudget = None, **kwargs: str | bool
+    ) -> str:
+        """Format a format string, aborting with MyFormatterBudgetError if it goes over budget"""
+        return cls.bind(recurse, budget, **kwargs).parse(format_string)
 
-        formatter = cls(vals, conds, recurse)
-        return formatter.parse(format_string)
+    @classmethod
+    def bind(cls, recurse: Iterable[str] = (), budget: RenderBudget = None, **kwargs: str | bool) -> "MyFormatter":
+        """Formatter for one set of variables, to format several format strings with"""
+        return cls._from_kwargs(kwargs, {s.casefold() for s in recurse}, budget)
+
+    @classmethod
+    def format_many(
+            cls, format_string: str, rows: Iterable[Mapping[str, str | bool]], recurse: Iterable[str] = ()
+    ) -> list[str]:
+        """Format one format string with each set of variables in rows, parsing it only once"""
+        return list(cls.format_iter(format_string, rows, recurse))
+
+    @classmethod
+    def format_iter(
+            cls, format_string: str, rows: Iterable[Mapping[str, str | bool]], recurse: Iterable[str] = ()
+    ) -> Iterator[str]:
+        """Lazily format one format string with each set of variables in rows, parsing it only once"""
+        template = cls.compile(format_string)
+        if template.static is not None:
+            for _ in rows:
+                yield template.static
+            return
+        recurse = {s.casefold() for s in recurse}
+        for row in rows:
+            yield template.evaluate(cls._from_kwargs(row, recurse))
 
     @classmethod
     def escape(cls, s: str):
         return s.replace("%", "%%")
 
+    @classmethod
+    def compile(cls, format_string: str) -> Compiled.Template:
+        """Parse a format string into a reusable template, or fetch it from the template cache"""
+        return cls.template_cache.get_or_create(format_string, cls._compile)
+
+    @classmethod
+    def compile_expansion(cls, format_string: str) -> Compiled.Template:
+        """Compile the value of a recursive variable, which is a format string of its own"""
+        return cls.compile(format_string)
+
+    @classmethod
+    def analyze(cls, format_string: str) -> TemplateAnalysis:
+        """
+        Find the variables, conditions and conversions a format string uses, or why it does not parse
+
+        The compiled template is kept in the template cache, so formatting it afterwards does not parse it again
+        """
+        try:
+            template = cls.compile(format_string)
+        except Grammar.ParseError as ex:
+            return TemplateAnalysis(error=str(ex))
+        return TemplateAnalysis.of(template)
+
     # Inner workings
 
-    def __init__(self, vals: dict[str, str] = None, conds: dict[str, bool] = None, recurse: set[str] = None):
+    template_cache: LRUCache[str, Compiled.Template] = LRUCache(maxsize=512)
+
+    # How many recursive variables may be expanded inside each other
+    recursion_limit: int = 8
+
+    # Limits on each render, unlimited unless given
+    budget: RenderBudget | None = None
+
+    def __init__(
+            self, vals: dict[str, str] = None, conds: dict[str, bool] = None, recurse: set[str] = None,
+            recursion_limit: int = None, budget: RenderBudget = None
+    ):
         self.vals: dict[str, str] = {k.casefold(): v for k, v in vals.items()} if vals is not None else {}
         self.conds: dict[str, bool] = {k.casefold(): v for k, v in conds.items()} if conds is not None else {}
         self.recurse: set[str] = {k.casefold() for k in recurse} if recurse is not None else set()
+        if recursion_limit is not None:
+            self.recursion_limit = recursion_limit
+        if budget is not None:
+            self.budget = budget
+        # Spending of the render in progress, shared by the expansions of recursive variables inside it
+        self.meter: BudgetMeter | None = None
+        # Recursive variables are rendered once per formatter, however often they are referenced
+        self._expansions: dict[str, str] = {}
+        self._expanding: list[str] = []
+
+    @classmethod
+    def _from_kwargs(
+            cls, kwargs: Mapping[str, str | bool], recurse: set[str], budget: RenderBudget = None
+    ) -> "MyFormatter":
+        vals = {k.casefold(): v for k, v in kwargs.items() if isinstance(v, str)}
+        conds = {
+            **{k.casefold(): v for k, v in kwargs.items() if isinstance(v, bool)},
+            **{k: bool(v) for k, v in vals.items()},
+        }
+        return cls(vals, conds, recurse, budget=budget)
 
     def parse(self, format_string):
-        return Grammar.parse(format_string, actions=self.Actions, types=self.Types).evaluate(self)
+        return self._render(self.compile(format_string))
+
+    def _render(self, template: Compiled.Template) -> str:
+        if self.budget is None or self.meter is not None:
+            return template.evaluate(self)
+        self.meter = self.budget.meter()
+        try:
+            return template.evaluate(self)
+        finally:
+            self.meter = None
+
+    @contextmanager
+    def metered(self) -> Generator[None, None, None]:
+        """Count everything formatted inside the block against a single budget"""
+        if self.budget is None or self.meter is not None:
+            yield
+            return
+        self.meter = self.budget.meter()
+        try:
+            yield
+        finally:
+            self.meter = None
+
+    def expand(self, variable: str) -> str:
+        """Render the value of a recursive variable as a format string"""
+        expansion = self._expansions.get(variable)
+        if expansion is None:
+            if variable in self._expanding:
+                chain = self._expanding[self._expanding.index(variable):] + [variable]
+                raise MyFormatterRecursionError(f"Variable references itself: {' -> '.join(v.upper() for v in chain)}")
+            if len(self._expanding) >= self.recursion_limit:
+                raise MyFormatterRecursionError(f"Variables are nested more than {self.recursion_limit} levels deep")
+            self._expanding.append(variable)
+            try:
+                expansion = self._render(self.compile_expansion(self.vals[variable]))
+            finally:
+                self._expanding.pop()
+            self._expansions[variable] = expansion
+        if self.meter is not None:
+            # References are the only way output can grow faster than the format string, so they are paid for
+            # as they are made rather than once the output is joined
+            self.meter.spend_chars(len(expansion))
+        return expansion
+
+    # Interchangeable parser backends, both build the same tree and raise the same Grammar.ParseError
+    parsers: dict[str, Callable[..., Grammar.TreeNode]] = {
+        "canopy": Grammar.parse,
+        "linear": Parser.parse,
+    }
+    parser: str = "linear"
+
+    @classmethod
+    def _compile(cls, format_string: str) -> Compiled.Template:
+        parse = cls.parsers[cls.parser]
+        return parse(format_string, actions=cls.Actions, types=cls.Types).compile(cls)
 
-    conversions: dict[str, Callable[[str], str]] = {
-        "j": lambda s: json_escape(s),
-        "u": lambda s: s.upper(),
-        "l": lambda s: s.lower(),
+    # Steps of each conversion character. Format strings can only use the ones in the grammar (j, l and u), the
+    # others are for code to use through convert() and conversion_func(), and more can be registered. A subclass only
+    # holds the ones it adds or replaces, the rest are looked up on the classes it inherits from.
+    conversions: dict[str, tuple[Conversion, ...]] = {
+        "j": (Conversion(json_escape),),
+        "u": (Translate(case=str.upper),),
+        "l": (Translate(case=str.lower),),
+        # Text channel names as Discord would make them: lowercase, spaces as dashes, at most 100 characters
+        "c": (Translate({" ": "-"}, case=str.lower), Truncate(100)),
     }
 
+    _pipelines: "dict[tuple[type[MyFormatter], str], Callable[[str], str]]" = {}
+
+    @classmethod
+    def register_conversion(cls, name: str, *steps: Conversion | Callable[[str], str]):
+        """Add or replace the conversion character name, made of one or more steps done in order"""
+        if len(name) != 1:
+            raise ValueError("Conversion names must be a single character")
+        if "conversions" not in cls.__dict__:
+            # Do not register on the class this one inherits its conversions from
+            cls.conversions = {}
+        cls.conversions[name.casefold()] = tuple(s if isinstance(s, Conversion) else Conversion(s) for s in steps)
+        # Subclasses see it too, and compiled templates resolve their conversions through these when rendered
+        MyFormatter._pipelines.clear()
+
     @classmethod
-    def convert(cls, string: str, conversion: Iterable[str]) -> str:
-        return compose((cls.conversions[c.casefold()] for c in conversion), string)
+    def conversion_steps(cls, name: str) -> tuple[Conversion, ...]:
+        """:raises KeyError: No class this one inherits from has the conversion character name"""
+        for formatter_cls in cls.__mro__:
+            conversions = formatter_cls.__dict__.get("conversions")
+            if conversions is not None and name in conversions:
+                return conversions[name]
+        raise KeyError(name)
+
+    @classmethod
+    def convert(cls, string: str, conversion: str) -> str:
+        return cls.conversion_func(conversion)(string)
+
+    @classmethod
+    def conversion_func(cls, conversion: str) -> Callable[[str], str]:
+        """Resolve a conversion string into a single callable, fusing its steps into as few passes as possible"""
+        try:
+            return cls._pipelines[cls, conversion]
+        except KeyError:
+            pass
+        func = cls._pipelines[cls, conversion] = pipeline(
+            step for c in conversion for step in cls.conversion_steps(c.casefold())
+        )
+        return func
 
     class Actions:
         @staticmethod
@@ -58,44 +233,45 @@ class MyFormatter:
     class Types:
         class LazyNode(ABC):
             @abstractmethod
-            def evaluate(self, formatter: "MyFormatter") -> str:
+            def compile(self, formatter_cls: "type[MyFormatter]") -> Compiled.CompiledNode:
                 pass
 
         class Everything(LazyNode):
             elements: "list[MyFormatter.Types.LazyNode | str]"
 
-            def evaluate(self, formatter: "MyFormatter") -> str:
-                return "".join(e if isinstance(e, str) else e.evaluate(formatter) for e in self.elements)
+            def compile(self, formatter_cls: "type[MyFormatter]") -> Compiled.Template:
+                return Compiled.Template([e if isinstance(e, str) else e.compile(formatter_cls) for e in self.elements])
 
         class Value(LazyNode):
             variable: Grammar.TreeNode
             conversion: Grammar.TreeNode2 | Grammar.TreeNode
 
-            def evaluate(self, formatter: "MyFormatter") -> str:
+            def compile(self, formatter_cls: "type[MyFormatter]") -> Compiled.Value:
                 variable: str = self.variable.text.casefold()
                 conversion: str = self.conversion.elements[0].text if len(self.conversion.elements) > 0 else ""
-                return_value = formatter.vals[variable]
-                return_value = formatter.parse(return_value) if variable in formatter.recurse else return_value
-                return_value = formatter.convert(return_value, conversion)
-                return return_value
+                return Compiled.Value(variable, conversion)
 
         class Condition(LazyNode):
+            # Ignore leading newlines in branches, as if every condition had the r conversion
+            always_raw: bool = False
+
             negation: Grammar.TreeNode
             variable: Grammar.TreeNode
             conversion: Grammar.TreeNode4 | Grammar.TreeNode
             true_value: Grammar.TreeNode5 | Grammar.TreeNode
             false_value: Grammar.TreeNode6 | Grammar.TreeNode
 
-            def evaluate(self, formatter: "MyFormatter") -> str:
+            def compile(self, formatter_cls: "type[MyFormatter]") -> Compiled.Condition:
                 negation: bool = bool(self.negation.text)
                 variable: str = self.variable.text.casefold()
                 conversion: str = self.conversion.elements[0].text.casefold() if len(self.conversion.elements) > 0 else ""
                 true_value: "MyFormatter.Types.Everything" = self.true_value.everything if len(self.true_value.elements) > 0 else None
                 false_value: "MyFormatter.Types.Everything" = self.false_value.everything if len(self.false_value.elements) > 0 else None
-                return_value = (true_value.evaluate(formatter) if true_value else "") if (formatter.conds[variable] if not negation else not formatter.conds[variable]) else (false_value.evaluate(formatter) if false_value else "")
-                if "r" not in conversion and return_value.startswith("\n"):
-                    lines = return_value.splitlines()[1:]
-                    if re.fullmatch(r"[ \t]+", lines[-1]):
-                        lines.pop()
-                    return_value = "\n".join([l.lstrip() for l in lines])
-                return return_value
+                return Compiled.Condition(
+                    negation=negation,
+                    variable=variable,
+                    raw=self.always_raw or "r" in conversion,
+                    true_value=true_value.compile(formatter_cls) if true_value else None,
+                    false_value=false_value.compile(formatter_cls) if false_value else None,
+                    conversion=conversion,
+                )
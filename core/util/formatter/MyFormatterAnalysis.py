@@ -0,0 +1,38 @@
+from typing import Iterable, NamedTuple
+
+from .MyFormatterError import MyFormatterError
+from .MyFormatterTemplate import Template
+
+
+class TemplateAnalysis(NamedTuple):
+    """What a format string refers to, found without rendering it"""
+    # Inserted with %[VARIABLE]%
+    variables: frozenset[str] = frozenset()
+    # Tested with %[%VARIABLE%|%...%]%
+    conditions: frozenset[str] = frozenset()
+    # Conversion characters, e.g. "j" or "r"
+    conversions: frozenset[str] = frozenset()
+    # Why the format string does not parse, in which case nothing else is filled in
+    error: str | None = None
+
+    @classmethod
+    def of(cls, *templates: Template) -> "TemplateAnalysis":
+        variables, conditions, conversions = set(), set(), set()
+        for template in templates:
+            template.collect(variables, conditions, conversions)
+        return cls(frozenset(variables), frozenset(conditions), frozenset(conversions))
+
+    def unknown(self, values: Iterable[str], conditions: Iterable[str] = None) -> set[str]:
+        """Variables that are referenced but would not be given, conditions default to the same as values"""
+        values = {v.casefold() for v in values}
+        conditions = {c.casefold() for c in conditions} if conditions is not None else values
+        return (self.variables - values) | (self.conditions - conditions)
+
+    def check(self, values: Iterable[str], conditions: Iterable[str] = None):
+        """Raise MyFormatterError if the format string does not parse or references variables that are not given"""
+        if self.error is not None:
+            raise MyFormatterError(self.error)
+        if unknown := self.unknown(values, conditions):
+            raise MyFormatterError(
+                f"Unknown variable{'s' if len(unknown) > 1 else ''}: {', '.join(sorted(v.upper() for v in unknown))}"
+            )
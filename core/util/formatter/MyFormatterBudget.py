@@ -0,0 +1,56 @@
+import time
+from typing import NamedTuple
+
+from .MyFormatterError import MyFormatterBudgetError
+
+
+class RenderBudget(NamedTuple):
+    """Limits on a single render, so that a format string cannot grow without bound or stall the event loop"""
+    # Characters rendered, counting every rendered recursive variable and every reference to one as well as the output
+    max_chars: int = 100_000
+    # Template nodes evaluated
+    max_nodes: int = 10_000
+    # Seconds of CPU time in the thread rendering it, so that waiting on the GIL or the scheduler in an offload
+    # thread does not count
+    max_time: float = 0.05
+
+    def meter(self) -> "BudgetMeter":
+        return BudgetMeter(self)
+
+
+class BudgetMeter:
+    """What is left of a RenderBudget during one render, raising MyFormatterBudgetError once any of it runs out"""
+    __slots__ = ("budget", "chars", "nodes", "deadline", "unclocked")
+
+    # Reading the thread's CPU clock costs about as much as evaluating a node, so it is only read once this much work
+    # has been spent since it last was, counting a node as NODE_CHARS characters
+    CLOCK_CHARS = 16_384
+    NODE_CHARS = 256
+
+    def __init__(self, budget: RenderBudget):
+        self.budget = budget
+        self.chars, self.nodes, max_time = budget
+        self.deadline = time.thread_time() + max_time
+        self.unclocked = 0
+
+    def spend_nodes(self, n: int):
+        self.nodes -= n
+        if self.nodes < 0:
+            raise MyFormatterBudgetError(f"Format string has more than {self.budget.max_nodes} elements to evaluate")
+        self.unclocked += n * self.NODE_CHARS
+        if self.unclocked >= self.CLOCK_CHARS:
+            self.check_time()
+
+    def spend_chars(self, n: int):
+        self.chars -= n
+        if self.chars < 0:
+            raise MyFormatterBudgetError(f"Format string renders more than {self.budget.max_chars} characters")
+        # Output can take long to produce from few nodes, so it counts towards reading the clock as well
+        self.unclocked += n
+        if self.unclocked >= self.CLOCK_CHARS:
+            self.check_time()
+
+    def check_time(self):
+        self.unclocked = 0
+        if time.thread_time() > self.deadline:
+            raise MyFormatterBudgetError(f"Format string took longer than {self.budget.max_time * 1000:g}ms to render")
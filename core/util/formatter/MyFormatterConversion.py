@@ -0,0 +1,116 @@
+from typing import Callable, Iterable
+
+
+class Conversion:
+    """One step of a conversion pipeline, see :func:`pipeline`"""
+    __slots__ = ("func",)
+
+    def __init__(self, func: Callable[[str], str]):
+        self.func = func
+
+    def __call__(self, s: str) -> str:
+        return self.func(s)
+
+    def fuse(self, after: "Conversion") -> "Conversion | None":
+        """Single step doing this and then after, or None if they cannot be combined"""
+        return None
+
+
+class Translate(Conversion):
+    """
+    Optional lower- or uppercasing, then character replacements done all at once as by :meth:`str.translate`, then
+    optional truncation
+
+    Chained translations are merged into one table and a truncation after them is taken in. Small tables are applied
+    with :meth:`str.replace`, which is several times faster than :meth:`str.translate` for a handful of characters.
+    """
+    __slots__ = ("case", "table", "length")
+
+    # Above this many replacements a single translate beats one replace per character
+    MAX_REPLACE = 4
+
+    def __init__(
+            self, table: dict[str, str] | None = None, case: Callable[[str], str] | None = None, length: int = None
+    ):
+        self.case = case
+        self.table: dict[int, str] = {ord(k): v for k, v in (table or {}).items()}
+        self.length = length
+        super().__init__(self._pick_func())
+
+    def _translate(self, s: str) -> str:
+        return s.translate(self.table) if self.table else s
+
+    def _pick_func(self) -> Callable[[str], str]:
+        # str() and [:None] return the string they are given, so leaving out a stage costs next to nothing
+        case, table, length = self.case or str, self.table, self.length
+        if not table:
+            return case if length is None else (lambda s: case(s)[:length])
+        pairs = tuple((chr(k), v) for k, v in table.items())
+        if len(pairs) > self.MAX_REPLACE or any(old in new for old, _ in pairs for _, new in pairs):
+            # Replacing one character at a time would replace some of them again
+            return lambda s: case(s).translate(table)[:length]
+        if len(pairs) == 1:
+            ((old, new),) = pairs
+            return lambda s: case(s).replace(old, new)[:length]
+
+        def replace(s: str) -> str:
+            s = case(s)
+            for old_, new_ in pairs:
+                s = s.replace(old_, new_)
+            return s[:length]
+        return replace
+
+    def fuse(self, after: Conversion) -> Conversion | None:
+        if isinstance(after, Truncate):
+            length = after.length if self.length is None else min(self.length, after.length)
+            return Translate(self._str_table(), self.case, length)
+        if not isinstance(after, Translate) or self.length is not None:
+            return None
+        if after.case is None:
+            table = {chr(k): after._translate(v) for k, v in self.table.items()}
+            table.update({chr(k): v for k, v in after.table.items() if k not in self.table})
+            return Translate(table, self.case, after.length)
+        if self.case is None and not self.table:
+            return after
+        return None
+
+    def _str_table(self) -> dict[str, str]:
+        return {chr(k): v for k, v in self.table.items()}
+
+
+class Truncate(Conversion):
+    """Keep at most length characters, which does not copy strings that are already short enough"""
+    __slots__ = ("length",)
+
+    def __init__(self, length: int):
+        self.length = length
+        super().__init__(lambda s: s[:length])
+
+    def fuse(self, after: Conversion) -> Conversion | None:
+        if isinstance(after, Truncate):
+            return Truncate(min(self.length, after.length))
+        return None
+
+
+def pipeline(steps: Iterable[Conversion]) -> Callable[[str], str]:
+    """Fuse steps where possible and compose what is left into a single callable"""
+    fused: list[Conversion] = []
+    for step in steps:
+        if fused and (both := fused[-1].fuse(step)) is not None:
+            fused[-1] = both
+        else:
+            fused.append(step)
+    funcs = tuple(step.func for step in fused)
+    match funcs:
+        case ():
+            return str
+        case (func,):
+            return func
+        case (first, second):
+            return lambda s: second(first(s))
+        case _:
+            def composed(s: str) -> str:
+                for func in funcs:
+                    s = func(s)
+                return s
+            return composed
@@ -0,0 +1,25 @@
+from bot.error import UserInputWarning
+
+
+class MyFormatterError(Exception):
+    """Format string that parses but cannot be rendered"""
+    ERR_MSG = \
+        ":x: \"{field}\" could not be formatted\n" \
+        "```\n{message}```"
+
+    def __init__(self, message: str):
+        super().__init__(message)
+        self.message = message
+
+    def user_warning(self, field: str):
+        ex = UserInputWarning(self.ERR_MSG.format(field=field, message=self.message))
+        ex.__cause__ = self
+        return ex
+
+
+class MyFormatterRecursionError(MyFormatterError):
+    """Recursive variable that references itself or is nested too deep"""
+
+
+class MyFormatterBudgetError(MyFormatterError):
+    """Render that exceeded its RenderBudget and was aborted"""
@@ -2,6 +2,7 @@
 # See https://canopy.jcoglan.com/ for documentation
 
 from collections import defaultdict
+import functools
 import re
 
 
@@ -60,6 +61,13 @@ class TreeNode6(TreeNode):
 FAILURE = object()
 
 
+# Not part of the Canopy output: node classes are created once per (TreeNode class, types mixin) pair and shared
+# by every parse, instead of building a new class for every node
+@functools.cache
+def node_type(cls, mixin, name):
+    return type(cls.__name__ + name, (cls, mixin), {})
+
+
 class Grammar(object):
     REGEX_1 = re.compile('^[ \\t\\n\\r]')
     REGEX_2 = re.compile('^[^%]')
@@ -107,7 +115,7 @@ class Grammar(object):
             address0 = FAILURE
         if address0 is not FAILURE:
             cls0 = type(address0)
-            address0.__class__ = type(cls0.__name__ + 'Everything', (cls0, self._types.Everything), {})
+            address0.__class__ = node_type(cls0, self._types.Everything, 'Everything')
         self._cache['everything'][index0] = (address0, self._offset)
         return address0
 
@@ -379,7 +387,7 @@ class Grammar(object):
             self._offset = self._offset
         if address0 is not FAILURE:
             cls0 = type(address0)
-            address0.__class__ = type(cls0.__name__ + 'Value', (cls0, self._types.Value), {})
+            address0.__class__ = node_type(cls0, self._types.Value, 'Value')
         self._cache['value'][index0] = (address0, self._offset)
         return address0
 
@@ -927,7 +935,7 @@ class Grammar(object):
             self._offset = self._offset
         if address0 is not FAILURE:
             cls0 = type(address0)
-            address0.__class__ = type(cls0.__name__ + 'Condition', (cls0, self._types.Condition), {})
+            address0.__class__ = node_type(cls0, self._types.Condition, 'Condition')
         self._cache['condition'][index0] = (address0, self._offset)
         return address0
 
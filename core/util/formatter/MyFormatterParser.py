@@ -0,0 +1,206 @@
+# Hand-written parser for MyFormatterGrammar.peg
+#
+# Produces the same tree as the generated Canopy parser in MyFormatterGrammar.py, but consumes runs of text and
+# variable names with a single regex match instead of one TreeNode and memo entry per character.
+# Failures are recorded in the same order as the generated parser so that ParseError messages are identical.
+# Leaf nodes (variable names, conversions, negation) keep their text but do not carry per-character children.
+
+import re
+
+from .MyFormatterGrammar import TreeNode, TreeNode1, TreeNode2, TreeNode3, TreeNode4, TreeNode5, TreeNode6, \
+    FAILURE, ParseError, format_error, node_type
+
+
+class Parser(object):
+    TEXT = re.compile(r'(?:[^%]|%%|%(?![\[\]|]))+')
+    VARIABLE = re.compile(r'[a-zA-Z0-9_]*')
+    WHITESPACE = re.compile(r'[ \t\n\r]*')
+    J = re.compile(r'[jJ]')
+    L = re.compile(r'[lL]')
+    U = re.compile(r'[uU]')
+    LU = re.compile(r'[lLuU]')
+    R = re.compile(r'[rR]')
+    NOT_J = re.compile(r'[^\WjJ]*')
+    NOT_LU = re.compile(r'[^\WlLuU]*')
+    NOT_R = re.compile(r'[^\WrR]*')
+
+    def __init__(self, input, actions, types):
+        self._input = input
+        self._input_size = len(input)
+        self._actions = actions
+        self._types = types
+        self._offset = 0
+        self._failure = 0
+        self._expected = []
+        self._escape_cache = set()
+
+    def parse(self):
+        tree = self._read_everything()
+        if self._offset == self._input_size:
+            return tree
+        if not self._expected:
+            self._failure = self._offset
+            self._expected.append(('Formatting', '<EOF>'))
+        raise ParseError(format_error(self._input, self._failure, self._expected))
+
+    def _fail(self, offset, rule, expected):
+        if offset > self._failure:
+            self._failure = offset
+            self._expected = []
+        if offset == self._failure:
+            self._expected.append(('Formatting::' + rule, expected))
+
+    def _literal(self, literal, rule):
+        if self._input.startswith(literal, self._offset):
+            node = TreeNode(literal, self._offset, [])
+            self._offset += len(literal)
+            return node
+        self._fail(self._offset, rule, '"' + literal + '"')
+        return FAILURE
+
+    def _optional_char(self, literal, rule):
+        node = self._literal(literal, rule)
+        return node if node is not FAILURE else TreeNode('', self._offset, [])
+
+    def _optional(self, literal, rule, read, cls):
+        index = self._offset
+        if self._input.startswith(literal, index):
+            self._offset += len(literal)
+            inner = read()
+            return cls(self._input[index:self._offset], index, [inner])
+        self._fail(index, rule, '"' + literal + '"')
+        return TreeNode('', index, [])
+
+    def _read_everything(self):
+        index, elements = self._offset, []
+        while True:
+            node = self._read_text()
+            if node is FAILURE:
+                node = self._read_value()
+                if node is FAILURE:
+                    node = self._read_condition()
+                    if node is FAILURE:
+                        break
+            elements.append(node)
+        node = TreeNode(self._input[index:self._offset], index, elements)
+        node.__class__ = node_type(TreeNode, self._types.Everything, 'Everything')
+        return node
+
+    def _read__(self):
+        end = Parser.WHITESPACE.match(self._input, self._offset).end()
+        node = TreeNode(self._input[self._offset:end], self._offset, [])
+        self._fail(end, '_', '[ \\t\\n\\r]')
+        self._offset = end
+        return node
+
+    def _read_text(self):
+        input, start = self._input, self._offset
+        match = Parser.TEXT.match(input, start)
+        end = match.end() if match else start
+        if match and end == self._input_size:
+            run = match[0]
+            if (len(run) - len(run.rstrip('%'))) % 2 == 1:
+                # Lookahead after a lone trailing "%" fails at the end of input
+                self._fail(end, 'formatter', '[\\[\\]\\|]')
+        self._fail(end, 'formatter', '[^%]')
+        if end not in self._escape_cache:
+            # The escape rule is memoised, so a retry at the same offset records nothing
+            self._escape_cache.add(end)
+            self._fail(end, 'escape', '"%%"')
+        if end == self._input_size:
+            self._fail(end, 'formatter', '"%"')
+        if not match:
+            return FAILURE
+        self._offset = end
+        run = match[0]
+        if '%%' not in run:
+            elements = [run]
+        else:
+            elements, index = [], start
+            for i, part in enumerate(run.split('%%')):
+                if i > 0:
+                    elements.append(self._actions.escape(input, index, index + 2, []))
+                    index += 2
+                if part:
+                    elements.append(part)
+                    index += len(part)
+        return self._actions.text(input, start, end, elements)
+
+    def _read_variable(self):
+        start = self._offset
+        end = Parser.VARIABLE.match(self._input, start).end()
+        self._fail(end, 'variable', '[a-zA-Z0-9_]')
+        if end == start:
+            return FAILURE
+        self._offset = end
+        return TreeNode(self._input[start:end], start, [])
+
+    def _read_value(self):
+        index = self._offset
+        if self._literal('%[', 'value') is FAILURE:
+            return FAILURE
+        variable = self._read_variable()
+        if variable is not FAILURE:
+            conversion = self._optional('!', 'value', self._read_value_conversion, TreeNode2)
+            if self._literal(']%', 'value') is not FAILURE:
+                node = TreeNode1(self._input[index:self._offset], index, [variable, conversion])
+                node.__class__ = node_type(TreeNode1, self._types.Value, 'Value')
+                return node
+        self._offset = index
+        return FAILURE
+
+    def _read_conversion_char(self, char, excluded, conflicting, rule):
+        # One conversion character, only if no conflicting character follows later in the same word
+        input, offset = self._input, self._offset
+        if not (offset < self._input_size and char.match(input, offset)):
+            self._fail(offset, rule, char.pattern)
+            return False
+        end = excluded.match(input, offset + 1).end()
+        self._fail(end, rule, excluded.pattern[:-1])
+        if end < self._input_size and conflicting.match(input, end):
+            return False
+        self._fail(end, rule, conflicting.pattern)
+        self._offset = offset + 1
+        return True
+
+    def _read_value_conversion(self):
+        index = self._offset
+        while (
+                self._read_conversion_char(Parser.J, Parser.NOT_J, Parser.J, 'value_conversion')
+                or self._read_conversion_char(Parser.L, Parser.NOT_LU, Parser.LU, 'value_conversion')
+                or self._read_conversion_char(Parser.U, Parser.NOT_LU, Parser.LU, 'value_conversion')
+        ):
+            pass
+        return TreeNode(self._input[index:self._offset], index, [])
+
+    def _read_condition_conversion(self):
+        index = self._offset
+        while self._read_conversion_char(Parser.R, Parser.NOT_R, Parser.R, 'condition_conversion'):
+            pass
+        return TreeNode(self._input[index:self._offset], index, [])
+
+    def _read_condition(self):
+        index = self._offset
+        if self._literal('%[%', 'condition') is FAILURE:
+            return FAILURE
+        self._read__()
+        negation = self._optional_char('!', 'condition')
+        variable = self._read_variable()
+        if variable is not FAILURE:
+            conversion = self._optional('!', 'condition', self._read_condition_conversion, TreeNode4)
+            self._read__()
+            true_value = self._optional('%|%', 'condition', self._read_everything, TreeNode5)
+            false_value = self._optional('%|%', 'condition', self._read_everything, TreeNode6)
+            if self._literal('%]%', 'condition') is not FAILURE:
+                node = TreeNode3(self._input[index:self._offset], index,
+                                 [negation, variable, conversion, true_value, false_value])
+                node.__class__ = node_type(TreeNode3, self._types.Condition, 'Condition')
+                return node
+        self._offset = index
+        return FAILURE
+
+
+
+def parse(input, actions=None, types=None):
+    parser = Parser(input, actions, types)
+    return parser.parse()
@@ -0,0 +1,158 @@
+import re
+from abc import ABC, abstractmethod
+from typing import TYPE_CHECKING, Callable
+
+if TYPE_CHECKING:
+    from .MyFormatter import MyFormatter
+
+
+Write = Callable[[str], object]
+
+_TRAILING_INDENT = re.compile(r"[ \t]+")
+
+
+def dedent(string: str) -> str:
+    """
+    Strip the leading newline, indentation and trailing indent-only line from a condition branch
+
+    Only applies if the branch starts with a newline, so that ``%|%`` can be followed by an indented block
+    """
+    if not string.startswith("\n"):
+        return string
+    lines = string.splitlines()[1:]
+    if lines and _TRAILING_INDENT.fullmatch(lines[-1]):
+        lines.pop()
+    return "\n".join([l.lstrip() for l in lines])
+
+
+class CompiledNode(ABC):
+    __slots__ = ()
+
+    @abstractmethod
+    def write(self, formatter: "MyFormatter", write: Write):
+        pass
+
+    @abstractmethod
+    def collect(self, variables: set[str], conditions: set[str], conversions: set[str]):
+        """Add the variables and conversions referenced anywhere in this node to the given sets"""
+        pass
+
+    def evaluate(self, formatter: "MyFormatter") -> str:
+        buffer: list[str] = []
+        self.write(formatter, buffer.append)
+        return "".join(buffer)
+
+
+class Template(CompiledNode):
+    """Compiled format string, reusable across any number of renders"""
+    __slots__ = ("nodes", "static", "size")
+
+    def __init__(self, nodes: "list[CompiledNode | str]"):
+        # Merge adjacent text so rendering touches as few elements as possible
+        merged: "list[CompiledNode | str]" = []
+        for node in nodes:
+            if isinstance(node, str) and merged and isinstance(merged[-1], str):
+                merged[-1] += node
+            elif node != "":
+                merged.append(node)
+        self.static: str | None = "".join(merged) if all(isinstance(n, str) for n in merged) else None
+        self.nodes: "tuple[CompiledNode | str, ...]" = tuple(merged)
+        # Elements in the whole tree, the most a single render can evaluate
+        self.size: int = len(merged) + sum(n.size for n in merged if isinstance(n, Condition))
+
+    def write(self, formatter: "MyFormatter", write: Write):
+        for node in self.nodes:
+            if isinstance(node, str):
+                write(node)
+            else:
+                node.write(formatter, write)
+
+    def collect(self, variables: set[str], conditions: set[str], conversions: set[str]):
+        for node in self.nodes:
+            if not isinstance(node, str):
+                node.collect(variables, conditions, conversions)
+
+    def evaluate(self, formatter: "MyFormatter") -> str:
+        if formatter.meter is not None:
+            return self._evaluate_metered(formatter)
+        if self.static is not None:
+            return self.static
+        return super().evaluate(formatter)
+
+    def _evaluate_metered(self, formatter: "MyFormatter") -> str:
+        # Each element is evaluated at most once per render, so they are paid for up front
+        formatter.meter.spend_nodes(self.size)
+        output = self.static if self.static is not None else super().evaluate(formatter)
+        formatter.meter.spend_chars(len(output))
+        return output
+
+
+class Value(CompiledNode):
+    __slots__ = ("variable", "conversion")
+
+    def __init__(self, variable: str, conversion: str = ""):
+        self.variable = variable
+        # Resolved when rendered, so that templates compiled before a conversion is registered still use it
+        self.conversion = conversion
+
+    def write(self, formatter: "MyFormatter", write: Write):
+        return_value = formatter.vals[self.variable]
+        if self.variable in formatter.recurse:
+            return_value = formatter.expand(self.variable)
+        write(formatter.conversion_func(self.conversion)(return_value) if self.conversion else return_value)
+
+    def collect(self, variables: set[str], conditions: set[str], conversions: set[str]):
+        variables.add(self.variable)
+        conversions.update(self.conversion.casefold())
+
+
+class Condition(CompiledNode):
+    __slots__ = (
+        "negation", "variable", "conversion", "true_value", "false_value", "true_dedent", "false_dedent", "size"
+    )
+
+    def __init__(
+            self, negation: bool, variable: str, raw: bool, true_value: Template | None, false_value: Template | None,
+            conversion: str = ""
+    ):
+        self.negation = negation
+        self.variable = variable
+        self.conversion = conversion
+        # Static branches are dedented once here, dynamic ones are only dedented after rendering if they can start
+        # with a newline
+        self.true_value, self.true_dedent = self._precompute(true_value, not raw)
+        self.false_value, self.false_dedent = self._precompute(false_value, not raw)
+        self.size: int = sum(b.size for b in (true_value, false_value) if b is not None)
+
+    @staticmethod
+    def _precompute(branch: Template | None, dedent_: bool) -> "tuple[Template | str, bool]":
+        if branch is None:
+            return "", False
+        if branch.static is not None:
+            return dedent(branch.static) if dedent_ else branch.static, False
+        first = branch.nodes[0]
+        return branch, dedent_ and (not isinstance(first, str) or first.startswith("\n"))
+
+    def write(self, formatter: "MyFormatter", write: Write):
+        if bool(formatter.conds[self.variable]) is not self.negation:
+            branch, dedent_ = self.true_value, self.true_dedent
+        else:
+            branch, dedent_ = self.false_value, self.false_dedent
+        if isinstance(branch, str):
+            if branch:
+                write(branch)
+        elif dedent_:
+            # Dedenting needs the whole branch, so it is rendered apart and written once dedented
+            buffer: list[str] = []
+            branch.write(formatter, buffer.append)
+            write(dedent("".join(buffer)))
+        else:
+            branch.write(formatter, write)
+
+    def collect(self, variables: set[str], conditions: set[str], conversions: set[str]):
+        conditions.add(self.variable)
+        conversions.update(self.conversion.casefold())
+        for branch in (self.true_value, self.false_value):
+            # Static branches have nothing to collect
+            if not isinstance(branch, str):
+                branch.collect(variables, conditions, conversions)
@@ -0,0 +1,32 @@
+from core.util import LRUCache
+
+from . import MyFormatterTemplate as Compiled
+from .MyFormatter import MyFormatter
+
+
+class MyJSONFormatter(MyFormatter):
+    """
+    Formatter for the string values of JSON that has already been decoded
+
+    Output is not JSON text, so the j conversion does nothing. JSON strings cannot contain raw line breaks, so a
+    branch written inside one has never started with a newline and is never dedented. Values of recursive variables
+    are not written inside JSON, so their branches are dedented as MyFormatter's are.
+    """
+    template_cache: LRUCache[str, Compiled.Template] = LRUCache(maxsize=512)
+    expansion_cache: LRUCache[str, Compiled.Template] = LRUCache(maxsize=512)
+
+    # Only j differs, every other conversion is MyFormatter's, including ones registered on it later
+    conversions = {"j": ()}
+
+    class Types(MyFormatter.Types):
+        class Condition(MyFormatter.Types.Condition):
+            always_raw = True
+
+    @classmethod
+    def compile_expansion(cls, format_string: str) -> Compiled.Template:
+        return cls.expansion_cache.get_or_create(format_string, cls._compile_expansion)
+
+    @classmethod
+    def _compile_expansion(cls, format_string: str) -> Compiled.Template:
+        parse = cls.parsers[cls.parser]
+        return parse(format_string, actions=cls.Actions, types=MyFormatter.Types).compile(cls)
@@ -1 +1,6 @@
 from .MyFormatter import MyFormatter
+from .MyJSONFormatter import MyJSONFormatter
+from .MyFormatterAnalysis import TemplateAnalysis
+from .MyFormatterBudget import RenderBudget
+from .MyFormatterConversion import Conversion, Translate, Truncate
+from .MyFormatterError import MyFormatterError, MyFormatterRecursionError, MyFormatterBudgetError
@@ -1,7 +1,10 @@
+from bisect import bisect_left
 from itertools import pairwise
+from typing import Sequence
 
 __all__ = [
     "triplewise",
+    "prefix_range",
 ]
 
 
@@ -10,3 +13,14 @@ def triplewise(iterable):
     # triplewise('ABCDEFG') -> ABC BCD CDE DEF EFG
     for (a, _), (b, c) in pairwise(pairwise(iterable)):
         yield a, b, c
+
+
+def prefix_range(keys: Sequence[str], prefix: str) -> range:
+    """Indexes of the keys starting with prefix, in keys sorted in code point order"""
+    lo = bisect_left(keys, prefix)
+    # Nothing comes after U+10FFFF, so every string after prefix that starts with the rest of it starts with prefix
+    prefix = prefix.rstrip("\U0010FFFF")
+    if not prefix:
+        return range(lo, len(keys))
+    # The first string after every one starting with prefix
+    return range(lo, bisect_left(keys, prefix[:-1] + chr(ord(prefix[-1]) + 1), lo))
@@ -31,8 +31,14 @@ def tryint64(s: str, *, base: int = 10, default: Int64 | None = None):
 
 
 def int_to_uint64(n: Int) -> Int64:
-    return Int64(int.from_bytes(n.to_bytes(8, byteorder='little', signed=True), byteorder='little', signed=False))
+    if not -0x8000_0000_0000_0000 <= n <= 0x7FFF_FFFF_FFFF_FFFF:
+        raise OverflowError("int too big to convert")
+    return Int64(n + 0x1_0000_0000_0000_0000 if n < 0 else n)
 
 
 def uint64_to_int(n: Int) -> Int64:
-    return Int64(int.from_bytes(n.to_bytes(8, byteorder='little', signed=False), byteorder='little', signed=True))
+    if n < 0:
+        raise OverflowError("can't convert negative int to unsigned")
+    if n > 0xFFFF_FFFF_FFFF_FFFF:
+        raise OverflowError("int too big to convert")
+    return Int64(n - 0x1_0000_0000_0000_0000 if n > 0x7FFF_FFFF_FFFF_FFFF else n)
@@ -0,0 +1,92 @@
+import asyncio
+import time
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Any, Callable, Literal, Mapping, NamedTuple, TypeVar
+
+__all__ = [
+    "ExecutorKind",
+    "OffloadStats",
+    "Offloader",
+    "offloader",
+]
+
+
+_T = TypeVar("_T")
+
+ExecutorKind = Literal["inline", "thread", "process"]
+
+
+class OffloadStats(NamedTuple):
+    inline: int
+    inline_time: float
+    offloaded: int
+    offloaded_time: float
+
+
+class Offloader:
+    """
+    Runs work inline on the event loop when its input is small and in an executor when it is large
+
+    Each task type runs inline, in a thread pool or in a process pool. Work for a process pool must be picklable,
+    and work that uses objects of this process is run with local=True, which sends it to the thread pool instead.
+    """
+
+    def __init__(
+            self, threshold: int = 2000, executors: Mapping[str, ExecutorKind] = None, max_workers: int | None = None
+    ):
+        self._pools: dict[ExecutorKind, Executor] = {}
+        # Calls and seconds inline, then calls and seconds offloaded, for each task type
+        self._stats: dict[str, list] = {}
+        self.configure(threshold, executors, max_workers)
+
+    def configure(
+            self, threshold: int = 2000, executors: Mapping[str, ExecutorKind] = None, max_workers: int | None = None
+    ):
+        """
+        :param threshold: Inputs at least this size are offloaded
+        :param executors: Executor for each task type. Task types not in it go to the thread pool.
+        :param max_workers: Size of each pool, or None for the executor's default
+        """
+        self.threshold = threshold
+        self.executors: dict[str, ExecutorKind] = dict(executors or {})
+        self.max_workers = max_workers
+        for pool in self._pools.values():
+            pool.shutdown(wait=False)
+        self._pools.clear()
+
+    def _pool(self, kind: ExecutorKind) -> Executor:
+        if kind not in self._pools:
+            self._pools[kind] = ThreadPoolExecutor(self.max_workers, thread_name_prefix="offload") \
+                if kind == "thread" else ProcessPoolExecutor(self.max_workers)
+        return self._pools[kind]
+
+    async def run(self, task: str, size: int, func: Callable[..., _T], *args: Any, local: bool = False) -> _T:
+        """Call func(*args), offloaded if size is over the threshold and task is not set to run inline"""
+        kind = self.executors.get(task, "thread")
+        stats = self._stats.setdefault(task, [0, 0.0, 0, 0.0])
+        start = time.perf_counter()
+        if kind == "inline" or size < self.threshold:
+            try:
+                return func(*args)
+            finally:
+                stats[0] += 1
+                stats[1] += time.perf_counter() - start
+        if kind == "process" and local:
+            kind = "thread"
+        try:
+            return await asyncio.get_running_loop().run_in_executor(self._pool(kind), func, *args)
+        finally:
+            stats[2] += 1
+            stats[3] += time.perf_counter() - start
+
+    def stats(self) -> dict[str, OffloadStats]:
+        """Calls and seconds spent inline, blocking the event loop, and offloaded, awaited, for each task type"""
+        return {task: OffloadStats(*stats) for task, stats in self._stats.items()}
+
+    def shutdown(self):
+        for pool in self._pools.values():
+            pool.shutdown()
+        self._pools.clear()
+
+
+offloader = Offloader()
@@ -0,0 +1,332 @@
+import numbers
+from typing import Any, Callable
+
+import jsonschema
+
+__all__ = [
+    "CompiledValidator",
+    "compile_validator",
+]
+
+
+# Tests for each JSON type, as the default type checkers apply them to decoded JSON
+_TYPE_TESTS = {
+    "object": "isinstance(instance, dict)",
+    "array": "isinstance(instance, list)",
+    "string": "isinstance(instance, str)",
+    "boolean": "isinstance(instance, bool)",
+    "null": "instance is None",
+    "number": "(isinstance(instance, _Number) and not isinstance(instance, bool))",
+    "integer": "(isinstance(instance, int) and not isinstance(instance, bool))",
+}
+_INTEGRAL_FLOAT_TEST = (
+    "(isinstance(instance, int) and not isinstance(instance, bool) "
+    "or isinstance(instance, float) and instance.is_integer())"
+)
+_TYPE_PROBES = ({}, [], "", "a", 0, 1, -1, 1.0, 1.5, True, False, None)
+
+
+class _Unsupported(Exception):
+    pass
+
+
+def _error(message: str, keyword: str | None, value: Any, instance: Any, schema: Any) -> jsonschema.ValidationError:
+    return jsonschema.ValidationError(
+        message, validator=keyword, validator_value=value, instance=instance, schema=schema,
+        schema_path=() if keyword is None else (keyword,)
+    )
+
+
+def _extras_message(extras: set[str]) -> str:
+    extras = sorted(extras, key=str)
+    return "Additional properties are not allowed (%s %s unexpected)" % (
+        ", ".join(repr(extra) for extra in extras), "was" if len(extras) == 1 else "were"
+    )
+
+
+class CompiledValidator:
+    """
+    Schema of a jsonschema validator compiled into plain Python functions
+
+    Keywords are checked in the same order and raise the same first ValidationError (message, path, keyword and
+    value) as the validator it was compiled from, without walking the schema on every call.
+    """
+
+    def __init__(self, validator: jsonschema.protocols.Validator):
+        """:raises ValueError: The schema uses a keyword or type checker that cannot be compiled"""
+        self.interpreted = validator
+        self.schema = validator.schema
+        try:
+            self._validate, self._is_valid, self.source = _Compiler(validator).compile()
+        except _Unsupported as ex:
+            raise ValueError(f"Cannot compile schema: {ex}") from None
+
+    def validate(self, instance: Any):
+        """:raises jsonschema.ValidationError: The first error the interpreted validator would raise"""
+        error = self._validate(instance)
+        if error is not None:
+            raise error
+
+    def is_valid(self, instance: Any) -> bool:
+        return self._is_valid(instance)
+
+
+def compile_validator(validator: jsonschema.protocols.Validator) -> "CompiledValidator | jsonschema.protocols.Validator":
+    """Compile validator, or return it as it is if its schema cannot be compiled"""
+    try:
+        return CompiledValidator(validator)
+    except ValueError:
+        return validator
+
+
+class _Compiler:
+    """
+    Generates two functions per subschema: one returning the first error or None, and one returning whether the
+    instance is valid, which ``not`` uses without building errors that are thrown away
+    """
+
+    def __init__(self, validator: jsonschema.protocols.Validator):
+        self.validator = validator
+        self.keywords = type(validator).VALIDATORS
+        self.applicable: Callable[[dict], Any] = type(validator)._APPLICABLE_VALIDATORS  # noqa
+        self.type_tests = self._type_tests(validator)
+        self.anchors: dict[str, Any] = {}
+        self._find_anchors(validator.schema)
+        self.namespace: dict[str, Any] = {"_error": _error, "_extras_message": _extras_message,
+                                          "_Number": numbers.Number}
+        self.functions: dict[tuple[int, bool], str] = {}
+        self.sources: list[str] = []
+
+    def compile(self) -> tuple[Callable[[Any], jsonschema.ValidationError | None], Callable[[Any], bool], str]:
+        validate, is_valid = self.function(self.validator.schema, False), self.function(self.validator.schema, True)
+        source = "\n\n".join(self.sources)
+        exec(compile(source, "<compiled schema>", "exec"), self.namespace)
+        return self.namespace[validate], self.namespace[is_valid], source
+
+    @staticmethod
+    def _type_tests(validator: jsonschema.protocols.Validator) -> dict[str, str]:
+        tests = dict(_TYPE_TESTS)
+        if validator.is_type(1.0, "integer"):
+            tests["integer"] = _INTEGRAL_FLOAT_TEST
+        # Any other type checker has to agree with the generated tests on every kind of JSON value
+        for name, test in tests.items():
+            for probe in _TYPE_PROBES:
+                if validator.is_type(probe, name) != eval(test, {"_Number": numbers.Number}, {"instance": probe}):
+                    raise _Unsupported(f"type checker for {name!r}")
+        return tests
+
+    def _find_anchors(self, schema: Any):
+        if isinstance(schema, dict):
+            if isinstance(schema.get("$anchor"), str):
+                self.anchors[schema["$anchor"]] = schema
+            for value in schema.values():
+                self._find_anchors(value)
+        elif isinstance(schema, list):
+            for value in schema:
+                self._find_anchors(value)
+
+    def constant(self, value: Any) -> str:
+        name = f"_k{len(self.namespace)}"
+        self.namespace[name] = value
+        return name
+
+    def function(self, schema: Any, check: bool) -> str:
+        """Name of the function for schema, generating it the first time"""
+        key = (id(schema), check)
+        if key not in self.functions:
+            name = self.functions[key] = f"_{'is_valid' if check else 'validate'}_{len(self.functions)}"
+            self.sources.append(_Function(self, name, schema, check).source())
+        return self.functions[key]
+
+    def resolve(self, ref: str) -> Any:
+        if not ref.startswith("#"):
+            raise _Unsupported(f"$ref {ref!r}")
+        if ref[1:] in self.anchors:
+            return self.anchors[ref[1:]]
+        schema = self.validator.schema
+        if ref == "#":
+            return schema
+        if not ref.startswith("#/"):
+            raise _Unsupported(f"$ref {ref!r}")
+        for part in ref[2:].split("/"):
+            part = part.replace("~1", "/").replace("~0", "~")
+            try:
+                schema = schema[int(part) if isinstance(schema, list) else part]
+            except (KeyError, IndexError, ValueError):
+                raise _Unsupported(f"$ref {ref!r}") from None
+        return schema
+
+
+class _Function:
+    """Source of the function checking one subschema"""
+
+    def __init__(self, compiler: _Compiler, name: str, schema: Any, check: bool):
+        self.compiler = compiler
+        self.name = name
+        self.schema = schema
+        self.check = check
+        self.lines: list[str] = []
+        # Type the instance is known to have once an earlier type keyword has passed
+        self.known: str | None = None
+
+    def source(self) -> str:
+        self.lines.append(f"def {self.name}(instance):")
+        if self.schema is True:
+            pass
+        elif self.schema is False:
+            self.lines.append(
+                "    return False" if self.check else
+                "    return _error('False schema does not allow ' + repr(instance), None, None, instance, False)"
+            )
+        elif isinstance(self.schema, dict):
+            for keyword, value in self.compiler.applicable(self.schema):
+                if keyword not in self.compiler.keywords:
+                    continue
+                emit = getattr(self, "_" + keyword.lstrip("$"), None)
+                if emit is None:
+                    raise _Unsupported(keyword)
+                emit(value, keyword)
+        else:
+            raise _Unsupported(f"schema {self.schema!r}")
+        self.lines.append("    return True" if self.check else "    return None")
+        return "\n".join(self.lines)
+
+    # Code generation helpers
+
+    def fail(self, message: str, keyword: str, indent: int) -> str:
+        """Statement returning the failure of keyword, message being an expression"""
+        if self.check:
+            return " " * indent + "return False"
+        value, schema = self.compiler.constant(self.schema[keyword]), self.compiler.constant(self.schema)
+        return " " * indent + f"return _error({message}, {keyword!r}, {value}, instance, {schema})"
+
+    def guard(self, type_name: str) -> int:
+        """Only run the lines that follow for instances of type_name, returning their indentation"""
+        if self.known == type_name or (type_name == "number" and self.known == "integer"):
+            return 4
+        self.lines.append(f"    if {self.compiler.type_tests[type_name]}:")
+        return 8
+
+    def descend(self, schema: Any, instance: str, indent: int, path: str | None = None, schema_path: str = None,
+                keyword: str | None = None):
+        pad = " " * indent
+        function = self.compiler.function(schema, self.check)
+        if self.check:
+            self.lines.append(f"{pad}if not {function}({instance}):")
+            self.lines.append(f"{pad}    return False")
+            return
+        self.lines.append(f"{pad}error = {function}({instance})")
+        self.lines.append(f"{pad}if error is not None:")
+        if path is not None:
+            self.lines.append(f"{pad}    error.path.appendleft({path})")
+        left = tuple(p for p in (schema_path, keyword) if p is not None)
+        if left:
+            self.lines.append(f"{pad}    error.schema_path.extendleft(({', '.join(left)},))")
+        self.lines.append(f"{pad}    return error")
+
+    def length(self, type_name: str, keyword: str, value: Any, too: str, message: str):
+        if not isinstance(value, int) or isinstance(value, bool):
+            raise _Unsupported(f"{keyword} {value!r}")
+        indent = self.guard(type_name)
+        self.lines.append(" " * indent + f"if len(instance) {too} {value}:")
+        self.lines.append(self.fail(f"repr(instance) + {' ' + message!r}", keyword, indent + 4))
+
+    # Keywords
+
+    def _type(self, value: str | list[str], keyword: str):
+        types = [value] if isinstance(value, str) else value
+        if not types or any(t not in self.compiler.type_tests for t in types):
+            raise _Unsupported(f"type {value!r}")
+        test = " or ".join(self.compiler.type_tests[t] for t in types)
+        reprs = ", ".join(repr(t) for t in types)
+        self.lines.append(f"    if not ({test}):")
+        self.lines.append(self.fail(f"repr(instance) + {' is not of type ' + reprs!r}", keyword, 8))
+        if len(types) == 1:
+            self.known = types[0]
+
+    def _enum(self, value: list, keyword: str):
+        # Strings only equal strings, so membership in a set is exactly jsonschema's equality
+        if not isinstance(value, list) or not all(isinstance(v, str) for v in value):
+            raise _Unsupported(f"enum {value!r}")
+        members = self.compiler.constant(frozenset(value))
+        self.lines.append(f"    if not (isinstance(instance, str) and instance in {members}):")
+        self.lines.append(self.fail(f"repr(instance) + {' is not one of ' + repr(value)!r}", keyword, 8))
+
+    def _minimum(self, value: int | float, keyword: str):
+        indent = self.guard("number")
+        self.lines.append(" " * indent + f"if instance < {self.compiler.constant(value)}:")
+        self.lines.append(self.fail(f"repr(instance) + {' is less than the minimum of ' + repr(value)!r}", keyword,
+                                    indent + 4))
+
+    def _maximum(self, value: int | float, keyword: str):
+        indent = self.guard("number")
+        self.lines.append(" " * indent + f"if instance > {self.compiler.constant(value)}:")
+        self.lines.append(self.fail(f"repr(instance) + {' is greater than the maximum of ' + repr(value)!r}", keyword,
+                                    indent + 4))
+
+    def _minLength(self, value: int, keyword: str):
+        self.length("string", keyword, value, "<", "should be non-empty" if value == 1 else "is too short")
+
+    def _maxLength(self, value: int, keyword: str):
+        self.length("string", keyword, value, ">", "is expected to be empty" if value == 0 else "is too long")
+
+    def _minItems(self, value: int, keyword: str):
+        self.length("array", keyword, value, "<", "should be non-empty" if value == 1 else "is too short")
+
+    def _maxItems(self, value: int, keyword: str):
+        self.length("array", keyword, value, ">", "is expected to be empty" if value == 0 else "is too long")
+
+    def _minProperties(self, value: int, keyword: str):
+        self.length("object", keyword, value, "<",
+                    "should be non-empty" if value == 1 else "does not have enough properties")
+
+    def _maxProperties(self, value: int, keyword: str):
+        self.length("object", keyword, value, ">",
+                    "is expected to be empty" if value == 0 else "has too many properties")
+
+    def _required(self, value: list[str], keyword: str):
+        if not value:
+            return
+        indent = self.guard("object")
+        for prop in value:
+            self.lines.append(" " * indent + f"if {prop!r} not in instance:")
+            self.lines.append(self.fail(repr(f"{prop!r} is a required property"), keyword, indent + 4))
+
+    def _properties(self, value: dict[str, Any], keyword: str):
+        if not value:
+            return
+        indent = self.guard("object")
+        for prop, subschema in value.items():
+            self.lines.append(" " * indent + f"if {prop!r} in instance:")
+            self.descend(subschema, f"instance[{prop!r}]", indent + 4, repr(prop), repr(prop), repr(keyword))
+
+    def _additionalProperties(self, value: Any, keyword: str):
+        if value is True or value == {}:
+            return
+        if value is not False or "patternProperties" in self.schema:
+            raise _Unsupported(f"additionalProperties {value!r}")
+        allowed = self.compiler.constant(frozenset(self.schema.get("properties", {})))
+        indent = self.guard("object")
+        self.lines.append(" " * indent + f"if not instance.keys() <= {allowed}:")
+        self.lines.append(self.fail(f"_extras_message(instance.keys() - {allowed})", keyword, indent + 4))
+
+    def _items(self, value: Any, keyword: str):
+        if "prefixItems" in self.schema or isinstance(value, bool):
+            raise _Unsupported(f"items {value!r}")
+        indent = self.guard("array")
+        pad = " " * indent
+        if self.check:
+            self.lines.append(f"{pad}for item in instance:")
+            self.descend(value, "item", indent + 4)
+        else:
+            self.lines.append(f"{pad}for index, item in enumerate(instance):")
+            self.descend(value, "item", indent + 4, "index", None, repr(keyword))
+
+    def _not(self, value: Any, keyword: str):
+        function = self.compiler.function(value, True)
+        self.lines.append(f"    if {function}(instance):")
+        self.lines.append(self.fail(f"repr(instance) + {' should not be valid under ' + repr(value)!r}", keyword, 8))
+
+    def _ref(self, value: str, keyword: str):
+        # Errors under $ref keep the keyword and path of where they happened
+        self.descend(self.compiler.resolve(value), "instance", 4)
@@ -2,7 +2,8 @@ import enum
 import itertools
 import json
 import re
-from typing import Callable, TypeAlias, Any, Iterable
+import threading
+from typing import Callable, TypeAlias, Any, Iterable, NamedTuple
 
 import jsonschema
 
@@ -15,9 +16,10 @@ __all__ = [
     "json_escape",
     "MyJSONValidation",
     "MyJSONValidationError",
+    "ValidationStats",
 ]
 
-from core.util import compose
+from core.util import compose, compile_validator, json_codec
 
 
 def convert_to_bool(argument: str) -> bool | None:
@@ -97,6 +99,10 @@ class MyJSONValidationError(Exception):
         self.message = message
         self.path = path
 
+    def __reduce__(self):
+        # Raised in worker processes by offloaded parses
+        return type(self), (self.message, self.path)
+
     def user_warning(self, field: str):
         ex = UserInputWarning(
             self.VALIDATOR_ERR_MSG.format(field=field, path=self.path, message=self.message)
@@ -107,30 +113,70 @@ class MyJSONValidationError(Exception):
         return ex
 
 
+class ValidationStats(NamedTuple):
+    valid: int
+    invalid: int
+    malformed: int
+
+
 class MyJSONValidation:
     def __init__(self, validator: jsonschema.protocols.Validator):
-        self.validator = validator
+        # Schemas are fixed, so they are compiled once instead of being walked on every parse
+        self.validator = compile_validator(validator)
+        # Inputs that passed the validity check, failed the schema, or were not JSON at all. Parses run in offload
+        # threads as well as on the event loop, so they are counted under a lock.
+        self._lock = threading.Lock()
+        self.valid = 0
+        self.invalid = 0
+        self.malformed = 0
 
     def parse(self, string: str) -> Any:
         try:
-            dct = json.loads(string)
+            dct = json_codec.loads(string)
+            if self.validator.is_valid(dct):
+                with self._lock:
+                    self.valid += 1
+                return dct
+            # Only invalid input pays for finding and describing its first error
+            with self._lock:
+                self.invalid += 1
             self.validator.validate(dct)
             return dct
         except Exception as ex:
             match ex:
                 case json.JSONDecodeError():
+                    with self._lock:
+                        self.malformed += 1
                     raise MyJSONValidationError(path=None, message=str(ex)) from ex
-                case jsonschema.ValidationError(
-                    json_path=json_path, validator="maxItems" | "maxLength", validator_value=_max
-                ):
-                    raise MyJSONValidationError(path=json_path,
-                                                message=f"Maximum length is {_max}") from ex
-                case jsonschema.ValidationError(
-                    json_path=json_path, validator="minProperties" | "minItems" | "minLength", validator_value=_min
-                ) if _min == 1:
-                    raise MyJSONValidationError(path=json_path,
-                                                message="Value cannot be empty") from ex
-                case jsonschema.ValidationError(json_path=json_path, message=message):
-                    raise MyJSONValidationError(path=json_path, message=message) from ex
+                case jsonschema.ValidationError():
+                    raise self.validation_error(ex) from ex
                 case _:
                     raise ex
+
+    def check(self, value: Any) -> Any:
+        """Check already decoded JSON against the schema, without counting it in stats"""
+        if not self.validator.is_valid(value):
+            try:
+                self.validator.validate(value)
+            except jsonschema.ValidationError as ex:
+                raise self.validation_error(ex) from ex
+        return value
+
+    @staticmethod
+    def validation_error(ex: jsonschema.ValidationError) -> MyJSONValidationError:
+        match ex:
+            case jsonschema.ValidationError(
+                json_path=json_path, validator="maxItems" | "maxLength", validator_value=_max
+            ):
+                return MyJSONValidationError(path=json_path, message=f"Maximum length is {_max}")
+            case jsonschema.ValidationError(
+                json_path=json_path, validator="minProperties" | "minItems" | "minLength", validator_value=_min
+            ) if _min == 1:
+                return MyJSONValidationError(path=json_path, message="Value cannot be empty")
+            case jsonschema.ValidationError(json_path=json_path, message=message):
+                return MyJSONValidationError(path=json_path, message=message)
+
+    def stats(self) -> ValidationStats:
+        """Parses in this process. Ones run in an offload process pool count there."""
+        with self._lock:
+            return ValidationStats(self.valid, self.invalid, self.malformed)
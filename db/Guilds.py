@@ -1,30 +1,164 @@
+import asyncio
+import logging
+from typing import Iterable
+
+from pymongo.errors import PyMongoError
+
 from app import app
-from core.util import Int, uint64_to_int
+from core.util import TTLCache, SingleFlight
 from db.models.types import MongoProjection, from_dict, asdict
 from db.models.Guild import Guild, Autochannel
+from db.writebehind import WriteBehind, PendingWrite
+
+
+# Whole guild documents by ID, so a find with any projection can be served from it. Replaced by configure_cache.
+cache: "TTLCache[int, Guild]" = TTLCache(maxsize=10_000, ttl=300)
+# Reads in flight by ID. Every read helper goes through it, so concurrent reads of a guild share one query.
+flights: "SingleFlight[int, Guild]" = SingleFlight()
+# Bumped on every invalidation, so a read that overlapped a write does not cache what it read from before it
+_invalidations = 0
+
+# Set by configure_write_behind. Writes then go to its journal, and the cache keeps stored guilds until they are flushed.
+write_behind: WriteBehind | None = None
+
+# Guilds fetched per query when prefetching
+PREFETCH_BATCH = 1000
+
+
+def configure_cache(maxsize: int, ttl: float):
+    global cache
+    cache = TTLCache(maxsize=maxsize, ttl=ttl)
+
+
+def configure_write_behind(file: str, batch_size: int = 500, fsync: bool = True):
+    """Journal writes in file, replaying what it holds, for WriteBehind.run to flush"""
+    global write_behind
+    write_behind = WriteBehind(lambda: app.db_client.pompholux.guilds, file, batch_size, fsync, _flushed)
+
+
+def _flushed(ids: list[int]):
+    for id_ in ids:
+        _invalidate(id_)
+
+
+def invalidate(id_: int | None = None):
+    """Drop a guild from the cache, or every guild if id_ is None"""
+    _invalidate(None if id_ is None else int(id_))
+
+
+def _invalidate(key: int | None):
+    global _invalidations
+    _invalidations += 1
+    # Reads in flight may have started before the write; later ones must not join them
+    flights.forget(key)
+    if key is None:
+        cache.clear()
+    else:
+        cache.pop(key)
+
+
+async def find(id_: int, projection: MongoProjection = None) -> Guild:
+    """
+    Read through the cache. The returned Guild may be shared with other callers and must not be modified.
+
+    :param projection: Fields the caller needs. Cached guilds have all of them.
+    """
+    key = int(id_)
+    if write_behind is not None and (pending := write_behind.pending(key)) is not None:
+        return await _find_pending(key, pending)
+    guild = cache.get(key)
+    if guild is None:
+        # Whole documents are read whatever the projection, so the ID alone identifies the query
+        guild = await flights.do(key, lambda: _load(key))
+    return guild
+
+
+async def _load(key: int) -> Guild:
+    invalidations = _invalidations
+    guild = from_dict(Guild, await app.db_client.pompholux.guilds.find_one({"_id": key}))
+    if invalidations == _invalidations:
+        cache[key] = guild
+    return guild
+
+
+async def _find_pending(key: int, pending: PendingWrite) -> Guild:
+    """Read a guild with its writes not flushed yet applied"""
+    stored = None
+    if not pending.deleted:
+        guild = cache.get(key)
+        stored = asdict(guild) if guild is not None \
+            else await app.db_client.pompholux.guilds.find_one({"_id": key})
+    return from_dict(Guild, pending.apply(key, stored))
+
+
+async def prefetch(ids: Iterable[int]):
+    """Fill the cache with the guilds that are not in it or being read yet, up to its size, in batches of $in queries"""
+    keys = [
+        key for key in (int(id_) for id_ in ids) if key not in cache and key not in flights
+    ][:cache.maxsize]
+    for start in range(0, len(keys), PREFETCH_BATCH):
+        invalidations = _invalidations
+        documents = await app.db_client.pompholux.guilds.find(
+            {"_id": {"$in": keys[start:start + PREFETCH_BATCH]}}
+        ).to_list(None)
+        if invalidations == _invalidations:
+            for document in documents:
+                cache[int(document["_id"])] = from_dict(Guild, document)
+
 
+async def watch(retry_delay: float = 5.0, max_retry_delay: float = 300.0):
+    """
+    Invalidate guilds changed by other processes, as reported by a change stream, until cancelled
 
-async def find(id_: Int, projection: MongoProjection = None) -> Guild:
-    return from_dict(Guild, await app.db_client.pompholux.guilds.find_one({"_id": uint64_to_int(id_)}, projection))
+    Change streams need a replica set or sharded cluster. Events may be missed while the stream is down, so the
+    whole cache is dropped every time it is opened.
+    """
+    logger = logging.getLogger("db.Guilds")
+    failures = 0
+    while True:
+        try:
+            async with app.db_client.pompholux.guilds.watch() as stream:
+                _invalidate(None)
+                failures = 0
+                async for change in stream:
+                    # Keys are stored IDs already; events without one drop or rename the collection
+                    _invalidate(int(change["documentKey"]["_id"]) if "documentKey" in change else None)
+        except PyMongoError as ex:
+            delay = min(retry_delay * 2 ** failures, max_retry_delay)
+            failures += 1
+            logger.warning("Guild change stream failed, retrying in %s seconds", delay, exc_info=ex)
+            await asyncio.sleep(delay)
 
 
-async def create(id_: Int):
-    await app.db_client.pompholux.guilds.insert_one({"_id": uint64_to_int(id_)})
+async def create(id_: int):
+    if write_behind is not None:
+        return await write_behind.create(int(id_))
+    await app.db_client.pompholux.guilds.insert_one({"_id": id_})
+    invalidate(id_)
 
 
-async def delete(id_: Int):
-    await app.db_client.pompholux.guilds.delete_one({"_id": uint64_to_int(id_)})
+async def delete(id_: int):
+    if write_behind is not None:
+        return await write_behind.delete(int(id_))
+    await app.db_client.pompholux.guilds.delete_one({"_id": id_})
+    invalidate(id_)
 
 
-async def update_autochannel(id_: Int, autochannel: Autochannel):
+async def update_autochannel(id_: int, autochannel: Autochannel):
+    if write_behind is not None:
+        return await write_behind.set(int(id_), "autochannel", asdict(autochannel))
     await app.db_client.pompholux.guilds.update_one(
-        {"_id": uint64_to_int(id_)},
+        {"_id": id_},
         { "$set": { "autochannel": asdict(autochannel) } }
     )
+    invalidate(id_)
 
 
-async def enable_autochannel(id_: Int, enabled: bool):
+async def enable_autochannel(id_: int, enabled: bool):
+    if write_behind is not None:
+        return await write_behind.set(int(id_), "autochannel.enabled", enabled)
     await app.db_client.pompholux.guilds.update_one(
-        {"_id": uint64_to_int(id_)},
+        {"_id": id_},
         { "$set": { "autochannel.enabled": enabled } }
     )
+    invalidate(id_)
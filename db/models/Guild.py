@@ -1,20 +1,18 @@
 import dataclasses
 from typing import Optional
 
-from core.util import uint64
-
 
 @dataclasses.dataclass
 class Autochannel:
     enabled: bool
-    notify: uint64 = None
-    content: str = None
-    format: str = None
-    category: Optional[uint64] = None
+    notify: Optional[int] = None
+    content: Optional[str] = None
+    format: Optional[str] = None
+    category: Optional[int] = None
     messagePerms: bool = False
 
 
 @dataclasses.dataclass
 class Guild:
-    _id: uint64
+    _id: int
     autochannel: Optional[Autochannel] = None
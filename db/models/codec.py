@@ -0,0 +1,114 @@
+import dataclasses
+import types
+from typing import Any, Callable, Generic, Mapping, Type, TypeVar, Union, get_args, get_origin, get_type_hints
+
+from dacite import DaciteFieldError, MissingValueError, WrongTypeError
+
+__all__ = [
+    "ModelCodec",
+]
+
+
+T = TypeVar("T")
+
+NoneType = type(None)
+# Field types a codec converts with plain isinstance checks, and what each check accepts
+SCALARS = {bool: bool, int: int, float: (int, float), str: str}
+
+
+class ModelCodec(Generic[T]):
+    """
+    Converts between documents and instances of a dataclass with functions generated for its fields
+
+    decode gives the instance or raises the error dacite.from_dict would, with strict type checks. encode gives the
+    dict dataclasses.asdict would. Fields may be bool, int, float, str, another dataclass, or Optional of any of these.
+    """
+
+    def __init__(
+            self,
+            type_: Type[T],
+            codecs: dict[type, "ModelCodec"] = None,
+    ):
+        """:param codecs: Codecs of nested dataclasses, which are generated into it when missing"""
+        self.type = type_
+        codecs = {} if codecs is None else codecs
+        codecs[type_] = self
+        namespace = {
+            "NoneType": NoneType, "Mapping": Mapping, "DaciteFieldError": DaciteFieldError,
+            "MissingValueError": MissingValueError, "WrongTypeError": WrongTypeError, "cls": type_,
+        }
+        decode, encode = ["def decode(data):"], ["def encode(obj):", "    return {"]
+        for i, field in enumerate(dataclasses.fields(type_)):
+            if not field.init:
+                raise TypeError(f"{type_.__name__}.{field.name}: fields outside __init__ are not supported")
+            field_type = get_type_hints(type_)[field.name]
+            inner, optional = _unwrap_optional(field_type)
+            namespace[f"type_{i}"] = field_type
+
+            if inner in SCALARS:
+                build = []
+                accepts = SCALARS[inner]
+            elif dataclasses.is_dataclass(inner):
+                nested = codecs[inner] if inner in codecs else ModelCodec(inner, codecs)
+                namespace[f"decode_{i}"] = nested.decode
+                build = [
+                    "if isinstance(value, Mapping):",
+                    "    try:",
+                    f"        value = decode_{i}(value)",
+                    "    except DaciteFieldError as ex:",
+                    f"        ex.update_path({field.name!r})",
+                    "        raise",
+                ]
+                accepts = inner
+            else:
+                raise TypeError(f"{type_.__name__}.{field.name}: {field_type} is not supported")
+            namespace[f"accepts_{i}"] = (accepts if isinstance(accepts, tuple) else (accepts,)) + \
+                ((NoneType,) if optional else ())
+
+            decode.append(f"    if {field.name!r} in data:")
+            decode.append(f"        value = data[{field.name!r}]")
+            if optional and build:
+                decode.append("        if value is not None:")
+                decode.extend(" " * 12 + line for line in build)
+            else:
+                decode.extend(" " * 8 + line for line in build)
+            decode.append(f"        if not isinstance(value, accepts_{i}):")
+            decode.append(
+                f"            raise WrongTypeError(field_path={field.name!r}, field_type=type_{i}, value=value)"
+            )
+            decode.append(f"        field_{i} = value")
+            decode.append("    else:")
+            if field.default is not dataclasses.MISSING:
+                namespace[f"default_{i}"] = field.default
+                decode.append(f"        field_{i} = default_{i}")
+            elif field.default_factory is not dataclasses.MISSING:
+                namespace[f"default_{i}"] = field.default_factory
+                decode.append(f"        field_{i} = default_{i}()")
+            elif optional:
+                decode.append(f"        field_{i} = None")
+            else:
+                decode.append(f"        raise MissingValueError({field.name!r})")
+
+            encoded = f"obj.{field.name}"
+            if dataclasses.is_dataclass(inner):
+                namespace[f"encode_{i}"] = codecs[inner].encode
+                encoded = f"None if (value := {encoded}) is None else encode_{i}(value)"
+            encode.append(f"        {field.name!r}: {encoded},")
+
+        decode.append("    return cls(" + ", ".join(
+            f"{field.name}=field_{i}" for i, field in enumerate(dataclasses.fields(type_))
+        ) + ")")
+        encode.append("    }")
+        self.source = "\n".join(decode) + "\n\n\n" + "\n".join(encode) + "\n"
+        exec(compile(self.source, f"<codec {type_.__module__}.{type_.__qualname__}>", "exec"), namespace)
+        self.decode: Callable[[Mapping[str, Any]], T] = namespace["decode"]
+        self.encode: Callable[[T], dict] = namespace["encode"]
+
+
+def _unwrap_optional(type_) -> tuple[Any, bool]:
+    """The type inside Optional, and whether it was in one"""
+    if get_origin(type_) in (Union, types.UnionType):
+        args = [arg for arg in get_args(type_) if arg is not NoneType]
+        if len(args) == 1 and len(get_args(type_)) == 2:
+            return args[0], True
+    return type_, False
@@ -1,33 +1,23 @@
-import dataclasses
 from typing import TypeAlias, TypeVar, Type, Any, List, Dict
 
-import dacite
-
-from core.util import uint64, int_to_uint64, uint64_to_int
+from db.models.codec import ModelCodec
 
 MongoProjection: TypeAlias = List[str] | Dict[str, bool]
 T = TypeVar("T")
 
+# Generated on first use of each model
+codecs: dict[type, ModelCodec] = {}
 
-def from_dict(type_: Type[T], data: dict[str, Any]) -> T:
-    from_dict_type_hooks = {
-        uint64: int_to_uint64,
-    }
 
-    return dacite.from_dict(
-        type_,
-        data,
-        dacite.Config(
-            type_hooks=from_dict_type_hooks
-        )
-    )
+def codec(type_: Type[T]) -> ModelCodec[T]:
+    if type_ not in codecs:
+        ModelCodec(type_, codecs)
+    return codecs[type_]
 
 
-def asdict(obj: Any) -> dict:
-    asdict_type_hooks = {
-        uint64: uint64_to_int
-    }
+def from_dict(type_: Type[T], data: dict[str, Any]) -> T:
+    return codec(type_).decode(data)
+
 
-    def asdict_factory(data: list[tuple[str, Any]]) -> dict:
-        return dict((k, asdict_type_hooks.get(type(v), lambda v: v)(v)) for (k, v) in data)
-    return dataclasses.asdict(obj, dict_factory=asdict_factory)
+def asdict(obj: Any) -> dict:
+    return codec(type(obj)).encode(obj)
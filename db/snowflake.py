@@ -0,0 +1,38 @@
+"""
+Stores Discord snowflakes, which are unsigned 64-bit, in BSON's signed int64 with the same bits
+
+Registered on the Motor client, so IDs are written and read as plain ints anywhere in a document, arrays included.
+Every 64-bit integer the bot stores is a snowflake, so a negative int64 is always read as the snowflake it holds.
+"""
+from typing import Any
+
+from bson import Int64
+from bson.codec_options import TypeDecoder, TypeRegistry
+
+__all__ = [
+    "SnowflakeDecoder",
+    "encode_snowflake",
+    "type_registry",
+]
+
+
+class SnowflakeDecoder(TypeDecoder):
+    bson_type = Int64
+
+    def transform_bson(self, value: Int64) -> int:
+        return value + 0x1_0000_0000_0000_0000 if value < 0 else value
+
+
+def encode_snowflake(value: Any) -> Any:
+    """
+    Fallback encoder: ints too large for int64 but within uint64, then anything else unchanged
+
+    bson encodes ints that fit in int64 itself and calls this for the ones that do not, or for values of types it
+    cannot encode, which it then rejects as it would have without a fallback.
+    """
+    if isinstance(value, int) and 0x8000_0000_0000_0000 <= value <= 0xFFFF_FFFF_FFFF_FFFF:
+        return Int64(value - 0x1_0000_0000_0000_0000)
+    return value
+
+
+type_registry = TypeRegistry([SnowflakeDecoder()], fallback_encoder=encode_snowflake)
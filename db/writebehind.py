@@ -0,0 +1,281 @@
+"""
+Write-behind for a collection: writes go to an append-only journal and are flushed to it later with bulk_write
+
+Writes to the same document are coalesced into one operation, so flushing a batch needs no ordering and may be
+repeated. The journal holds every write since it was last flushed empty and is replayed when it is opened, which may
+redo writes that were flushed but not yet dropped from it.
+"""
+import asyncio
+import copy
+import dataclasses
+import itertools
+import logging
+import os
+from typing import Any, Callable, Iterable
+
+from pymongo import DeleteOne, InsertOne, ReplaceOne, UpdateOne
+from pymongo.errors import BulkWriteError
+
+from core.util import json_codec
+
+__all__ = [
+    "PendingWrite",
+    "WriteBehind",
+]
+
+
+DUPLICATE_KEY = 11000
+
+
+@dataclasses.dataclass
+class PendingWrite:
+    """Writes to one document, coalesced into a delete, then a create, then a $set"""
+    deleted: bool = False
+    created: bool = False
+    sets: dict[str, Any] = dataclasses.field(default_factory=dict)
+
+    def delete(self):
+        self.deleted, self.created = True, False
+        self.sets.clear()
+
+    def create(self):
+        # Without a delete before it, sets before it were to the document that exists, which it keeps
+        self.created = True
+
+    def set(self, path: str, value: Any):
+        if self.deleted and not self.created:
+            # Updates no document
+            return
+        for key in [key for key in self.sets if key == path or key.startswith(path + ".")]:
+            del self.sets[key]
+        for key in self.sets:
+            if path.startswith(key + "."):
+                self.sets[key] = _set_path(copy.deepcopy(self.sets[key]), path[len(key) + 1:], value)
+                return
+        self.sets[path] = copy.deepcopy(value)
+
+    def merge(self, later: "PendingWrite"):
+        """Add writes made after these"""
+        if later.deleted:
+            self.delete()
+        if later.created:
+            self.create()
+        for path, value in later.sets.items():
+            self.set(path, value)
+
+    def apply(self, id_: Any, document: dict | None) -> dict | None:
+        """The document these writes leave, given the stored one or None if there is none"""
+        if self.deleted:
+            document = None
+        if self.created and document is None:
+            document = {"_id": id_}
+        if document is None:
+            return None
+        for path, value in self.sets.items():
+            document = _set_path(document, path, value)
+        return document
+
+    def operation(self, id_: Any) -> DeleteOne | InsertOne | ReplaceOne | UpdateOne:
+        if self.deleted:
+            if not self.created:
+                return DeleteOne({"_id": id_})
+            return ReplaceOne({"_id": id_}, self.apply(id_, None), upsert=True)
+        if self.created and not self.sets:
+            return InsertOne({"_id": id_})
+        return UpdateOne({"_id": id_}, {"$set": self.sets}, upsert=self.created)
+
+
+def _set_path(document: Any, path: str, value: Any) -> dict:
+    """Copy of document with the dotted path set, as $set would"""
+    key, _, rest = path.partition(".")
+    # A coalesced $set may have set the start of the path to something other than a document
+    document = dict(document) if isinstance(document, dict) else {}
+    if rest:
+        document[key] = _set_path(document.get(key), rest, value)
+    else:
+        document[key] = copy.deepcopy(value)
+    return document
+
+
+class WriteBehind:
+    """
+    Pending writes to a collection, with their journal
+
+    :param collection: Gives the Motor collection to flush to
+    :param file: Journal, created if missing
+    :param batch_size: Documents per bulk_write. Reaching it in pending writes also wakes run.
+    :param fsync: Sync the journal to disk before a write returns, so that it survives the machine going down as well
+    :param on_flushed: Called with the IDs of each batch once flushed
+    """
+
+    def __init__(
+            self,
+            collection: Callable[[], Any],
+            file: str,
+            batch_size: int = 500,
+            fsync: bool = True,
+            on_flushed: Callable[[list], None] = None,
+    ):
+        self.collection = collection
+        self.file = file
+        self.batch_size = batch_size
+        self.fsync = fsync
+        self.on_flushed = on_flushed
+        self.logger = logging.getLogger("db.writebehind")
+        self._pending: dict[Any, PendingWrite] = {}
+        # Taken out of _pending by the flush in progress, and still read through until it is written
+        self._flushing: dict[Any, PendingWrite] = {}
+        self._lock = asyncio.Lock()
+        self._wake = asyncio.Event()
+        self._replay()
+        # Strings keep lone surrogates in the journal, as they can in the collection
+        self._journal = open(self.file, "a", encoding="utf-8", errors="surrogatepass")
+
+    def _replay(self):
+        """Load the journal into pending writes, then rewrite it with only those"""
+        try:
+            with open(self.file, "rb") as f:
+                # Records are written with line separators other than "\n" unescaped, so only that one splits lines
+                lines = f.read().split(b"\n")
+        except FileNotFoundError:
+            lines = []
+        for number, line in enumerate(lines, 1):
+            if not line:
+                continue
+            try:
+                # Decoded line by line, as a torn line can end partway through a character
+                self._record(json_codec.loads(line.decode("utf-8", "surrogatepass")))
+            except ValueError:
+                # Only the last line can be torn, by going down while it was written
+                self.logger.warning("Skipping unreadable line %s of journal %s", number, self.file)
+        records = [record for id_, pending in self._pending.items() for record in _records(id_, pending)]
+        with open(self.file + ".tmp", "w", encoding="utf-8", errors="surrogatepass") as f:
+            f.writelines(json_codec.dumps(record) + "\n" for record in records)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(self.file + ".tmp", self.file)
+        if self._pending:
+            self.logger.info("Replayed %s pending writes from journal %s", len(self._pending), self.file)
+
+    def _record(self, record: list):
+        op, id_, *args = record
+        pending = self._pending.setdefault(id_, PendingWrite())
+        match op:
+            case "delete":
+                pending.delete()
+            case "create":
+                pending.create()
+            case "set":
+                pending.set(*args)
+            case _:
+                raise ValueError(f"Unknown journal operation {op!r}")
+
+    async def _write(self, record: list):
+        self._journal.write(json_codec.dumps(record) + "\n")
+        self._journal.flush()
+        self._record(record)
+        if len(self._pending) >= self.batch_size:
+            self._wake.set()
+        if self.fsync:
+            await asyncio.to_thread(os.fsync, self._journal.fileno())
+
+    async def delete(self, id_: Any):
+        await self._write(["delete", id_])
+
+    async def create(self, id_: Any):
+        await self._write(["create", id_])
+
+    async def set(self, id_: Any, path: str, value: Any):
+        await self._write(["set", id_, path, value])
+
+    def pending(self, id_: Any) -> PendingWrite | None:
+        """Writes to a document not yet flushed, coalesced, or None if there are none"""
+        flushing, pending = self._flushing.get(id_), self._pending.get(id_)
+        if flushing is None or pending is None:
+            return flushing or pending
+        merged = copy.deepcopy(flushing)
+        merged.merge(pending)
+        return merged
+
+    def __len__(self) -> int:
+        return len(self._pending) + len(self._flushing)
+
+    async def flush(self) -> int:
+        """
+        Write every pending document in batches, then empty the journal if no writes came in meanwhile
+
+        Documents that fail to be written are put back and the error raised, except for write errors that retrying
+        would repeat, which are logged and dropped as they would have been raised to the writer.
+
+        :return: Documents written
+        """
+        written = 0
+        async with self._lock:
+            while self._pending:
+                self._flushing = dict(itertools.islice(self._pending.items(), self.batch_size))
+                for id_ in self._flushing:
+                    del self._pending[id_]
+                ids = list(self._flushing)
+                try:
+                    await self._bulk_write(ids)
+                except BaseException:
+                    # Put back ahead of writes made since
+                    for id_, later in self._pending.items():
+                        self._flushing.setdefault(id_, PendingWrite()).merge(later)
+                    self._pending, self._flushing = self._flushing, {}
+                    raise
+                self._flushing = {}
+                written += len(ids)
+                if self.on_flushed is not None:
+                    self.on_flushed(ids)
+            if written:
+                self._journal.seek(0)
+                self._journal.truncate()
+        return written
+
+    async def _bulk_write(self, ids: list):
+        operations = [self._flushing[id_].operation(id_) for id_ in ids]
+        try:
+            await self.collection().bulk_write(operations, ordered=False)
+        except BulkWriteError as ex:
+            for error in ex.details.get("writeErrors", ()):
+                # Creating a document that exists leaves it as it is, as inserting it directly did
+                if error.get("code") != DUPLICATE_KEY or not isinstance(operations[error["index"]], InsertOne):
+                    self.logger.error("Dropping write to %s: %s", ids[error["index"]], error.get("errmsg"))
+            if ex.details.get("writeConcernErrors"):
+                raise
+
+    async def run(self, interval: float = 1.0, retry_delay: float = 5.0, max_retry_delay: float = 300.0):
+        """Flush every interval, or sooner once batch_size documents are pending, until cancelled"""
+        failures = 0
+        while True:
+            try:
+                await asyncio.wait_for(self._wake.wait(), interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wake.clear()
+            try:
+                await self.flush()
+                failures = 0
+            except Exception as ex:
+                # Anything but cancellation, which is a BaseException, so that one bad batch does not stop every
+                # later flush. The batch is back in pending and retried with the rest.
+                delay = min(retry_delay * 2 ** failures, max_retry_delay)
+                failures += 1
+                self.logger.warning(
+                    "Flushing %s pending writes failed, retrying in %s seconds", len(self), delay, exc_info=ex
+                )
+                await asyncio.sleep(delay)
+
+    def close(self):
+        self._journal.close()
+
+
+def _records(id_: Any, pending: PendingWrite) -> Iterable[list]:
+    """Journal records that rebuild pending"""
+    if pending.deleted:
+        yield ["delete", id_]
+    if pending.created:
+        yield ["create", id_]
+    for path, value in pending.sets.items():
+        yield ["set", id_, path, value]
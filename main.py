@@ -3,9 +3,12 @@ import logging
 
 import discord.utils
 
-from app import app, ConfigReader, EmojiReader
+from app import app, ConfigReader, EmojiIndex
 from core.types.Config import Config
+from core.util import offloader
 import motor.motor_asyncio
+import db.Guilds
+import db.snowflake
 from bot.MyBot import MyBot
 
 
@@ -14,10 +17,27 @@ if __name__ == "__main__":
 
     discord.utils.setup_logging(level=logging.INFO if app.config.Debug.DEBUG else logging.CRITICAL, root=True)
 
-    app.emoji, app.emoji_rev = EmojiReader.read_emoji("config/emoji.json")
+    offloader.configure(
+        threshold=app.config.Offload.threshold,
+        executors={
+            "content": app.config.Offload.content,
+            "roles": app.config.Offload.roles,
+            "format": app.config.Offload.format,
+        },
+        max_workers=app.config.Offload.workers,
+    )
+
+    app.emoji, app.emoji_rev = EmojiIndex.load_emoji("config/emoji.json")
 
     app.bot = MyBot()
 
-    app.db_client = motor.motor_asyncio.AsyncIOMotorClient(app.config.Database.connection)
+    app.db_client = motor.motor_asyncio.AsyncIOMotorClient(
+        app.config.Database.connection, type_registry=db.snowflake.type_registry
+    )
+    db.Guilds.configure_cache(app.config.Database.cache_size, app.config.Database.cache_ttl)
+    if app.config.Database.write_behind:
+        db.Guilds.configure_write_behind(
+            app.config.Database.journal, app.config.Database.flush_batch, app.config.Database.fsync
+        )
 
     app.bot.run(app.config.Discord.token, log_handler=None)